@@ -0,0 +1,391 @@
+"""A stand-in Plex server that serves synthetic libraries for benchmarks.
+
+Only the endpoints a scan uses are served: the server root, the section list,
+section prefs and listings, and batched metadata lookups. Responses are XML,
+or JSON when asked for with an Accept header, shaped like Plex's own. Items
+are generated from their index on each request, so a 500k item section costs
+no memory up front. The notification websocket is served too, sending
+whatever is passed to FakePlexServer.notify.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import queue
+import re
+import select
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from xml.sax.saxutils import quoteattr
+
+# Library type -> listed item type and Plex search type
+SECTION_ITEM_TYPES = {
+    "movie": ("movie", 1),
+    "show": ("episode", 4),
+    "photo": ("clip", 12),
+}
+# Rating keys are section key * stride + item index.
+RATING_KEY_STRIDE = 10_000_000
+EPISODES_PER_SEASON = 10
+SEASONS_PER_SHOW = 5
+UPDATED_AT = 1_700_000_000
+LIBRARY_SETTINGS = (
+    "enableBIFGeneration",
+    "enableVoiceActivityGeneration",
+    "enableIntroMarkerGeneration",
+    "enableCreditsMarkerGeneration",
+    "enableAdMarkerGeneration",
+)
+DEFAULT_CONTAINER_SIZE = 50
+NOTIFICATIONS_PATH = "/:/websockets/notifications"
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WEBSOCKET_CLOSE = b"\x88\x00"
+NOTIFICATION_POLL_SECONDS = 0.05
+
+
+@dataclass(frozen=True)
+class SyntheticSection:
+    """A library section of ``size`` generated items.
+
+    Every 10th item lacks preview thumbnails, every 7th voice activity data,
+    every 3rd an intro marker, every 4th a credits marker and every odd item
+    an ad marker. Photo sections only carry preview thumbnails.
+    """
+
+    key: int
+    type: str
+    size: int
+
+    @property
+    def title(self) -> str:
+        return f"Synthetic {self.type} {self.key}"
+
+    @property
+    def item_type(self) -> str:
+        return SECTION_ITEM_TYPES[self.type][0]
+
+    def rating_key(self, index: int) -> int:
+        return self.key * RATING_KEY_STRIDE + index
+
+    def index(self, rating_key: int) -> int | None:
+        section, index = divmod(rating_key, RATING_KEY_STRIDE)
+        return index if section == self.key and index < self.size else None
+
+    def item(self, index: int, markers: bool = False) -> dict:
+        rating_key = self.rating_key(index)
+        part = {"id": rating_key, "file": f"/media/{self.key}/{index}.mkv"}
+        if index % 10:
+            part["indexes"] = "sd"
+        media = {"id": rating_key, "videoResolution": "1080", "Part": [part]}
+        item = {
+            "ratingKey": str(rating_key),
+            "key": f"/library/metadata/{rating_key}",
+            "type": self.item_type,
+            "title": f"Item {index}",
+            "addedAt": UPDATED_AT + index,
+            "updatedAt": UPDATED_AT + index,
+            "Media": [media],
+        }
+        if self.type == "photo":
+            return item
+        media["hasVoiceActivity"] = bool(index % 7)
+        if self.type == "show":
+            show, episode = divmod(index, EPISODES_PER_SEASON * SEASONS_PER_SHOW)
+            item["grandparentTitle"] = f"Show {show}"
+            item["parentIndex"] = episode // EPISODES_PER_SEASON + 1
+            item["index"] = episode % EPISODES_PER_SEASON + 1
+        if markers:
+            item["Marker"] = [
+                {
+                    "type": marker_type,
+                    "startTimeOffset": 0,
+                    "endTimeOffset": 30000,
+                    "Attributes": [{"version": 5}],
+                }
+                for marker_type, present in (
+                    ("intro", index % 3),
+                    ("credits", index % 4),
+                    ("ad", index % 2 == 0),
+                )
+                if present
+            ]
+        return item
+
+    def missing_counts(self) -> dict[str, int]:
+        """The number of items missing each kind of data, keyed by marker or check."""
+        counts = {"thumbnails": len(range(0, self.size, 10))}
+        if self.type == "photo":
+            return {**counts, "voice": 0, "intro": 0, "credits": 0, "ad": 0}
+        return {
+            **counts,
+            "voice": len(range(0, self.size, 7)),
+            "intro": len(range(0, self.size, 3)),
+            "credits": len(range(0, self.size, 4)),
+            "ad": len(range(1, self.size, 2)),
+        }
+
+
+def websocket_frame(text: str) -> bytes:
+    """An unmasked websocket text frame, as servers send them."""
+    payload = text.encode()
+    if len(payload) < 126:
+        header = bytes((0x81, len(payload)))
+    elif len(payload) < 2**16:
+        header = bytes((0x81, 126)) + len(payload).to_bytes(2, "big")
+    else:
+        header = bytes((0x81, 127)) + len(payload).to_bytes(8, "big")
+    return header + payload
+
+
+def xml_element(tag: str, data: dict) -> str:
+    attrs = []
+    children = []
+    for name, value in data.items():
+        if isinstance(value, list):
+            child_tag = "Video" if name == "Metadata" else name
+            children.extend(xml_element(child_tag, child) for child in value)
+        else:
+            if isinstance(value, bool):
+                value = int(value)
+            attrs.append(f" {name}={quoteattr(str(value))}")
+    if not children:
+        return f"<{tag}{''.join(attrs)}/>"
+    return f"<{tag}{''.join(attrs)}>{''.join(children)}</{tag}>"
+
+
+class FakePlexHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakePlexServer
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == NOTIFICATIONS_PATH:
+            self.stream_notifications()
+            return
+        args = dict(parse_qsl(url.query))
+        for header in ("X-Plex-Container-Start", "X-Plex-Container-Size"):
+            if header in self.headers:
+                args[header] = self.headers[header]
+        with self.server.tracked():
+            self.respond(url.path.rstrip("/") or "/", args)
+
+    def respond(self, path: str, args: dict[str, str]) -> None:
+        listing = re.fullmatch(r"/library/sections/(\d+)/all", path)
+        if listing and int(listing[1]) in self.server.broken_sections:
+            self.send_error(500)
+            return
+        container = self.server.route(path, args)
+        if container is None:
+            self.send_error(404)
+            return
+        if "json" in self.headers.get("Accept", ""):
+            body = json.dumps({"MediaContainer": container}).encode()
+            content_type = "application/json"
+        else:
+            body = xml_element("MediaContainer", container).encode()
+            content_type = "text/xml;charset=utf-8"
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(len(body))
+
+    def stream_notifications(self) -> None:
+        """Upgrade to a websocket and send notifications until either side closes it.
+
+        The only frame a client sends is a close frame, so anything it sends is
+        answered with one.
+        """
+        key = self.headers["Sec-WebSocket-Key"] + WEBSOCKET_GUID
+        accept = base64.b64encode(hashlib.sha1(key.encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        messages = self.server.subscribe()
+        try:
+            while not select.select([self.connection], [], [], 0)[0]:
+                try:
+                    container = messages.get(timeout=NOTIFICATION_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if container is None:
+                    break
+                message = json.dumps({"NotificationContainer": container})
+                self.wfile.write(websocket_frame(message))
+            self.wfile.write(WEBSOCKET_CLOSE)
+        finally:
+            self.server.unsubscribe(messages)
+        self.close_connection = True
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+class FakePlexServer(ThreadingHTTPServer):
+    """Serves the given sections on a background thread.
+
+    Each response waits ``latency`` seconds before it is sent, and the number
+    of requests and response bytes are counted for the benchmark report, as
+    are section listings so tests can tell when a whole section was read.
+    The most requests ever handled at once is kept in ``peak_in_flight``.
+    Listings of sections whose keys are in ``broken_sections`` answer 500.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        sections: list[SyntheticSection],
+        latency: float = 0.0,
+        address: tuple[str, int] = ("127.0.0.1", 0),
+    ) -> None:
+        super().__init__(address, FakePlexHandler)
+        self.sections = {section.key: section for section in sections}
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.listings = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.broken_sections: set[int] = set()
+        self.subscribers: list[queue.Queue] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> FakePlexServer:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.close_notifications()
+        self.shutdown()
+        self.server_close()
+
+    def count(self, size: int) -> None:
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += size
+
+    @contextmanager
+    def tracked(self) -> Iterator[None]:
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def subscribe(self) -> queue.Queue:
+        messages: queue.Queue = queue.Queue()
+        with self.lock:
+            self.subscribers.append(messages)
+        return messages
+
+    def unsubscribe(self, messages: queue.Queue) -> None:
+        with self.lock:
+            if messages in self.subscribers:
+                self.subscribers.remove(messages)
+
+    def notify(self, container: dict) -> None:
+        """Send a NotificationContainer to every connected websocket."""
+        with self.lock:
+            for messages in self.subscribers:
+                messages.put(container)
+
+    def close_notifications(self) -> None:
+        """Close every connected websocket, as Plex does when it restarts."""
+        with self.lock:
+            for messages in self.subscribers:
+                messages.put(None)
+            self.subscribers = []
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.listings = 0
+
+    def route(self, path: str, args: dict[str, str]) -> dict | None:
+        if path == "/":
+            return {
+                "friendlyName": "Benchmark",
+                "machineIdentifier": "benchmark",
+                "version": "1.40.0.0",
+            }
+        if path == "/library":
+            return {"size": 0, "title1": "Plex Library"}
+        if path == "/library/sections":
+            return {
+                "size": len(self.sections),
+                "Directory": [
+                    {
+                        "key": section.key,
+                        "type": section.type,
+                        "title": section.title,
+                        "uuid": f"synthetic-{section.key}",
+                    }
+                    for section in self.sections.values()
+                ],
+            }
+        if match := re.fullmatch(r"/library/sections/(\d+)/(prefs|all)", path):
+            section = self.sections.get(int(match[1]))
+            if section is None:
+                return None
+            if match[2] == "prefs":
+                return {
+                    "Setting": [
+                        {"id": setting, "type": "bool", "value": "true"}
+                        for setting in LIBRARY_SETTINGS
+                    ]
+                }
+            return self.listing(section, args)
+        if match := re.fullmatch(r"/library/metadata/([\d,]+)", path):
+            return self.metadata(match[1], args)
+        return None
+
+    def listing(self, section: SyntheticSection, args: dict[str, str]) -> dict:
+        with self.lock:
+            self.listings += 1
+        first = 0
+        if "updatedAt>>" in args:
+            first = max(0, int(args["updatedAt>>"]) - UPDATED_AT + 1)
+        total = max(0, section.size - first)
+        start = int(args.get("X-Plex-Container-Start", 0))
+        size = int(args.get("X-Plex-Container-Size", DEFAULT_CONTAINER_SIZE))
+        indexes = range(first + start, min(section.size, first + start + size))
+        return {
+            "size": len(indexes),
+            "totalSize": total,
+            "offset": start,
+            "librarySectionID": section.key,
+            "Metadata": [section.item(index) for index in indexes],
+        }
+
+    def metadata(self, keys: str, args: dict[str, str]) -> dict:
+        markers = args.get("includeMarkers") == "1"
+        items = []
+        for key in keys.split(","):
+            for section in self.sections.values():
+                index = section.index(int(key))
+                if index is not None:
+                    items.append(section.item(index, markers))
+        return {"size": len(items), "Metadata": items}
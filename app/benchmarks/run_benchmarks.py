@@ -0,0 +1,240 @@
+"""Benchmark the scan engines against a local fake Plex server.
+
+Run from the app directory, for example:
+
+    python -m benchmarks.run_benchmarks --sizes 1000 100000 --latency-ms 5
+
+Every scenario runs in a fresh process so its peak RSS is its own. Results
+are printed as a table; save them with --output and pass that file to
+--compare on a later commit to fail when throughput drops by more than
+--threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from multiprocessing import get_context
+
+from benchmarks.fake_plex import FakePlexServer, SyntheticSection
+from previewmaid import FEATURE_SCANS, Config, run_scan
+
+SCENARIOS = {
+    "sync": {"scan_engine": "sync"},
+    "async": {"scan_engine": "async"},
+    "lean-sync": {"scan_engine": "sync", "lean_requests": True},
+}
+# Feature setting -> key of SyntheticSection.missing_counts
+FEATURE_KEYS = {
+    "find_missing_thumbnail_previews": "thumbnails",
+    "find_missing_voice_activity": "voice",
+    "find_missing_intro_markers": "intro",
+    "find_missing_credits_markers": "credits",
+    "find_missing_ad_markers": "ad",
+}
+
+
+@dataclass
+class BenchmarkResult:
+    library: str
+    items: int
+    scenario: str
+    wall_seconds: float
+    requests: int
+    bytes: int
+    peak_rss_mb: float
+    items_per_second: float
+    correct: bool
+
+    @property
+    def key(self) -> tuple[str, int, str]:
+        return self.library, self.items, self.scenario
+
+
+def run_scenario(url: str, settings: dict) -> tuple[float, dict[str, int], float]:
+    """Scan the fake server in this process, returning wall time, totals and peak RSS."""
+    config = Config(
+        plex_url=url,
+        plex_token="benchmark",
+        run_once=True,
+        run_time="00:00",
+        **dict.fromkeys(FEATURE_KEYS, True),
+        **settings,
+    )
+    logger = logging.getLogger("preview_maid.benchmark")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    started = time.perf_counter()
+    totals = run_scan(config, logger)
+    wall_seconds = time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    peak_rss_mb = peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10
+    return wall_seconds, totals, peak_rss_mb
+
+
+def expected_totals(section: SyntheticSection) -> dict[str, int]:
+    missing = section.missing_counts()
+    return {
+        feature.label: missing[FEATURE_KEYS[feature.setting]]
+        for feature in FEATURE_SCANS
+    }
+
+
+def benchmark(
+    library: str, size: int, scenario: str, args: argparse.Namespace
+) -> BenchmarkResult:
+    section = SyntheticSection(1, library, size)
+    server = FakePlexServer([section], latency=args.latency_ms / 1000).start()
+    settings = {
+        **SCENARIOS[scenario],
+        "scan_concurrency": args.concurrency,
+        "container_size": args.container_size,
+        "request_latency_target_ms": args.request_latency_target_ms,
+    }
+    try:
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            wall_seconds, totals, peak_rss_mb = pool.submit(
+                run_scenario, server.url, settings
+            ).result()
+    finally:
+        server.stop()
+    return BenchmarkResult(
+        library=library,
+        items=size,
+        scenario=scenario,
+        wall_seconds=round(wall_seconds, 3),
+        requests=server.requests,
+        bytes=server.bytes_sent,
+        peak_rss_mb=round(peak_rss_mb, 1),
+        items_per_second=round(size / wall_seconds, 1),
+        correct=totals == expected_totals(section),
+    )
+
+
+def print_table(results: list[BenchmarkResult]) -> None:
+    print(
+        f"{'library':<8} {'items':>8} {'scenario':<11} {'wall s':>9} {'requests':>9} "
+        f"{'MiB sent':>9} {'peak MiB':>9} {'items/s':>10}  correct"
+    )
+    for result in results:
+        print(
+            f"{result.library:<8} {result.items:>8} {result.scenario:<11} "
+            f"{result.wall_seconds:>9.3f} {result.requests:>9} "
+            f"{result.bytes / 2**20:>9.1f} {result.peak_rss_mb:>9.1f} "
+            f"{result.items_per_second:>10.1f}  {'yes' if result.correct else 'NO'}"
+        )
+
+
+def compare(results: list[BenchmarkResult], path: str, threshold: float) -> bool:
+    """Print the change in throughput against a saved run, returning True on a regression."""
+    with open(path, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    previous = {
+        (result["library"], result["items"], result["scenario"]): result
+        for result in baseline["results"]
+    }
+    print(f"\nCompared with {baseline.get('commit') or path}:")
+    regressed = False
+    for result in results:
+        before = previous.get(result.key)
+        if before is None:
+            continue
+        change = result.items_per_second / before["items_per_second"] - 1
+        flag = ""
+        if change < -threshold:
+            regressed = True
+            flag = "  REGRESSION"
+        print(
+            f"{result.library:<8} {result.items:>8} {result.scenario:<11} "
+            f"{before['items_per_second']:>10.1f} -> {result.items_per_second:>10.1f} "
+            f"items/s ({change:+.1%}){flag}"
+        )
+    return regressed
+
+
+def current_commit() -> str | None:
+    git = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return git.stdout.strip() or None
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--libraries",
+        nargs="+",
+        choices=("movie", "show", "photo"),
+        default=["movie", "show", "photo"],
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=tuple(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=0.0, help="delay added to every response"
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--container-size", type=int, default=200)
+    parser.add_argument(
+        "--request-latency-target-ms",
+        type=int,
+        default=0,
+        help="run with the adaptive request limiter at this target",
+    )
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--compare", help="results JSON from an earlier run")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="fractional drop in items/s counted as a regression",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    results = [
+        benchmark(library, size, scenario, args)
+        for library in args.libraries
+        for size in args.sizes
+        for scenario in args.scenarios
+    ]
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(
+                {
+                    "commit": current_commit(),
+                    "python": platform.python_version(),
+                    "latency_ms": args.latency_ms,
+                    "concurrency": args.concurrency,
+                    "container_size": args.container_size,
+                    "request_latency_target_ms": args.request_latency_target_ms,
+                    "results": [asdict(result) for result in results],
+                },
+                output,
+                indent=2,
+            )
+    regressed = args.compare is not None and compare(
+        results, args.compare, args.threshold
+    )
+    return 1 if regressed or not all(result.correct for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,43 @@
 from __future__ import annotations
 
+import asyncio
+import cProfile
+import csv
+import hashlib
+import heapq
+import itertools
+import json
 import logging
 import os
+import pstats
+import random
 import re
 import signal
+import sqlite3
 import sys
+import threading
 import time
-from dataclasses import dataclass, field
-from datetime import timedelta
+from bisect import bisect_left
+from collections import defaultdict, deque
+from collections.abc import Callable, Coroutine, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, contextmanager, suppress
+from dataclasses import dataclass, field, replace
+from datetime import UTC, datetime, timedelta
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import accumulate, islice
 from logging.handlers import RotatingFileHandler
-from typing import NamedTuple
-
-import schedule
+from typing import NamedTuple, TextIO
+from urllib.parse import parse_qsl, urlsplit
+from urllib.request import pathname2url
+
+import httpx
+import requests
+from plexapi import utils as plex_utils
+from plexapi.alert import AlertListener
 from plexapi.server import PlexServer
+from requests.adapters import HTTPAdapter, Retry
 
 
 @dataclass
@@ -26,55 +51,54 @@ class Config:
     find_missing_ad_markers: bool
     run_once: bool
     run_time: str
+    servers: list[str] = field(default_factory=list)
+    server_name: str = ""
+    schedules: list[str] = field(default_factory=list)
+    watch_events: bool = False
+    event_debounce_seconds: int = 30
+    remediate: bool = False
+    remediation_concurrency: int = 1
+    remediation_hourly_budget: int = 30
     skip_library_types: list[str] = field(default_factory=list)
     skip_library_names: list[str] = field(default_factory=list)
+    container_size: int = 200
+    scan_concurrency: int = 1
+    request_latency_target_ms: int = 0
+    request_timeout: int = 60
+    request_retries: int = 3
+    scan_engine: str = "sync"
+    scan_backend: str = "api"
+    lean_requests: bool = False
+    plex_database: str = "/plex/com.plexapp.plugins.library.db"
+    plex_media_directory: str = ""
+    photo_traversal: str = "clips"
+    incremental_scans: bool = False
+    resumable_scans: bool = False
+    full_scan_interval_days: int = 7
+    recheck_after_days: int = 30
     debug: bool = False
     log_directory: str = "/app/logs"
+    state_directory: str = "/app/state"
+    write_reports: bool = False
+    report_directory: str = "/app/reports"
+    metrics_port: int = 0
+    metrics_textfile: str = ""
+    profile: bool = False
+    profile_dump: bool = False
 
 
-class FeatureScan(NamedTuple):
-    """Maps a config flag to the scan function and its arguments."""
+def parse_bool_env(name: str, default: str = "False") -> bool:
+    return os.getenv(name, default).lower() in ("true", "1", "t")
 
-    label: str
-    setting: str
-    scan_fn: str
-    extra_args: tuple = ()
 
-
-FEATURE_SCANS: list[FeatureScan] = [
-    FeatureScan(
-        "missing thumbnail previews",
-        "find_missing_thumbnail_previews",
-        "find_missing_preview_thumbnails",
-    ),
-    FeatureScan(
-        "missing voice activity data",
-        "find_missing_voice_activity",
-        "find_missing_voice_activity_data",
-    ),
-    FeatureScan(
-        "missing intro markers",
-        "find_missing_intro_markers",
-        "find_missing_marker_metadata",
-        ("intro",),
-    ),
-    FeatureScan(
-        "missing credits markers",
-        "find_missing_credits_markers",
-        "find_missing_marker_metadata",
-        ("credits",),
-    ),
-    FeatureScan(
-        "missing ad markers",
-        "find_missing_ad_markers",
-        "find_missing_marker_metadata",
-        ("ad",),
-    ),
-]
+# Stands in for a setting that is not a whole number, so validate_config
+# reports it rather than it quietly becoming 0.
+INVALID_INT = -1
 
 
-def parse_bool_env(name: str, default: str = "False") -> bool:
-    return os.getenv(name, default).lower() in ("true", "1", "t")
+def parse_int_env(name: str, default: str) -> int:
+    value = os.getenv(name, default).strip()
+    return int(value) if value.isdigit() else INVALID_INT
 
 
 def load_config() -> Config:
@@ -84,10 +108,13 @@ def load_config() -> Config:
     skip_names = [
         n.strip() for n in os.getenv("SKIP_LIBRARY_NAMES", "").split(",") if n.strip()
     ]
+    schedules = [s.strip() for s in os.getenv("SCHEDULES", "").split(";") if s.strip()]
+    servers = [s.strip() for s in os.getenv("PLEX_SERVERS", "").split(";") if s.strip()]
 
     return Config(
         plex_url=os.getenv("PLEX_URL", ""),
         plex_token=os.getenv("PLEX_TOKEN", ""),
+        servers=servers,
         find_missing_thumbnail_previews=parse_bool_env(
             "FIND_MISSING_THUMBNAIL_PREVIEWS", "True"
         ),
@@ -97,19 +124,57 @@ def load_config() -> Config:
         find_missing_ad_markers=parse_bool_env("FIND_MISSING_AD_MARKERS"),
         run_once=parse_bool_env("RUN_ONCE"),
         run_time=os.getenv("RUN_TIME", "00:00"),
+        schedules=schedules,
+        watch_events=parse_bool_env("WATCH_EVENTS"),
+        event_debounce_seconds=parse_int_env("EVENT_DEBOUNCE_SECONDS", "30"),
+        remediate=parse_bool_env("REMEDIATE"),
+        remediation_concurrency=parse_int_env("REMEDIATION_CONCURRENCY", "1"),
+        remediation_hourly_budget=parse_int_env("REMEDIATION_HOURLY_BUDGET", "30"),
         skip_library_types=skip_types,
         skip_library_names=skip_names,
+        container_size=parse_int_env("PLEX_CONTAINER_SIZE", "200"),
+        scan_concurrency=parse_int_env("SCAN_CONCURRENCY", "1"),
+        request_latency_target_ms=parse_int_env("REQUEST_LATENCY_TARGET_MS", "0"),
+        request_timeout=parse_int_env("REQUEST_TIMEOUT", "60"),
+        request_retries=parse_int_env("REQUEST_RETRIES", "3"),
+        scan_engine=os.getenv("SCAN_ENGINE", "sync").strip().lower(),
+        scan_backend=os.getenv("SCAN_BACKEND", "api").strip().lower(),
+        lean_requests=parse_bool_env("LEAN_REQUESTS"),
+        plex_database=os.getenv(
+            "PLEX_DATABASE", "/plex/com.plexapp.plugins.library.db"
+        ),
+        plex_media_directory=os.getenv("PLEX_MEDIA_DIRECTORY", ""),
+        photo_traversal=os.getenv("PHOTO_TRAVERSAL", "clips").strip().lower(),
+        incremental_scans=parse_bool_env("INCREMENTAL_SCANS"),
+        resumable_scans=parse_bool_env("RESUMABLE_SCANS"),
+        full_scan_interval_days=parse_int_env("FULL_SCAN_INTERVAL_DAYS", "7"),
+        recheck_after_days=parse_int_env("RECHECK_AFTER_DAYS", "30"),
         debug=parse_bool_env("DEBUG"),
+        write_reports=parse_bool_env("WRITE_REPORTS"),
+        metrics_port=parse_int_env("METRICS_PORT", "0"),
+        metrics_textfile=os.getenv("METRICS_TEXTFILE", "").strip(),
+        profile=parse_bool_env("PROFILE"),
+        profile_dump=parse_bool_env("PROFILE_DUMP"),
     )
 
 
 def validate_config(config: Config) -> list[str]:
     errors = []
 
-    if not config.plex_url:
-        errors.append("PLEX_URL environment variable is required.")
-    if not config.plex_token:
-        errors.append("PLEX_TOKEN environment variable is required.")
+    if not config.servers:
+        if not config.plex_url:
+            errors.append("PLEX_URL environment variable is required.")
+        if not config.plex_token:
+            errors.append("PLEX_TOKEN environment variable is required.")
+    names = []
+    for number, entry in enumerate(config.servers, 1):
+        try:
+            names.append(parse_server(entry)["server_name"])
+        except ValueError as e:
+            # Entries are numbered rather than quoted so tokens stay out of the logs.
+            errors.append(f"Server {number} in PLEX_SERVERS is invalid: {e}")
+    for name in sorted({name for name in names if names.count(name) > 1}):
+        errors.append(f'Server name "{name}" is used more than once in PLEX_SERVERS.')
 
     feature_flags = [
         config.find_missing_thumbnail_previews,
@@ -134,13 +199,87 @@ def validate_config(config: Config) -> list[str]:
                 f'SKIP_LIBRARY_TYPES must be a comma-separated list of "movie", "show", or "photo".'
             )
 
+    if config.container_size <= 0:
+        errors.append("PLEX_CONTAINER_SIZE must be a positive integer.")
+    if config.scan_concurrency <= 0:
+        errors.append("SCAN_CONCURRENCY must be a positive integer.")
+    if config.request_timeout <= 0:
+        errors.append("REQUEST_TIMEOUT must be a positive integer.")
+    if config.scan_engine not in ("sync", "async"):
+        errors.append('SCAN_ENGINE must be either "sync" or "async".')
+    if config.scan_backend not in ("api", "database"):
+        errors.append('SCAN_BACKEND must be either "api" or "database".')
+    if config.plex_media_directory and config.scan_backend != "database":
+        errors.append('PLEX_MEDIA_DIRECTORY requires SCAN_BACKEND to be "database".')
+    if config.photo_traversal not in ("clips", "albums"):
+        errors.append('PHOTO_TRAVERSAL must be either "clips" or "albums".')
+    if config.photo_traversal == "albums" and config.scan_engine == "async":
+        errors.append(
+            'PHOTO_TRAVERSAL "albums" requires SCAN_ENGINE to be "sync", as albums are walked through plexapi.'
+        )
+    if config.full_scan_interval_days <= 0:
+        errors.append("FULL_SCAN_INTERVAL_DAYS must be a positive integer.")
+    if config.recheck_after_days <= 0:
+        errors.append("RECHECK_AFTER_DAYS must be a positive integer.")
+    if config.metrics_port > 65535:
+        errors.append("METRICS_PORT must be a port number between 1 and 65535.")
+    for setting, value in (
+        ("EVENT_DEBOUNCE_SECONDS", config.event_debounce_seconds),
+        ("REQUEST_LATENCY_TARGET_MS", config.request_latency_target_ms),
+        ("REQUEST_RETRIES", config.request_retries),
+        ("METRICS_PORT", config.metrics_port),
+    ):
+        if value < 0:
+            errors.append(f"{setting} must be a non-negative integer.")
+    if config.profile_dump and not config.profile:
+        errors.append("PROFILE_DUMP requires PROFILE to be enabled.")
+    server_errors = multi_server_errors(config)
+    errors.extend(server_errors)
+    if config.watch_events and config.run_once:
+        errors.append("WATCH_EVENTS cannot be used with RUN_ONCE.")
+    if config.remediate:
+        if config.run_once:
+            errors.append(
+                "REMEDIATE cannot be used with RUN_ONCE, as the queue is worked through between runs."
+            )
+        if config.remediation_concurrency <= 0:
+            errors.append("REMEDIATION_CONCURRENCY must be a positive integer.")
+        if config.remediation_hourly_budget <= 0:
+            errors.append("REMEDIATION_HOURLY_BUDGET must be a positive integer.")
+
     time_pattern = r"^(?:[01]\d|2[0-3]):[0-5]\d(?::[0-5]\d)?$"
     if config.run_time and not re.match(time_pattern, config.run_time):
         errors.append("RUN_TIME must be in the format HH:MM(:SS).")
+    for entry in config.schedules:
+        try:
+            schedule = parse_schedule(entry)
+        except ValueError as e:
+            errors.append(f'Schedule "{entry}" in SCHEDULES is invalid: {e}')
+            continue
+        # A schedule can switch to the database backend for its own runs.
+        for error in multi_server_errors(schedule.config_for(config)):
+            if error not in server_errors:
+                errors.append(f'Schedule "{entry}" in SCHEDULES is invalid: {error}')
 
     return errors
 
 
+def multi_server_errors(config: Config) -> list[str]:
+    """Settings that only work with a single server in PLEX_SERVERS."""
+    if len(config.servers) <= 1:
+        return []
+    errors = []
+    if config.profile:
+        errors.append(
+            "PROFILE cannot be used with more than one server in PLEX_SERVERS."
+        )
+    if config.scan_backend == "database":
+        errors.append(
+            "SCAN_BACKEND=database cannot be used with more than one server in PLEX_SERVERS."
+        )
+    return errors
+
+
 def setup_logging(
     debug: bool = False, log_directory: str = "/app/logs"
 ) -> logging.Logger:
@@ -184,15 +323,13 @@ def setup_logging(
 # Plex Helper functions
 
 
-def is_library_setting_enabled(library: object, setting_id: str) -> bool:
-    for setting in library.settings():
-        if setting.id == setting_id:
-            return setting.value
-    return False
+def library_settings(library: object) -> dict[str, object]:
+    """Fetch a library's settings once, indexed by setting id."""
+    return {setting.id: setting.value for setting in library.settings()}
 
 
-def should_skip_library(
-    library: object, config: Config, setting_id: str, logger: logging.Logger
+def is_library_excluded(
+    library: object, config: Config, logger: logging.Logger
 ) -> bool:
     if library.type in config.skip_library_types:
         logger.info(
@@ -204,180 +341,3643 @@ def should_skip_library(
             f"Skipping library {library.title} as {library.title} is in the SKIP_LIBRARY_NAMES list..."
         )
         return True
-    if not is_library_setting_enabled(library, setting_id):
-        logger.info(f"Skipping {library.title} as {setting_id} is disabled...")
-        return True
     return False
 
 
+def episode_display_name(episode: object) -> str:
+    return f"{episode.grandparentTitle} - {episode.title} (Season {episode.parentIndex}, Episode {episode.index})"
+
+
+def iter_section(
+    library: object,
+    container_size: int,
+    libtype: str | None = None,
+    filters: dict | None = None,
+    start: int = 0,
+) -> Iterator[object]:
+    """Page through a library section, yielding items one page at a time.
+
+    Each page is requested with X-Plex-Container-Start/Size and handed out
+    before the next one is fetched, so memory stays bounded by the page size.
+    """
+    while True:
+        page = fetch_page(library, container_size, libtype, filters, start)
+        yield from page
+        if len(page) < container_size:
+            return
+        start += container_size
+
+
+def fetch_page(
+    library: object,
+    container_size: int,
+    libtype: str | None = None,
+    filters: dict | None = None,
+    start: int = 0,
+) -> list:
+    with PROFILE.timed("scan", library.title, "list items"):
+        return library.all(
+            libtype=libtype,
+            filters=filters,
+            container_start=start,
+            container_size=container_size,
+            maxresults=container_size,
+        )
+
+
+def section_libtype(library: object, photo_traversal: str = "clips") -> str | None:
+    """The libtype to list a section by.
+
+    TV sections are listed by episode and photo sections by clip, so nested
+    shows and albums never have to be walked one request at a time.
+    """
+    if library.type == "show":
+        return "episode"
+    if library.type == "photo" and photo_traversal == "clips":
+        return "clip"
+    return None
+
+
+def describe_items(
+    library: object, items: Iterable[object]
+) -> Iterator[tuple[object, str]]:
+    """Pair each checkable item from a section listing with its display name."""
+    for item in items:
+        if library.type == "show":
+            yield item, episode_display_name(item)
+        elif item.type in ("movie", "clip", "photo"):
+            yield item, item.title
+
+
+def iter_batches(items: Iterable[object], size: int) -> Iterator[list]:
+    items = iter(items)
+    return iter(lambda: list(islice(items, size)), [])
+
+
+def iter_library_items(
+    library: object, config: Config, filters: dict | None = None, start: int = 0
+) -> Iterator[tuple[object, str]]:
+    """Yield every checkable item in a library with its display name.
+
+    TV sections are listed at the episode level, and photo sections at the clip
+    level, so every item comes back in a handful of paged section requests
+    instead of one request per show or album.
+    """
+    libtype = section_libtype(library, config.photo_traversal)
+    items = iter_section(library, config.container_size, libtype, filters, start)
+    return describe_items(library, items)
+
+
+# Lean requests
+
+# Tag elements and long text fields that no check reads.
+LEAN_EXCLUDED_ELEMENTS = frozenset(
+    [
+        "Chapter",
+        "Collection",
+        "Country",
+        "Director",
+        "Extras",
+        "Field",
+        "Genre",
+        "Guid",
+        "Image",
+        "Label",
+        "Location",
+        "Mood",
+        "Producer",
+        "Rating",
+        "Related",
+        "Role",
+        "Similar",
+        "Stream",
+        "Style",
+        "UltraBlurColors",
+        "Writer",
+    ]
+)
+# Item detail left out too when no planned check reads it.
+LEAN_OPTIONAL_ELEMENTS = frozenset(("Media", "Part"))
+LEAN_EXCLUDED_FIELDS = "art,summary,tagline,theme,thumb"
+
+
+class PartRecord(NamedTuple):
+    file: str
+    hasPreviewThumbnails: bool
+
+
+class MediaRecord(NamedTuple):
+    videoResolution: str | None
+    hasVoiceActivity: bool
+    parts: list[PartRecord]
+
+
+class MarkerRecord(NamedTuple):
+    type: str
+
+
+class ItemRecord(NamedTuple):
+    """The subset of a plexapi item the check functions read."""
+
+    ratingKey: int
+    type: str
+    title: str
+    index: int | None
+    parentIndex: int | None
+    grandparentTitle: str | None
+    media: list[MediaRecord]
+    markers: list[MarkerRecord]
+    updatedAt: datetime | None = None
+
+
+def item_record(data: dict) -> ItemRecord:
+    """Decode one JSON Metadata entry into an ItemRecord."""
+    media = [
+        MediaRecord(
+            media.get("videoResolution"),
+            str(media.get("hasVoiceActivity", "0")).lower() in ("1", "true"),
+            [
+                PartRecord(part.get("file"), part.get("indexes") == "sd")
+                for part in media.get("Part", [])
+            ],
+        )
+        for media in data.get("Media", [])
+    ]
+    updated_at = data.get("updatedAt")
+    return ItemRecord(
+        int(data["ratingKey"]),
+        data["type"],
+        data.get("title"),
+        data.get("index"),
+        data.get("parentIndex"),
+        data.get("grandparentTitle"),
+        media,
+        [MarkerRecord(marker["type"]) for marker in data.get("Marker", [])],
+        None if updated_at is None else datetime.fromtimestamp(updated_at, tz=UTC),
+    )
+
+
+def item_records(container: dict) -> list[ItemRecord]:
+    return [item_record(data) for data in container.get("Metadata", [])]
+
+
+def lean_headers(config: Config) -> dict[str, str]:
+    return {"Accept": "application/json", "X-Plex-Token": config.plex_token}
+
+
+class LeanSection:
+    """A library section that lists items as compact JSON records.
+
+    Plex is asked for JSON with tag elements and long text fields left out,
+    along with any media detail the planned checks do not read, and the
+    response is decoded straight into records instead of plexapi objects.
+    Photo album listings still go through plexapi since walking albums needs
+    its objects. The async engine sends the same requests, built by the
+    *_url methods, with its own client.
+    """
+
+    def __init__(
+        self,
+        section: object,
+        config: Config,
+        session: requests.Session,
+        requests: RequestPlan | None = None,
+    ) -> None:
+        self.section = section
+        self.key = section.key
+        self.type = section.type
+        self.title = section.title
+        self.settings = section.settings
+        self.session = session
+        self.timeout = request_timeout(config)
+        self.base_url = config.plex_url.rstrip("/")
+        self.headers = lean_headers(config)
+        excluded = LEAN_EXCLUDED_ELEMENTS
+        if requests is not None:
+            excluded = (excluded | LEAN_OPTIONAL_ELEMENTS) - requests.elements
+        self.excluded_elements = ",".join(sorted(excluded))
+
+    def url(self, path: str, args: dict) -> str:
+        args = {
+            **args,
+            "excludeElements": self.excluded_elements,
+            "excludeFields": LEAN_EXCLUDED_FIELDS,
+        }
+        return f"{self.base_url}{path}{plex_utils.joinArgs(args)}"
+
+    def listing_url(
+        self,
+        libtype: str | None = None,
+        filters: dict | None = None,
+        container_start: int = 0,
+        container_size: int | None = None,
+    ) -> str:
+        args = {
+            "type": plex_utils.searchType(libtype or self.type),
+            "X-Plex-Container-Start": container_start,
+        }
+        if container_size is not None:
+            args["X-Plex-Container-Size"] = container_size
+        # Filters such as {"updatedAt>>": since} become updatedAt>>=<epoch>.
+        for field_operator, value in (filters or {}).items():
+            if isinstance(value, datetime):
+                value = int(value.timestamp())
+            args[field_operator] = value
+        return self.url(f"/library/sections/{self.key}/all", args)
+
+    def details_url(self, rating_keys: list[int], params: dict | None = None) -> str:
+        keys = ",".join(str(key) for key in rating_keys)
+        return self.url(f"/library/metadata/{keys}", params or {})
+
+    def size_url(self, libtype: str | None = None, filters: dict | None = None) -> str:
+        return self.listing_url(libtype, filters, container_size=0)
+
+    def query(self, url: str) -> dict:
+        response = self.session.get(url, headers=self.headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["MediaContainer"]
+
+    def all(
+        self,
+        libtype: str | None = None,
+        filters: dict | None = None,
+        container_start: int = 0,
+        container_size: int | None = None,
+        maxresults: int | None = None,
+    ) -> list:
+        if libtype is None and self.type == "photo":
+            return self.section.all(
+                libtype=libtype,
+                filters=filters,
+                container_start=container_start,
+                container_size=container_size,
+                maxresults=maxresults,
+            )
+        url = self.listing_url(libtype, filters, container_start, container_size)
+        return item_records(self.query(url))
+
+    def fetchItems(self, rating_keys: list[int], params: dict | None = None) -> list:
+        return item_records(self.query(self.details_url(rating_keys, params)))
+
+    def totalViewSize(self, libtype: str | None = None) -> int:
+        return int(self.query(self.size_url(libtype))["totalSize"])
+
+
 # Preview Thumbnail Functions
 
 
 def check_missing_preview_thumbnails_metadata(
-    medias: list, logger: logging.Logger
+    medias: list, logger: logging.Logger, report: FindingReporter | None = None
 ) -> int:
     count = 0
     for media in medias:
         for part in media.parts:
             if not part.hasPreviewThumbnails:
                 logger.warning(f"{part.file} is missing preview thumbnails")
+                if report is not None:
+                    report(part.file, media.videoResolution)
                 count += 1
     return count
 
 
-def process_photos(album: object, logger: logging.Logger) -> int:
+def iter_album_clips(album: object) -> Iterator[object]:
+    """Yield every clip in an album tree, walking nested albums with a stack."""
+    albums = [album]
+    while albums:
+        current = albums.pop()
+        albums.extend(reversed(current.albums()))
+        yield from current.clips()
+
+
+def process_photos(
+    album: object, logger: logging.Logger, report: FindingReporter | None = None
+) -> int:
     count = 0
-    for sub_album in album.albums():
-        count += process_photos(sub_album, logger)
-    for clip in album.clips():
-        count += check_missing_preview_thumbnails_metadata(clip.media, logger)
+    for clip in iter_album_clips(album):
+        count += check_missing_preview_thumbnails_metadata(clip.media, logger, report)
     return count
 
 
+def check_item_preview_thumbnails(
+    item: object,
+    media_data: str,
+    logger: logging.Logger,
+    report: FindingReporter | None = None,
+) -> int:
+    if item.type == "photo":
+        return process_photos(item, logger, report)
+    return check_missing_preview_thumbnails_metadata(item.media, logger, report)
+
+
 def find_missing_preview_thumbnails(
     library: object, config: Config, logger: logging.Logger
 ) -> None:
-    if should_skip_library(library, config, "enableBIFGeneration", logger):
-        return
-    logger.info(f"Processing library {library.title} of type {library.type}...")
-    count = 0
-    for item in library.all():
-        if item.type == "show":
-            for episode in item.episodes():
-                count += check_missing_preview_thumbnails_metadata(
-                    episode.media, logger
-                )
-        elif item.type == "movie":
-            count += check_missing_preview_thumbnails_metadata(item.media, logger)
-        elif item.type == "photo":
-            count += process_photos(item, logger)
-    if count > 0:
-        logger.info(f"Found {count} missing preview thumbnails in {library.title}...")
-    else:
-        logger.info(f"No missing preview thumbnails found in {library.title}...")
+    features = [
+        f for f in FEATURE_SCANS if f.setting == "find_missing_thumbnail_previews"
+    ]
+    scan_library(library, config, features, logger)
 
 
 # Voice Activity Functions
 
 
 def check_missing_voice_activity_metadata(
-    medias: list, media_data: str, logger: logging.Logger
+    medias: list,
+    media_data: str,
+    logger: logging.Logger,
+    report: FindingReporter | None = None,
 ) -> int:
     count = 0
     for media in medias:
         if not media.hasVoiceActivity:
-            logger.warning(
-                f'"{media_data}" for resolution {media.videoResolution} is missing voice activity data'
-            )
+            resolution = ""
+            if media.videoResolution is not None:
+                resolution = f" for resolution {media.videoResolution}"
+            logger.warning(f'"{media_data}"{resolution} is missing voice activity data')
+            if report is not None:
+                report(media_data, media.videoResolution)
             count += 1
     return count
 
 
+def check_item_voice_activity(
+    item: object,
+    media_data: str,
+    logger: logging.Logger,
+    report: FindingReporter | None = None,
+) -> int:
+    return check_missing_voice_activity_metadata(item.media, media_data, logger, report)
+
+
 def find_missing_voice_activity_data(
     library: object, config: Config, logger: logging.Logger
 ) -> None:
-    if should_skip_library(library, config, "enableVoiceActivityGeneration", logger):
-        return
-    logger.info(f"Processing {library.title} of type {library.type}...")
-    count = 0
-    for item in library.all():
-        if item.type == "show":
-            for episode in item.episodes():
-                media_data = f"{item.title} - {episode.title} (Season {episode.parentIndex}, Episode {episode.index})"
-                count += check_missing_voice_activity_metadata(
-                    episode.media, media_data, logger
-                )
-        elif item.type == "movie":
-            count += check_missing_voice_activity_metadata(
-                item.media, item.title, logger
-            )
-    if count > 0:
-        logger.info(
-            f"Found {count} files with missing voice activity in {library.title}..."
-        )
-    else:
-        logger.info(f"No files are missing voice activity data in {library.title}...")
+    features = [f for f in FEATURE_SCANS if f.setting == "find_missing_voice_activity"]
+    scan_library(library, config, features, logger)
 
 
 # Marker functions
 
+# Matches plexapi's default container size so each batch is a single request.
+MARKER_BATCH_SIZE = 100
+
 
 def check_missing_marker_metadata(
-    media: object, media_data: str, marker_type: str, logger: logging.Logger
+    media: object,
+    media_data: str,
+    marker_type: str,
+    logger: logging.Logger,
+    report: FindingReporter | None = None,
 ) -> int:
     for marker in media.markers:
         if marker.type == marker_type:
             return 0
     logger.warning(f'"{media_data}" is missing {marker_type} markers')
+    if report is not None:
+        report(media_data, None)
     return 1
 
 
 def find_missing_marker_metadata(
     library: object, config: Config, marker_type: str, logger: logging.Logger
 ) -> None:
-    if should_skip_library(
-        library, config, f"enable{marker_type.capitalize()}MarkerGeneration", logger
-    ):
+    features = [f for f in FEATURE_SCANS if f.extra_args == (marker_type,)]
+    scan_library(library, config, features, logger)
+
+
+# Check registry
+
+# Item elements that section listings leave out, with the parameters that add
+# them to a batched /library/metadata request.
+DETAIL_PARAMS: dict[str, dict[str, int]] = {
+    "Marker": {"includeMarkers": 1},
+    "Chapter": {"includeChapters": 1},
+}
+
+
+class FeatureScan(NamedTuple):
+    """Declares a check: the config flag and library setting that enable it,
+    the item types it applies to and the item elements it reads."""
+
+    label: str
+    setting: str
+    library_setting: str
+    check: Callable[..., int]
+    item_types: tuple[str, ...] = ("episode", "movie")
+    elements: tuple[str, ...] = ("Media",)
+    extra_args: tuple = ()
+
+    @property
+    def needs_detail(self) -> bool:
+        return any(element in DETAIL_PARAMS for element in self.elements)
+
+
+FEATURE_SCANS: list[FeatureScan] = [
+    FeatureScan(
+        "missing thumbnail previews",
+        "find_missing_thumbnail_previews",
+        "enableBIFGeneration",
+        check_item_preview_thumbnails,
+        ("episode", "movie", "clip", "photo"),
+        ("Media", "Part"),
+    ),
+    FeatureScan(
+        "missing voice activity data",
+        "find_missing_voice_activity",
+        "enableVoiceActivityGeneration",
+        check_item_voice_activity,
+    ),
+    FeatureScan(
+        "missing intro markers",
+        "find_missing_intro_markers",
+        "enableIntroMarkerGeneration",
+        check_missing_marker_metadata,
+        elements=("Marker",),
+        extra_args=("intro",),
+    ),
+    FeatureScan(
+        "missing credits markers",
+        "find_missing_credits_markers",
+        "enableCreditsMarkerGeneration",
+        check_missing_marker_metadata,
+        elements=("Marker",),
+        extra_args=("credits",),
+    ),
+    FeatureScan(
+        "missing ad markers",
+        "find_missing_ad_markers",
+        "enableAdMarkerGeneration",
+        check_missing_marker_metadata,
+        elements=("Marker",),
+        extra_args=("ad",),
+    ),
+]
+
+
+class RequestPlan(NamedTuple):
+    elements: frozenset[str]
+    detail_params: dict[str, int]
+    detail_item_types: frozenset[str]
+
+
+def plan_requests(features: list[FeatureScan]) -> RequestPlan:
+    """Work out the fewest requests that give every check the elements it reads.
+
+    Elements that come with the section listing cost nothing extra. Checks
+    that read detail elements share one batched metadata request, so a new
+    check only adds a round trip if it needs a detail no other check does.
+    """
+    elements = set()
+    detail_params = {}
+    detail_item_types = set()
+    for feature in features:
+        elements.update(feature.elements)
+        for element in feature.elements:
+            if element in DETAIL_PARAMS:
+                detail_params.update(DETAIL_PARAMS[element])
+                detail_item_types.update(feature.item_types)
+    return RequestPlan(frozenset(elements), detail_params, frozenset(detail_item_types))
+
+
+def fetch_details(
+    library: object, rating_keys: list[int], params: dict[str, int]
+) -> dict[int, object]:
+    """Fetch many items with their detail elements in one request, keyed by ratingKey."""
+    if not rating_keys:
+        return {}
+    with PROFILE.timed("scan", library.title, "fetch children"):
+        fetched = library.fetchItems(rating_keys, params=params)
+    items = {}
+    for item in fetched:
+        # Items fetched by a key list never count as fully loaded, so plexapi
+        # would otherwise reload every item without markers one at a time.
+        if not isinstance(item, ItemRecord):
+            item._autoReload = False
+        items[item.ratingKey] = item
+    return items
+
+
+# Scan state
+
+# library_scans held one watermark per library; it is replaced by one per
+# library and feature, at the cost of a single full scan after upgrading.
+STATE_SCHEMA = """
+DROP TABLE IF EXISTS library_scans;
+CREATE TABLE IF NOT EXISTS feature_scans (
+    library_key TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    watermark REAL NOT NULL,
+    full_scan_at REAL NOT NULL,
+    PRIMARY KEY (library_key, feature)
+);
+CREATE TABLE IF NOT EXISTS findings (
+    library_key TEXT NOT NULL,
+    rating_key INTEGER NOT NULL,
+    feature TEXT NOT NULL,
+    missing INTEGER NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (rating_key, feature)
+);
+CREATE INDEX IF NOT EXISTS findings_library ON findings (library_key, feature);
+"""
+
+
+class LibraryState(NamedTuple):
+    """How far completed scans of a library got for a set of features."""
+
+    watermark: float
+    full_scan_at: float
+
+
+class StateStore:
+    """SQLite-backed scan state kept between runs.
+
+    Holds a high-water mark per library and feature and the last result of
+    every check by ratingKey, so incremental runs only re-check items Plex
+    reports as changed, items that were missing data, and known-good items
+    whose result expired. Schedules scanning different features keep their
+    own marks and findings.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.executescript(STATE_SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def feature_states(
+        self, library_key: str, features: list[str]
+    ) -> dict[str, LibraryState]:
+        placeholders = ",".join("?" * len(features))
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT feature, watermark, full_scan_at FROM feature_scans "
+                f"WHERE library_key = ? AND feature IN ({placeholders})",
+                (library_key, *features),
+            ).fetchall()
+        return {feature: LibraryState(*state) for feature, *state in rows}
+
+    def library_state(
+        self, library_key: str, features: list[str]
+    ) -> LibraryState | None:
+        """The state all the features have reached, or None if one was never scanned."""
+        states = self.feature_states(library_key, features)
+        if len(states) < len(features):
+            return None
+        return LibraryState(
+            min(state.watermark for state in states.values()),
+            min(state.full_scan_at for state in states.values()),
+        )
+
+    def clear_findings(self, library_key: str, features: list[str]) -> None:
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM findings WHERE library_key = ? AND feature = ?",
+                [(library_key, feature) for feature in features],
+            )
+
+    def record_findings(
+        self, library_key: str, results: list[tuple[int, str, int]]
+    ) -> None:
+        """Store (ratingKey, feature, missing count) results for a library."""
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO findings "
+                "(library_key, rating_key, feature, missing, checked_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(library_key, *result, now) for result in results],
+            )
+
+    def keys_to_recheck(
+        self, library_key: str, features: list[str], max_age: float
+    ) -> list[int]:
+        """Items that were missing data, or whose known-good result has expired."""
+        placeholders = ",".join("?" * len(features))
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT DISTINCT rating_key FROM findings "
+                f"WHERE library_key = ? AND feature IN ({placeholders}) "
+                "AND (missing > 0 OR checked_at < ?) ORDER BY rating_key",
+                (library_key, *features, time.time() - max_age),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def forget_items(self, library_key: str, rating_keys: list[int]) -> None:
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM findings WHERE library_key = ? AND rating_key = ?",
+                [(library_key, rating_key) for rating_key in rating_keys],
+            )
+
+    def missing_counts(self, library_key: str, features: list[str]) -> dict[str, int]:
+        counts = dict.fromkeys(features, 0)
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT feature, SUM(missing) FROM findings "
+                "WHERE library_key = ? GROUP BY feature",
+                (library_key,),
+            ).fetchall()
+        for feature, missing in rows:
+            if feature in counts:
+                counts[feature] = missing
+        return counts
+
+    def finish_scan(
+        self, library_key: str, features: list[str], watermark: float, full: bool
+    ) -> None:
+        previous = self.feature_states(library_key, features)
+        rows = []
+        for feature in features:
+            state = previous.get(feature)
+            if full or state is None:
+                rows.append((library_key, feature, watermark, time.time()))
+            else:
+                rows.append(
+                    (
+                        library_key,
+                        feature,
+                        max(watermark, state.watermark),
+                        state.full_scan_at,
+                    )
+                )
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO feature_scans "
+                "(library_key, feature, watermark, full_scan_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+
+def open_state_store(config: Config, logger: logging.Logger) -> StateStore | None:
+    if not config.incremental_scans:
+        return None
+    if not os.path.exists(config.state_directory):
+        logger.warning(
+            f'State directory "{config.state_directory}" does not exist, running a full scan...'
+        )
+        return None
+    name = f"{server_prefix(config, 'preview_maid')}.db"
+    return StateStore(os.path.join(config.state_directory, name))
+
+
+def item_timestamp(item: object) -> float:
+    changed = getattr(item, "updatedAt", None) or getattr(item, "addedAt", None)
+    return changed.timestamp() if changed else 0.0
+
+
+def incremental_since(state: LibraryState | None, config: Config) -> datetime | None:
+    """The point to re-check a library from, or None when a full scan is due."""
+    if state is None:
+        return None
+    if time.time() - state.full_scan_at >= config.full_scan_interval_days * 86400:
+        return None
+    # Plex timestamps have one second resolution, so overlap by a second
+    # rather than risk skipping an item updated alongside the watermark.
+    return datetime.fromtimestamp(state.watermark - 1, tz=UTC)
+
+
+# Checkpoints
+
+CHECKPOINT_INTERVAL = 30
+CHECKPOINT_FLUSH_TIMEOUT = 5
+# Set by the signal handler, so scans on worker threads stop between batches
+# and a run stopped on the way out is saved as interrupted rather than failed.
+STOPPING = threading.Event()
+
+
+class LibraryProgress(NamedTuple):
+    """How far an interrupted run got through a library."""
+
+    offset: int
+    counts: dict[str, int]
+    done: bool
+
+
+class ScanCheckpoint:
+    """Scan progress kept on disk so an interrupted run can pick up where it stopped.
+
+    For each library it records how many listed items have been checked, the
+    counts found so far and whether the library finished. Progress is written
+    at most every CHECKPOINT_INTERVAL seconds and whenever a run stops early,
+    and removed once a run completes. Item order depends on the backend and
+    filters, so a checkpoint is only resumed by a run with the same scope.
+    After a run that failed rather than being interrupted, only libraries it
+    did not finish are resumed, so one library that keeps failing does not
+    stop the others from ever being scanned again.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.path: str | None = None
+        self.scope: list[str] = []
+        self.libraries: dict[str, LibraryProgress] = {}
+        self.saved_at = 0.0
+        self.logger = logging.getLogger("preview_maid")
+
+    def start_run(
+        self, path: str | None, scope: list[str], logger: logging.Logger
+    ) -> None:
+        with self.lock:
+            self.path = path
+            self.scope = scope
+            self.libraries = {}
+            self.saved_at = time.monotonic()
+            self.logger = logger
+        if path is None or not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding="utf-8") as checkpoint_file:
+                saved = json.load(checkpoint_file)
+            libraries = {
+                key: LibraryProgress(**progress)
+                for key, progress in saved["libraries"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f'Could not read checkpoint "{path}", starting over: {e}')
+            return
+        if saved.get("scope") != scope:
+            logger.info(
+                "Scan settings changed since the last checkpoint, starting over..."
+            )
+            return
+        if saved.get("failed"):
+            libraries = {
+                key: progress
+                for key, progress in libraries.items()
+                if not progress.done
+            }
+            logger.info("Resuming the libraries the last run did not finish...")
+        else:
+            logger.info("Resuming the interrupted run from its last checkpoint...")
+        with self.lock:
+            self.libraries = libraries
+
+    def progress(self, library_key: object) -> LibraryProgress | None:
+        with self.lock:
+            return self.libraries.get(str(library_key))
+
+    def update(
+        self,
+        library_key: object,
+        offset: int,
+        counts: dict[str, int],
+        done: bool = False,
+    ) -> None:
+        if self.path is None:
+            return
+        with self.lock:
+            self.libraries[str(library_key)] = LibraryProgress(
+                offset, dict(counts), done
+            )
+            if time.monotonic() - self.saved_at >= CHECKPOINT_INTERVAL:
+                self.save()
+
+    def save(self, failed: bool = False) -> None:
+        """Write the progress so far, replacing the last checkpoint atomically."""
+        if self.path is None:
+            return
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as checkpoint_file:
+                json.dump(
+                    {
+                        "scope": self.scope,
+                        "failed": failed,
+                        "libraries": {
+                            key: progress._asdict()
+                            for key, progress in self.libraries.items()
+                        },
+                    },
+                    checkpoint_file,
+                )
+            os.replace(temporary, self.path)
+        except OSError as e:
+            self.logger.warning(f'Could not write checkpoint "{self.path}": {e}')
+        self.saved_at = time.monotonic()
+
+    def flush(self) -> None:
+        """Save now, for signal handlers.
+
+        A signal can arrive while the main thread holds the lock, so this
+        gives up after a few seconds instead of deadlocking.
+        """
+        if self.lock.acquire(timeout=CHECKPOINT_FLUSH_TIMEOUT):
+            try:
+                self.save()
+            finally:
+                self.lock.release()
+
+    def finish_run(self, succeeded: bool, interrupted: bool = False) -> None:
+        """Remove the checkpoint after a complete run, or save it after an incomplete one."""
+        with self.lock:
+            if self.path is None:
+                return
+            if not succeeded:
+                self.save(failed=not interrupted)
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+            self.path = None
+
+
+CHECKPOINT = ScanCheckpoint()
+
+
+def checkpoint_path(config: Config, logger: logging.Logger) -> str | None:
+    if not config.resumable_scans:
+        return None
+    if not os.path.exists(config.state_directory):
+        logger.warning(
+            f'State directory "{config.state_directory}" does not exist, scans will not be resumable...'
+        )
+        return None
+    # Each scope gets its own file, so schedules scanning different features
+    # keep separate checkpoints.
+    scope = ",".join(checkpoint_scope(config)).encode()
+    prefix = server_prefix(config, "checkpoint")
+    name = f"{prefix}-{hashlib.sha256(scope).hexdigest()[:12]}.json"
+    return os.path.join(config.state_directory, name)
+
+
+def checkpoint_scope(config: Config) -> list[str]:
+    """Settings that change which items are listed, or their order."""
+    scope = [config.scan_backend, config.photo_traversal]
+    if config.incremental_scans:
+        scope.append("incremental")
+    return scope + [f.label for f in FEATURE_SCANS if getattr(config, f.setting)]
+
+
+# Reports
+
+FINDING_FIELDS = ("rating_key", "library", "feature", "subject", "resolution")
+
+# Called by a check with the file or title and resolution of each finding.
+FindingReporter = Callable[[str, str | None], None]
+
+
+class Finding:
+    """A single missing piece of data, as written to the run's reports."""
+
+    __slots__ = FINDING_FIELDS
+
+    def __init__(
+        self,
+        rating_key: int,
+        library: str,
+        feature: str,
+        subject: str,
+        resolution: str | None,
+    ) -> None:
+        self.rating_key = rating_key
+        self.library = library
+        self.feature = feature
+        self.subject = subject
+        self.resolution = resolution
+
+    def as_row(self) -> tuple:
+        return tuple(getattr(self, name) for name in FINDING_FIELDS)
+
+
+class ReportWriter:
+    """Streams findings to this run's JSON Lines and CSV reports.
+
+    Each finding is written as soon as it is reported, so memory use does not
+    grow with the number of findings; only the per-library summary is kept.
+    """
+
+    def __init__(self, jsonl: TextIO, csv_file: TextIO) -> None:
+        self.jsonl = jsonl
+        self.csv = csv.writer(csv_file)
+        self.csv.writerow(FINDING_FIELDS)
+        self.lock = threading.Lock()
+        self.summary: dict[str, dict[str, int]] = {}
+
+    def write(self, finding: Finding) -> None:
+        row = finding.as_row()
+        with self.lock:
+            self.jsonl.write(json.dumps(dict(zip(FINDING_FIELDS, row, strict=True))))
+            self.jsonl.write("\n")
+            self.csv.writerow(row)
+
+    def add_summary(self, library: str, counts: dict[str, int]) -> None:
+        with self.lock:
+            self.summary[library] = counts
+
+
+@contextmanager
+def open_report_writer(
+    config: Config, logger: logging.Logger
+) -> Iterator[ReportWriter | None]:
+    """Open this run's reports, writing the per-library summary when done."""
+    if not config.write_reports:
+        yield None
         return
-    logger.info(f"Processing {library.title} of type {library.type}...")
-    count = 0
-    for item in library.all():
-        if item.type == "show":
-            for episode in item.episodes():
-                media_data = f"{item.title} - {episode.title} (Season {episode.parentIndex}, Episode {episode.index})"
-                count += check_missing_marker_metadata(
-                    episode, media_data, marker_type, logger
+    if not os.path.exists(config.report_directory):
+        logger.warning(
+            f'Report directory "{config.report_directory}" does not exist, skipping reports...'
+        )
+        yield None
+        return
+
+    stamp = datetime.now(tz=UTC).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(
+        config.report_directory, f"{server_prefix(config, 'preview_maid')}-{stamp}"
+    )
+    with (
+        open(f"{path}.jsonl", "w", encoding="utf-8") as jsonl,
+        open(f"{path}.csv", "w", encoding="utf-8", newline="") as csv_file,
+    ):
+        report = ReportWriter(jsonl, csv_file)
+        try:
+            yield report
+        finally:
+            with open(f"{path}.summary.json", "w", encoding="utf-8") as summary:
+                json.dump(report.summary, summary, indent=2)
+    logger.info(f"Wrote reports to {path}.jsonl and {path}.csv")
+
+
+# Metrics
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds in seconds; listing a large section can take close to a minute.
+REQUEST_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def request_endpoint(url: str) -> str:
+    """The request path with ids replaced, so each endpoint is a single series."""
+    return re.sub(r"/\d[\d,]*", "/{id}", urlsplit(url).path)
+
+
+def format_labels(labels: dict[str, object]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        escaped = str(value).replace("\\", r"\\").replace('"', r"\"")
+        escaped = escaped.replace("\n", r"\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class RequestStats:
+    """Latency histogram and response size total for one Plex endpoint."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(REQUEST_LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def observe(self, seconds: float, size: int) -> None:
+        self.buckets[bisect_left(REQUEST_LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.bytes += size
+
+    def samples(self, endpoint: str) -> Iterator[Sample]:
+        bounds = [*REQUEST_LATENCY_BUCKETS, "+Inf"]
+        for bound, count in zip(bounds, accumulate(self.buckets), strict=True):
+            yield "_bucket", {"endpoint": endpoint, "le": bound}, count
+        yield "_sum", {"endpoint": endpoint}, self.seconds
+        yield "_count", {"endpoint": endpoint}, self.count
+
+
+Sample = tuple[str, dict[str, object], float]
+
+
+class MetricFamily(NamedTuple):
+    name: str
+    kind: str
+    description: str
+    samples: list[Sample]
+
+
+class LibraryMetrics(NamedTuple):
+    seconds: float
+    items: int
+    check_seconds: dict[str, float]
+    missing: dict[str, int]
+    failed_items: int = 0
+
+
+class ScanMetrics:
+    """Process-wide scan metrics, rendered in the Prometheus text format.
+
+    Plex request stats accumulate for the life of the process, while the
+    per-library gauges are replaced by each run. Each server in PLEX_SERVERS
+    has its own, whose samples carry a server label.
+    """
+
+    def __init__(self, server: str = "") -> None:
+        self.labels = {"server": server} if server else {}
+        self.lock = threading.Lock()
+        self.requests: dict[str, RequestStats] = defaultdict(RequestStats)
+        self.responses: dict[tuple[str, int], int] = defaultdict(int)
+        self.libraries: dict[str, LibraryMetrics] = {}
+        self.failed_libraries: set[str] = set()
+        self.event_items: dict[str, int] = defaultdict(int)
+        self.remediation: tuple[int, int] | None = None
+        self.last_run: tuple[float, float, bool] | None = None
+        self.request_limit: float | None = None
+
+    def observe_response(
+        self,
+        response: requests.Response | httpx.Response,
+        *args: object,
+        **kwargs: object,
+    ) -> None:
+        """Session response hook recording the latency and size of each request.
+
+        The session reads the body straight after its hooks run, so reading it
+        here lets the latency cover the whole download rather than the headers.
+        The async client calls it too, once each response has been read.
+        """
+        started = time.perf_counter()
+        size = len(response.content)
+        seconds = response.elapsed.total_seconds() + time.perf_counter() - started
+        endpoint = request_endpoint(str(response.url))
+        with self.lock:
+            self.requests[endpoint].observe(seconds, size)
+            self.responses[endpoint, response.status_code] += 1
+
+    def start_run(self) -> None:
+        with self.lock:
+            self.libraries = {}
+            self.failed_libraries = set()
+
+    def record_library(self, library: str, metrics: LibraryMetrics) -> None:
+        with self.lock:
+            self.libraries[library] = metrics
+
+    def record_library_failure(self, library: str) -> None:
+        with self.lock:
+            self.failed_libraries.add(library)
+
+    def record_event_items(self, library: str, items: int) -> None:
+        with self.lock:
+            self.event_items[library] += items
+
+    def record_remediation(self, queued: int, analyzed: int) -> None:
+        with self.lock:
+            self.remediation = (queued, analyzed)
+
+    def set_request_limit(self, limit: float) -> None:
+        with self.lock:
+            self.request_limit = limit
+
+    def finish_run(self, seconds: float, succeeded: bool) -> None:
+        with self.lock:
+            self.last_run = (seconds, time.time(), succeeded)
+
+    def render(self) -> str:
+        return render_metrics([self])
+
+    def families(self) -> list[MetricFamily]:
+        """Every metric family with its samples, labelled with the server if named."""
+        families: list[MetricFamily] = []
+
+        def family(
+            name: str,
+            kind: str,
+            description: str,
+            samples: Iterable[Sample],
+        ) -> None:
+            families.append(
+                MetricFamily(
+                    name,
+                    kind,
+                    description,
+                    [
+                        (suffix, {**self.labels, **labels}, value)
+                        for suffix, labels, value in samples
+                    ],
                 )
-        elif item.type == "movie":
-            count += check_missing_marker_metadata(
-                item, item.title, marker_type, logger
             )
-    if count > 0:
-        logger.info(
-            f"Found {count} files with missing {marker_type} markers in {library.title}..."
+
+        with self.lock:
+            if self.last_run is not None:
+                seconds, finished_at, succeeded = self.last_run
+                family(
+                    "preview_maid_last_run_duration_seconds",
+                    "gauge",
+                    "Wall time of the last run.",
+                    [("", {}, seconds)],
+                )
+                family(
+                    "preview_maid_last_run_timestamp_seconds",
+                    "gauge",
+                    "When the last run finished.",
+                    [("", {}, finished_at)],
+                )
+                family(
+                    "preview_maid_last_run_success",
+                    "gauge",
+                    "Whether the last run completed.",
+                    [("", {}, int(succeeded))],
+                )
+
+            if self.remediation is not None:
+                queued, analyzed = self.remediation
+                family(
+                    "preview_maid_remediation_queued_items",
+                    "gauge",
+                    "Items waiting to be sent for analysis.",
+                    [("", {}, queued)],
+                )
+                family(
+                    "preview_maid_remediation_analyze_requests_total",
+                    "counter",
+                    "Analyze requests sent for items missing data.",
+                    [("", {}, analyzed)],
+                )
+
+            if self.request_limit is not None:
+                family(
+                    "preview_maid_plex_request_limit",
+                    "gauge",
+                    "Current adaptive limit on Plex requests in flight.",
+                    [("", {}, self.request_limit)],
+                )
+
+            libraries = self.libraries.items()
+            family(
+                "preview_maid_library_scan_duration_seconds",
+                "gauge",
+                "Wall time spent scanning each library in the last run.",
+                (("", {"library": name}, m.seconds) for name, m in libraries),
+            )
+            family(
+                "preview_maid_library_items_scanned",
+                "gauge",
+                "Items checked in each library in the last run.",
+                (("", {"library": name}, m.items) for name, m in libraries),
+            )
+            family(
+                "preview_maid_library_items_per_second",
+                "gauge",
+                "Items checked per second of library scan time in the last run.",
+                (
+                    ("", {"library": name}, m.items / m.seconds if m.seconds else 0.0)
+                    for name, m in libraries
+                ),
+            )
+            family(
+                "preview_maid_check_duration_seconds",
+                "gauge",
+                "Time spent in each feature's checks per library in the last run.",
+                (
+                    ("", {"library": name, "feature": feature}, seconds)
+                    for name, m in libraries
+                    for feature, seconds in m.check_seconds.items()
+                ),
+            )
+            family(
+                "preview_maid_missing_items",
+                "gauge",
+                "Items missing data per library and feature in the last run.",
+                (
+                    ("", {"library": name, "feature": feature}, count)
+                    for name, m in libraries
+                    for feature, count in m.missing.items()
+                ),
+            )
+            family(
+                "preview_maid_library_items_failed",
+                "gauge",
+                "Items that could not be checked per library in the last run.",
+                (("", {"library": name}, m.failed_items) for name, m in libraries),
+            )
+            family(
+                "preview_maid_library_scan_failed",
+                "gauge",
+                "Libraries whose scan failed part way through the last run.",
+                (("", {"library": name}, 1) for name in sorted(self.failed_libraries)),
+            )
+            family(
+                "preview_maid_event_items_checked_total",
+                "counter",
+                "Items checked after Plex reported them added or updated.",
+                (
+                    ("", {"library": name}, count)
+                    for name, count in sorted(self.event_items.items())
+                ),
+            )
+
+            endpoints = sorted(self.requests.items())
+            family(
+                "preview_maid_plex_requests_total",
+                "counter",
+                "Plex requests by endpoint and response status.",
+                (
+                    ("", {"endpoint": endpoint, "code": code}, count)
+                    for (endpoint, code), count in sorted(self.responses.items())
+                ),
+            )
+            family(
+                "preview_maid_plex_request_duration_seconds",
+                "histogram",
+                "Plex request latency, including the response download.",
+                (
+                    sample
+                    for endpoint, stats in endpoints
+                    for sample in stats.samples(endpoint)
+                ),
+            )
+            family(
+                "preview_maid_plex_response_bytes_total",
+                "counter",
+                "Bytes received from Plex by endpoint.",
+                (("", {"endpoint": endpoint}, s.bytes) for endpoint, s in endpoints),
+            )
+        return families
+
+
+def render_metrics(metrics: Iterable[ScanMetrics]) -> str:
+    """Render the metrics of several servers, giving each family once."""
+    merged: dict[str, MetricFamily] = {}
+    for server_metrics in metrics:
+        for family in server_metrics.families():
+            merged.setdefault(family.name, family._replace(samples=[])).samples.extend(
+                family.samples
+            )
+    lines = []
+    for name, kind, description, samples in merged.values():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+METRICS = ScanMetrics()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if urlsplit(self.path).path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics(all_metrics()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        # Scrapes every few seconds would drown out the scan output.
+        pass
+
+
+def start_metrics_server(port: int, logger: logging.Logger) -> ThreadingHTTPServer:
+    """Serve /metrics on a background thread, alongside the schedule loop."""
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on port {server.server_address[1]} at /metrics...")
+    return server
+
+
+def write_metrics_textfile(path: str, logger: logging.Logger) -> None:
+    """Write the metrics for node-exporter's textfile collector.
+
+    The file is replaced in one step so the collector never reads half of it.
+    """
+    try:
+        with open(f"{path}.tmp", "w", encoding="utf-8") as textfile:
+            textfile.write(render_metrics(all_metrics()))
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f'Could not write metrics to "{path}": {e}')
+
+
+# Request rate control
+
+# At the lowest limit a lone request is in flight a tenth of the time.
+MIN_REQUEST_LIMIT = 0.1
+REQUEST_LIMIT_BACKOFF = 0.5
+# Statuses Plex sends when it is too busy to serve a request.
+CONGESTION_STATUSES = frozenset((429, 503))
+
+
+class AdaptiveLimiter:
+    """AIMD limit on the number of Plex requests in flight.
+
+    The limit starts at one and grows by one for each full window of
+    responses that arrive within the latency target. It halves when a
+    response is slower than the target, fails, or is turned away by Plex.
+    It halves at most once per round trip, since responses to requests sent
+    before a back-off still reflect the old limit. Below one, the limit acts
+    as a duty cycle: requests go one at a time with a pause between them, so
+    a server that struggles with a single request still gets room to recover.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        latency_target: float,
+        metrics: ScanMetrics | None = None,
+    ) -> None:
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.metrics = metrics or METRICS
+        self.limit = 1.0
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.backed_off_at = 0.0
+        self.condition = threading.Condition()
+
+    def start_delay(self) -> float | None:
+        """Seconds until a request may start, or None until one is released."""
+        wait = self.next_start - time.monotonic()
+        if wait > 0:
+            return wait
+        return 0 if self.in_flight < max(1, int(self.limit)) else None
+
+    def acquire(self) -> float:
+        """Wait for room under the limit, returning when the request started."""
+        with self.condition:
+            while (delay := self.start_delay()) != 0:
+                self.condition.wait(delay)
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, congested: bool = False) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            latency = now - started
+            if congested or latency > self.latency_target:
+                if started >= self.backed_off_at:
+                    self.limit = max(
+                        MIN_REQUEST_LIMIT, self.limit * REQUEST_LIMIT_BACKOFF
+                    )
+                    self.backed_off_at = now
+            elif self.limit < 1:
+                self.limit = min(1.0, self.limit * 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if self.limit < 1:
+                self.next_start = now + latency * (1 / self.limit - 1)
+            self.condition.notify_all()
+        self.metrics.set_request_limit(self.limit)
+
+
+class AdaptiveAdapter(HTTPAdapter):
+    """An HTTP adapter that sends every request through an AdaptiveLimiter."""
+
+    def __init__(self, limiter: AdaptiveLimiter, **kwargs: object) -> None:
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(
+        self, request: requests.PreparedRequest, *args: object, **kwargs: object
+    ) -> requests.Response:
+        started = self.limiter.acquire()
+        congested = True
+        try:
+            response = super().send(request, *args, **kwargs)
+            congested = response.status_code in CONGESTION_STATUSES
+            return response
+        finally:
+            self.limiter.release(started, congested)
+
+
+class AsyncAdaptiveLimiter(AdaptiveLimiter):
+    """An AdaptiveLimiter for requests sent as coroutines on one event loop."""
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        super().__init__(*args, **kwargs)
+        self.released = asyncio.Condition()
+
+    async def acquire_async(self) -> float:
+        async with self.released:
+            while (delay := self.start_delay()) != 0:
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(self.released.wait(), delay)
+            self.in_flight += 1
+            return time.monotonic()
+
+    async def release_async(self, started: float, congested: bool = False) -> None:
+        self.release(started, congested)
+        async with self.released:
+            self.released.notify_all()
+
+
+# Profiling
+
+RUN_PHASES = ("connect", "list sections", "fetch settings", "scan", "log")
+PROFILE_STATS_LIMIT = 50
+
+
+class PhaseTimings:
+    """Time spent in each phase of a run, kept as a tree of phase paths.
+
+    A path such as ("scan", "TV", "list items") adds up the time and calls
+    recorded under it. Work done by concurrent workers is summed, so a phase
+    can take longer in total than the wall time of its parent.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.phases: dict[tuple[str, ...], list] = {}
+
+    def start_run(self, enabled: bool) -> None:
+        with self.lock:
+            self.enabled = enabled
+            self.phases = {}
+
+    def add(self, path: tuple[str, ...], seconds: float, calls: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            phase = self.phases.setdefault(path, [0.0, 0])
+            phase[0] += seconds
+            phase[1] += calls
+
+    @contextmanager
+    def timed(self, *path: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(path, time.perf_counter() - started)
+
+    def tree_lines(self) -> list[str]:
+        """Render the timings as an indented tree.
+
+        Phases that were not timed themselves show the total of their children.
+        """
+        with self.lock:
+            phases = dict(self.phases)
+        children: dict[tuple[str, ...], list[tuple[str, ...]]] = defaultdict(list)
+        nodes = dict.fromkeys(
+            timed[:depth] for timed in phases for depth in range(1, len(timed) + 1)
         )
-    else:
-        logger.info(f"No files are missing {marker_type} markers in {library.title}...")
+        for path in nodes:
+            children[path[:-1]].append(path)
+        children[()].sort(key=lambda path: RUN_PHASES.index(path[0]))
+
+        def total(path: tuple[str, ...]) -> float:
+            if path in phases:
+                return phases[path][0]
+            return sum(total(child) for child in children[path])
+
+        lines = []
+        pending = [(path, 0) for path in reversed(children[()])]
+        while pending:
+            path, depth = pending.pop()
+            calls = phases[path][1] if path in phases else 0
+            suffix = f" ({calls} calls)" if calls > 1 else ""
+            lines.append(f"{'  ' * depth}{path[-1]}: {total(path):.3f}s{suffix}")
+            pending.extend((child, depth + 1) for child in reversed(children[path]))
+        return lines
+
+
+PROFILE = PhaseTimings()
+
+
+class TimedHandler(logging.Handler):
+    """Wraps a log handler, adding the time it spends on records to the log phase."""
+
+    def __init__(self, handler: logging.Handler) -> None:
+        super().__init__(handler.level)
+        self.handler = handler
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        started = time.perf_counter()
+        try:
+            return self.handler.handle(record)
+        finally:
+            PROFILE.add(("log",), time.perf_counter() - started)
+
+
+# Held while log handlers are wrapped or restored, as servers scanned at once
+# share the app logger's handlers.
+TIMED_LOGGING_LOCK = threading.Lock()
+
+
+@contextmanager
+def timed_logging(logger: logging.Logger) -> Iterator[None]:
+    """Count the time spent handling ``logger``'s records toward the log phase.
+
+    Records propagate to ancestor loggers, such as the app logger above a
+    server's child logger, so their handlers are wrapped too. Loggers whose
+    handlers another run already wrapped are left to that run.
+    """
+    loggers = [logger]
+    while loggers[-1].propagate and loggers[-1].parent is not None:
+        loggers.append(loggers[-1].parent)
+    with TIMED_LOGGING_LOCK:
+        wrapped = [
+            (emitting, emitting.handlers)
+            for emitting in loggers
+            if not any(
+                isinstance(handler, TimedHandler) for handler in emitting.handlers
+            )
+        ]
+        for emitting, handlers in wrapped:
+            emitting.handlers = [TimedHandler(handler) for handler in handlers]
+    try:
+        yield
+    finally:
+        with TIMED_LOGGING_LOCK:
+            for emitting, handlers in wrapped:
+                emitting.handlers = handlers
+
+
+def write_profile(
+    profiler: cProfile.Profile, config: Config, logger: logging.Logger
+) -> None:
+    """Dump the run's profile, with a readable summary, to the log directory."""
+    if not os.path.exists(config.log_directory):
+        logger.warning(
+            f'Log directory "{config.log_directory}" does not exist, skipping the profile dump...'
+        )
+        return
+    stamp = datetime.now(tz=UTC).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(config.log_directory, f"preview_maid-{stamp}")
+    profiler.dump_stats(f"{path}.prof")
+    with open(f"{path}.txt", "w", encoding="utf-8") as summary:
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_STATS_LIMIT)
+    logger.info(f"Wrote profile to {path}.prof and {path}.txt")
+
+
+@contextmanager
+def profile_run(config: Config, logger: logging.Logger) -> Iterator[None]:
+    """Time the phases of a run when PROFILE is set, logging the tree at the end.
+
+    With PROFILE_DUMP, the run is also profiled with cProfile. Only the
+    thread running the scan is profiled, so work on SCAN_CONCURRENCY worker
+    threads shows up as time spent waiting on them.
+    """
+    PROFILE.start_run(config.profile)
+    if not config.profile:
+        yield
+        return
+    profiler = cProfile.Profile() if config.profile_dump else None
+    try:
+        with timed_logging(logger):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        logger.info("Run timings:")
+        for line in PROFILE.tree_lines():
+            logger.info(f"  {line}")
+        if profiler is not None:
+            write_profile(profiler, config, logger)
 
 
 # Main logic
 
 
-def find_missing_metadata(config: Config, logger: logging.Logger) -> None:
+class LibraryPlan(NamedTuple):
+    library: object
+    features: list[FeatureScan]
+
+
+def plan_library(
+    library: object,
+    config: Config,
+    features: list[FeatureScan],
+    logger: logging.Logger,
+) -> LibraryPlan:
+    """Decide which features to scan in a library from a single settings fetch."""
+    if not features or is_library_excluded(library, config, logger):
+        return LibraryPlan(library, [])
+    with PROFILE.timed("fetch settings", library.title):
+        settings = library_settings(library)
+    active = []
+    for feature in features:
+        if settings.get(feature.library_setting, False):
+            active.append(feature)
+        else:
+            logger.info(
+                f"Skipping {library.title} as {feature.library_setting} is disabled..."
+            )
+    return LibraryPlan(library, active)
+
+
+def plan_libraries(
+    libraries: list,
+    config: Config,
+    features: list[FeatureScan],
+    logger: logging.Logger,
+) -> list[LibraryPlan]:
+    """Apply every skip rule up front, keeping the libraries with work to do."""
+    plans = (plan_library(library, config, features, logger) for library in libraries)
+    return [plan for plan in plans if plan.features]
+
+
+class LibraryScan:
+    """Per-library scan state shared by the sync and async engines."""
+
+    def __init__(
+        self,
+        library: object,
+        features: list[FeatureScan],
+        logger: logging.Logger,
+        config: Config | None = None,
+        store: StateStore | None = None,
+        report: ReportWriter | None = None,
+        resume: bool = True,
+    ) -> None:
+        self.library = library
+        self.logger = logger
+        self.config = config
+        self.state = server_state(config.server_name if config else "")
+        self.store = store
+        self.report = report
+        self.checked: set[int] = set()
+        self.features = features
+        self.requests = plan_requests(features)
+        self.counts = dict.fromkeys((feature.label for feature in features), 0)
+        self.check_seconds = dict.fromkeys(self.counts, 0.0)
+        self.items_scanned = 0
+        self.failed_items = 0
+        self.started = time.monotonic()
+        self.watermark = 0.0
+        # The oldest change among items that could not be checked, which the
+        # saved watermark must not pass so the next run lists them again.
+        self.failed_watermark: float | None = None
+        self.since = None
+        self.offset = 0
+        progress = self.state.checkpoint.progress(library.key) if resume else None
+        if progress is not None:
+            self.offset = progress.offset
+            self.counts.update(
+                (label, count)
+                for label, count in progress.counts.items()
+                if label in self.counts
+            )
+            logger.info(f"Resuming {library.title} after {self.offset} items...")
+        if store is not None:
+            state = store.library_state(library.key, list(self.counts))
+            self.since = incremental_since(state, config)
+            if self.since is None:
+                # A resumed full scan keeps what it found before the interruption.
+                if progress is None:
+                    store.clear_findings(library.key, list(self.counts))
+            else:
+                logger.info(
+                    f"Checking items in {library.title} changed since {self.since}..."
+                )
+
+    @property
+    def filters(self) -> dict | None:
+        return None if self.since is None else {"updatedAt>>": self.since}
+
+    def detail_keys(self, batch: list[tuple[object, str]]) -> list[int]:
+        return [
+            item.ratingKey
+            for item, _ in batch
+            if item.type in self.requests.detail_item_types
+        ]
+
+    def fetch_details(self, rating_keys: list[int]) -> dict[int, object] | None:
+        """Fetch details for a batch, or None if Plex could not return them."""
+        try:
+            return fetch_details(self.library, rating_keys, self.requests.detail_params)
+        except Exception as e:
+            self.logger.error(
+                f"Failed to fetch details of {len(rating_keys)} items in {self.library.title}, skipping them..."
+            )
+            self.logger.debug("An exception occurred: %s", e, exc_info=True)
+            return None
+
+    def check_item(
+        self, item: object, media_data: str, detailed: dict[int, object]
+    ) -> list[tuple[int, str, int]]:
+        results = []
+        for feature in self.features:
+            if item.type not in feature.item_types:
+                continue
+            target = (
+                detailed.get(item.ratingKey, item) if feature.needs_detail else item
+            )
+            reporter = None
+            if self.report is not None:
+                reporter = partial(self.report_finding, item.ratingKey, feature)
+            started = time.perf_counter()
+            missing = feature.check(
+                target, media_data, *feature.extra_args, self.logger, reporter
+            )
+            self.check_seconds[feature.label] += time.perf_counter() - started
+            results.append((item.ratingKey, feature.label, missing))
+        return results
+
+    def check_batch(
+        self, batch: list[tuple[object, str]], detailed: dict[int, object] | None
+    ) -> None:
+        """Check a batch of items, counting any that cannot be checked as failed.
+
+        A batch whose details could not be fetched is skipped entirely.
+        """
+        if detailed is None:
+            for item, _ in batch:
+                self.skip_item(item)
+            return
+        results = []
+        self.items_scanned += len(batch)
+        for item, media_data in batch:
+            self.watermark = max(self.watermark, item_timestamp(item))
+            try:
+                item_results = self.check_item(item, media_data, detailed)
+            except Exception as e:
+                self.skip_item(item)
+                self.logger.error(f"Failed to check {media_data}, skipping it...")
+                self.logger.debug("An exception occurred: %s", e, exc_info=True)
+                continue
+            if self.since is not None:
+                self.checked.add(item.ratingKey)
+            for _, label, missing in item_results:
+                self.counts[label] += missing
+            missing_labels = [label for _, label, missing in item_results if missing]
+            if missing_labels:
+                self.state.remediation.add(
+                    item.ratingKey, self.library.title, media_data, missing_labels
+                )
+            results.extend(item_results)
+        if self.store is not None:
+            self.store.record_findings(self.library.key, results)
+
+    def check_fetched(
+        self, rating_keys: list[int], items: dict[int, object] | None
+    ) -> list[int]:
+        """Check a batch fetched by ratingKey, returning the keys Plex no longer knows about."""
+        if items is None:
+            self.failed_items += len(rating_keys)
+            return []
+        self.check_batch(list(describe_items(self.library, items.values())), items)
+        return [key for key in rating_keys if key not in items]
+
+    def recheck_keys(self) -> list[int]:
+        """Stored items due a re-check that the incremental listing did not return."""
+        max_age = self.config.recheck_after_days * 86400
+        keys = [
+            key
+            for key in self.store.keys_to_recheck(
+                self.library.key, list(self.counts), max_age
+            )
+            if key not in self.checked
+        ]
+        if keys:
+            self.logger.info(
+                f"Re-checking {len(keys)} stored items in {self.library.title}..."
+            )
+        return keys
+
+    def skip_item(self, item: object) -> None:
+        """Count an item that could not be checked and hold the watermark before it."""
+        self.failed_items += 1
+        changed = item_timestamp(item)
+        if self.failed_watermark is None or changed < self.failed_watermark:
+            self.failed_watermark = changed
+
+    def check_listed(
+        self, batch: list[tuple[object, str]], detailed: dict[int, object] | None
+    ) -> None:
+        """Check the next batch of the section listing and checkpoint the position."""
+        if STOPPING.is_set():
+            raise ScanStopped
+        self.check_batch(batch, detailed)
+        self.offset += len(batch)
+        self.state.checkpoint.update(self.library.key, self.offset, self.counts)
+
+    def report_finding(
+        self,
+        rating_key: int,
+        feature: FeatureScan,
+        subject: str,
+        resolution: str | None,
+    ) -> None:
+        self.report.write(
+            Finding(rating_key, self.library.title, feature.label, subject, resolution)
+        )
+
+    def finish(self) -> None:
+        """Merge with stored findings, save the watermark and log the counts."""
+        if self.store is not None:
+            features = list(self.counts)
+            watermark = self.watermark
+            if self.failed_watermark is not None:
+                watermark = min(watermark, self.failed_watermark)
+            self.store.finish_scan(
+                self.library.key, features, watermark, self.since is None
+            )
+            self.counts = self.store.missing_counts(self.library.key, features)
+        self.state.checkpoint.update(
+            self.library.key, self.offset, self.counts, done=True
+        )
+        if self.report is not None:
+            self.report.add_summary(self.library.title, self.counts)
+        seconds = time.monotonic() - self.started
+        self.state.metrics.record_library(
+            self.library.title,
+            LibraryMetrics(
+                seconds,
+                self.items_scanned,
+                self.check_seconds,
+                self.counts,
+                self.failed_items,
+            ),
+        )
+        PROFILE.add(("scan", self.library.title), seconds)
+        for label, check_seconds in self.check_seconds.items():
+            PROFILE.add(
+                ("scan", self.library.title, "evaluate checks", label), check_seconds
+            )
+        for label, count in self.counts.items():
+            if count > 0:
+                self.logger.info(f"Found {count} {label} in {self.library.title}...")
+            else:
+                self.logger.info(f"No {label} found in {self.library.title}...")
+        if self.failed_items:
+            self.logger.warning(
+                f"Could not check {self.failed_items} items in {self.library.title}..."
+            )
+
+
+def iter_detailed_batches(
+    library: object,
+    config: Config,
+    scan: LibraryScan,
+    pool: ThreadPoolExecutor | None = None,
+) -> Iterator[tuple[list[tuple[object, str]], dict[int, object] | None]]:
+    """Yield batches of library items together with their fetched details.
+
+    With a pool, up to SCAN_CONCURRENCY detail requests are kept in flight
+    while batches are still yielded in library order.
+    """
+    items = iter_library_items(library, config, scan.filters, scan.offset)
+    batches = iter_batches(items, MARKER_BATCH_SIZE)
+
+    if pool is None:
+        for batch in batches:
+            yield batch, scan.fetch_details(scan.detail_keys(batch))
+        return
+
+    pending: deque[tuple[list[tuple[object, str]], Future]] = deque()
+    for batch in batches:
+        future = pool.submit(scan.fetch_details, scan.detail_keys(batch))
+        pending.append((batch, future))
+        if len(pending) >= config.scan_concurrency:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+    while pending:
+        batch, future = pending.popleft()
+        yield batch, future.result()
+
+
+def check_rating_keys(scan: LibraryScan, rating_keys: list[int]) -> list[int]:
+    """Fetch and check items by ratingKey in batches.
+
+    Returns the keys Plex no longer knows about.
+    """
+    gone = []
+    for batch_keys in iter_batches(rating_keys, MARKER_BATCH_SIZE):
+        gone.extend(scan.check_fetched(batch_keys, scan.fetch_details(batch_keys)))
+    return gone
+
+
+def recheck_stored_items(library: object, scan: LibraryScan) -> None:
+    """Re-verify stored items that an incremental listing did not return.
+
+    Any Plex no longer knows about are dropped from the store.
+    """
+    keys = scan.recheck_keys()
+    scan.store.forget_items(library.key, check_rating_keys(scan, keys))
+
+
+def scan_items(
+    library: object,
+    config: Config,
+    scan: LibraryScan,
+    pool: ThreadPoolExecutor | None = None,
+) -> None:
+    for batch, detailed in iter_detailed_batches(library, config, scan, pool):
+        scan.check_listed(batch, detailed)
+    if scan.since is not None:
+        recheck_stored_items(library, scan)
+
+
+def scan_plan(
+    plan: LibraryPlan,
+    config: Config,
+    logger: logging.Logger,
+    pool: ThreadPoolExecutor | None = None,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> dict[str, int]:
+    """Walk a planned library once, running every active feature check on each item.
+
+    When a pool is given, marker batches are fetched on it ahead of the checks.
+    With a state store, only changed items and items due a re-check are checked.
+    Returns the number of items missing data per feature label.
+    """
+    library = plan.library
+    logger.info(f"Processing library {library.title} of type {library.type}...")
+    scan = LibraryScan(library, plan.features, logger, config, store, report)
+    scan_items(library, config, scan, pool)
+    scan.finish()
+    return scan.counts
+
+
+class IncompleteScanError(Exception):
+    """Raised at the end of a run in which some libraries could not be scanned."""
+
+
+class ScanStopped(Exception):
+    """Raised on worker threads once the process has been told to stop."""
+
+
+def log_library_failure(
+    library: object, config: Config, logger: logging.Logger
+) -> None:
+    logger.error(f"Failed to scan library {library.title}, skipping it for this run...")
+    server_state(config.server_name).metrics.record_library_failure(library.title)
+
+
+def scan_plan_isolated(
+    plan: LibraryPlan,
+    config: Config,
+    logger: logging.Logger,
+    pool: ThreadPoolExecutor | None = None,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> dict[str, int] | None:
+    """Scan a planned library, returning None instead of raising if it fails."""
     try:
-        logger.info("Testing connection to Plex server...")
-        plex = PlexServer(config.plex_url, config.plex_token, timeout=600)
-        server_name = plex.friendlyName
-        logger.info(f"Successfully connected to Plex server: {server_name}")
-        start_time = time.monotonic()
+        return scan_plan(plan, config, logger, pool, store, report)
+    except ScanStopped:
+        raise
+    except Exception as e:
+        log_library_failure(plan.library, config, logger)
+        logger.debug("An exception occurred: %s", e, exc_info=True)
+        return None
+
+
+def scan_library(
+    library: object,
+    config: Config,
+    features: list[FeatureScan],
+    logger: logging.Logger,
+    pool: ThreadPoolExecutor | None = None,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> dict[str, int]:
+    """Plan and scan a single library, returning nothing if it is skipped."""
+    plan = plan_library(library, config, features, logger)
+    if not plan.features:
+        return {}
+    return scan_plan(plan, config, logger, pool, store, report)
+
+
+class OrderedLog:
+    """Passes on the log output of libraries scanned at once in library order.
+
+    Records from the earliest library still being scanned go straight to
+    the logger, so its progress shows as it happens. Libraries ahead of it
+    hold their records until every library before them has finished, and
+    only theirs are kept in memory.
+    """
+
+    def __init__(self, logger: logging.Logger) -> None:
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.current = 0
+        self.finished: set[int] = set()
+        self.held: defaultdict[int, list[logging.LogRecord]] = defaultdict(list)
+
+    def handle(self, index: int, record: logging.LogRecord) -> None:
+        record.name = self.logger.name
+        with self.lock:
+            if index == self.current:
+                self.logger.handle(record)
+            else:
+                self.held[index].append(record)
+
+    def finish(self, index: int) -> None:
+        with self.lock:
+            self.finished.add(index)
+            while self.current in self.finished:
+                self.current += 1
+                for record in self.held.pop(self.current, []):
+                    self.logger.handle(record)
+
+
+class OrderedLogHandler(logging.Handler):
+    """Hands one library's records to an OrderedLog."""
+
+    def __init__(self, log: OrderedLog, index: int) -> None:
+        super().__init__()
+        self.log = log
+        self.index = index
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.log.handle(self.index, record)
+
+
+@contextmanager
+def deferred_logger(
+    library: object, log: OrderedLog, index: int
+) -> Iterator[logging.Logger]:
+    """Provide the logger for the library at ``index`` in an OrderedLog.
+
+    The logger is named after the section key, as Plex allows several
+    libraries with the same title and each needs a handler of its own.
+    """
+    handler = OrderedLogHandler(log, index)
+    deferred = logging.getLogger(f"{log.logger.name}.section-{library.key}")
+    deferred.setLevel(log.logger.getEffectiveLevel())
+    deferred.propagate = False
+    deferred.handlers = [handler]
+    try:
+        yield deferred
+    finally:
+        deferred.removeHandler(handler)
+        log.finish(index)
+
+
+def scan_plan_deferred(
+    plan: LibraryPlan,
+    config: Config,
+    log: OrderedLog,
+    index: int,
+    pool: ThreadPoolExecutor,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> dict[str, int] | None:
+    """Scan a library on a worker thread, logging through an OrderedLog."""
+    with deferred_logger(plan.library, log, index) as deferred:
+        return scan_plan_isolated(plan, config, deferred, pool, store, report)
+
+
+def scan_libraries(
+    plans: list[LibraryPlan],
+    config: Config,
+    logger: logging.Logger,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> Iterator[dict[str, int] | None]:
+    """Scan every planned library, yielding per-library counts in library order.
+
+    A library that fails yields None and the scan moves on to the next one.
+    """
+    if config.scan_concurrency == 1:
+        for plan in plans:
+            yield scan_plan_isolated(plan, config, logger, store=store, report=report)
+        return
 
-        libraries = plex.library.sections()
-        scan_functions = {
-            "find_missing_preview_thumbnails": find_missing_preview_thumbnails,
-            "find_missing_voice_activity_data": find_missing_voice_activity_data,
-            "find_missing_marker_metadata": find_missing_marker_metadata,
-        }
+    log = OrderedLog(logger)
+    library_pool = ThreadPoolExecutor(config.scan_concurrency)
+    request_pool = ThreadPoolExecutor(config.scan_concurrency)
+    try:
+        futures = [
+            library_pool.submit(
+                scan_plan_deferred,
+                plan,
+                config,
+                log,
+                index,
+                request_pool,
+                store,
+                report,
+            )
+            for index, plan in enumerate(plans)
+        ]
+        for future in futures:
+            yield future.result()
+    finally:
+        # When the scan is stopped early, libraries still queued are dropped
+        # and those in progress stop at their next batch.
+        library_pool.shutdown(cancel_futures=True)
+        request_pool.shutdown(cancel_futures=True)
+
+
+# Async engine
+
+
+class AsyncPlexClient:
+    """Sends lean listing and metadata requests as coroutines with httpx.
+
+    Every request of a run shares one event loop and connection pool instead
+    of tying up a worker thread while it waits, so SCAN_CONCURRENCY bounds the
+    requests in flight rather than a thread count. HTTPS connections use
+    HTTP/2 where Plex offers it, carrying many requests on each. Requests are
+    retried, rate limited and recorded in the metrics as the sync session's are.
+    """
+
+    def __init__(self, config: Config) -> None:
+        connect_timeout, read_timeout = request_timeout(config)
+        self.retries = config.request_retries
+        self.metrics = server_state(config.server_name).metrics
+        self.semaphore = asyncio.Semaphore(config.scan_concurrency)
+        self.limiter = None
+        if config.request_latency_target_ms:
+            self.limiter = AsyncAdaptiveLimiter(
+                config.scan_concurrency,
+                config.request_latency_target_ms / 1000,
+                self.metrics,
+            )
+        self.client = httpx.AsyncClient(
+            headers=lean_headers(config),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=config.scan_concurrency),
+            http2=True,
+        )
 
-        for feature in FEATURE_SCANS:
-            if not getattr(config, feature.setting):
+    async def send(self, url: str) -> httpx.Response:
+        if self.limiter is None:
+            async with self.semaphore:
+                response = await self.client.get(url)
+        else:
+            started = await self.limiter.acquire_async()
+            congested = True
+            try:
+                response = await self.client.get(url)
+                congested = response.status_code in CONGESTION_STATUSES
+            finally:
+                await self.limiter.release_async(started, congested)
+        self.metrics.observe_response(response)
+        return response
+
+    async def get_json(self, url: str) -> dict:
+        """Request a lean URL, retrying as request_retry does, and return its MediaContainer."""
+        for retry in itertools.count():
+            try:
+                response = await self.send(url)
+            except httpx.TransportError:
+                if retry >= self.retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or retry >= self.retries:
+                    response.raise_for_status()
+                    return response.json()["MediaContainer"]
+            await asyncio.sleep(retry_backoff(retry))
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+async def fetch_details_async(
+    client: AsyncPlexClient, scan: LibraryScan, rating_keys: list[int]
+) -> dict[int, object] | None:
+    """Async counterpart of LibraryScan.fetch_details."""
+    if not rating_keys:
+        return {}
+    library = scan.library
+    url = library.details_url(rating_keys, scan.requests.detail_params)
+    try:
+        with PROFILE.timed("scan", library.title, "fetch children"):
+            container = await client.get_json(url)
+    except Exception as e:
+        scan.logger.error(
+            f"Failed to fetch details of {len(rating_keys)} items in {library.title}, skipping them..."
+        )
+        scan.logger.debug("An exception occurred: %s", e, exc_info=True)
+        return None
+    return {item.ratingKey: item for item in item_records(container)}
+
+
+async def fetch_page_async(
+    client: AsyncPlexClient,
+    library: LeanSection,
+    config: Config,
+    scan: LibraryScan,
+    start: int,
+) -> list[tuple[list[tuple[object, str]], dict[int, object] | None]]:
+    """Fetch one section page and the details for each of its batches."""
+    libtype = section_libtype(library, config.photo_traversal)
+    url = library.listing_url(
+        libtype,
+        scan.filters,
+        container_start=start,
+        container_size=config.container_size,
+    )
+    with PROFILE.timed("scan", library.title, "list items"):
+        container = await client.get_json(url)
+    items = list(describe_items(library, item_records(container)))
+    batches = [
+        items[i : i + MARKER_BATCH_SIZE]
+        for i in range(0, len(items), MARKER_BATCH_SIZE)
+    ]
+    detailed = [
+        fetch_details_async(client, scan, scan.detail_keys(batch)) for batch in batches
+    ]
+    return list(zip(batches, await asyncio.gather(*detailed), strict=True))
+
+
+async def run_in_order(
+    coroutines: Iterable[Coroutine],
+    limit: int,
+    handle: Callable[[object], None],
+) -> None:
+    """Run up to ``limit`` coroutines at once, handling their results in order."""
+    pending: deque[asyncio.Task] = deque()
+    try:
+        for coroutine in coroutines:
+            pending.append(asyncio.create_task(coroutine))
+            if len(pending) >= limit:
+                handle(await pending.popleft())
+        while pending:
+            handle(await pending.popleft())
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def recheck_stored_items_async(
+    client: AsyncPlexClient, config: Config, scan: LibraryScan
+) -> None:
+    """Async counterpart of recheck_stored_items."""
+
+    async def fetch(batch_keys: list[int]) -> tuple[list[int], dict | None]:
+        return batch_keys, await fetch_details_async(client, scan, batch_keys)
+
+    gone = []
+    await run_in_order(
+        (fetch(keys) for keys in iter_batches(scan.recheck_keys(), MARKER_BATCH_SIZE)),
+        config.scan_concurrency,
+        lambda fetched: gone.extend(scan.check_fetched(*fetched)),
+    )
+    scan.store.forget_items(scan.library.key, gone)
+
+
+async def scan_plan_async(
+    plan: LibraryPlan,
+    config: Config,
+    logger: logging.Logger,
+    client: AsyncPlexClient,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> dict[str, int]:
+    """Async counterpart of scan_plan that fetches pages concurrently.
+
+    The section size is read up front, with the incremental filter applied,
+    so up to SCAN_CONCURRENCY pages can be requested at once; pages are still
+    checked in library order. Incremental runs then re-check stored items in
+    concurrent detail batches the same way.
+    """
+    library = plan.library
+    logger.info(f"Processing library {library.title} of type {library.type}...")
+    scan = LibraryScan(library, plan.features, logger, config, store, report)
+    libtype = section_libtype(library, config.photo_traversal)
+    size = await client.get_json(library.size_url(libtype, scan.filters))
+
+    def check_page(page: list[tuple[list, dict[int, object] | None]]) -> None:
+        for batch, detailed in page:
+            scan.check_listed(batch, detailed)
+
+    await run_in_order(
+        (
+            fetch_page_async(client, library, config, scan, start)
+            for start in range(
+                scan.offset, int(size["totalSize"]), config.container_size
+            )
+        ),
+        config.scan_concurrency,
+        check_page,
+    )
+    if scan.since is not None:
+        await recheck_stored_items_async(client, config, scan)
+    scan.finish()
+    return scan.counts
+
+
+async def scan_plan_isolated_async(
+    plan: LibraryPlan,
+    config: Config,
+    logger: logging.Logger,
+    client: AsyncPlexClient,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> dict[str, int] | None:
+    try:
+        return await scan_plan_async(plan, config, logger, client, store, report)
+    except ScanStopped:
+        raise
+    except Exception as e:
+        log_library_failure(plan.library, config, logger)
+        logger.debug("An exception occurred: %s", e, exc_info=True)
+        return None
+
+
+async def scan_plan_deferred_async(
+    plan: LibraryPlan,
+    config: Config,
+    log: OrderedLog,
+    index: int,
+    client: AsyncPlexClient,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> dict[str, int] | None:
+    with deferred_logger(plan.library, log, index) as deferred:
+        return await scan_plan_isolated_async(
+            plan, config, deferred, client, store, report
+        )
+
+
+async def scan_libraries_async(
+    plans: list[LibraryPlan],
+    config: Config,
+    logger: logging.Logger,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> list[dict[str, int] | None]:
+    """Scan every planned library concurrently with at most SCAN_CONCURRENCY requests.
+
+    Plans must wrap their sections in LeanSection, which builds the requests.
+    """
+    client = AsyncPlexClient(config)
+    log = OrderedLog(logger)
+    tasks = [
+        asyncio.create_task(
+            scan_plan_deferred_async(plan, config, log, index, client, store, report)
+        )
+        for index, plan in enumerate(plans)
+    ]
+    results = []
+    try:
+        for task in tasks:
+            results.append(await task)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await client.close()
+    return results
+
+
+def run_async_engine(
+    plans: list[LibraryPlan],
+    config: Config,
+    logger: logging.Logger,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> list[dict[str, int] | None]:
+    return asyncio.run(scan_libraries_async(plans, config, logger, store, report))
+
+
+# Plex database backend
+
+DATABASE_ITEM_TYPES = {
+    "movie": ("movie", 1),
+    "show": ("episode", 4),
+    "photo": ("clip", 12),
+}
+MARKER_TAG_TYPE = 12
+BIF_SCAN_WORKERS = 16
+
+DATABASE_ITEM_COUNT_QUERY = """
+SELECT COUNT(*) FROM metadata_items
+WHERE library_section_id = ? AND metadata_type = ? AND deleted_at IS NULL
+"""
+
+# Items missing data for any planned check, with the marker types they have.
+# The {missing} placeholder is filled with one EXISTS clause per check.
+DATABASE_ITEMS_QUERY = """
+SELECT item.id, item.title, item."index", season."index", show.title, (
+    SELECT group_concat(tagging.text)
+    FROM taggings AS tagging
+    JOIN tags AS tag ON tag.id = tagging.tag_id
+    WHERE tagging.metadata_item_id = item.id AND tag.tag_type = {marker_tag_type}
+)
+FROM metadata_items AS item
+LEFT JOIN metadata_items AS season ON season.id = item.parent_id
+LEFT JOIN metadata_items AS show ON show.id = season.parent_id
+WHERE item.library_section_id = ? AND item.metadata_type = ?
+    AND item.deleted_at IS NULL AND ({missing})
+ORDER BY item.id
+"""
+
+DATABASE_MISSING_PREVIEWS = """EXISTS (
+    SELECT 1 FROM media_items AS media
+    JOIN media_parts AS part ON part.media_item_id = media.id
+    WHERE media.metadata_item_id = item.id AND media.deleted_at IS NULL
+        AND part.deleted_at IS NULL
+        AND NOT has_preview_thumbnails(part.hash, part.extra_data)
+)"""
+
+DATABASE_MISSING_VOICE_ACTIVITY = """EXISTS (
+    SELECT 1 FROM media_items AS media
+    WHERE media.metadata_item_id = item.id AND media.deleted_at IS NULL
+        AND extra_data_value(media.extra_data, 'hasVoiceActivity') IS NOT '1'
+)"""
+
+DATABASE_MISSING_MARKER = """NOT EXISTS (
+    SELECT 1 FROM taggings AS tagging
+    JOIN tags AS tag ON tag.id = tagging.tag_id
+    WHERE tagging.metadata_item_id = item.id AND tag.tag_type = {marker_tag_type}
+        AND tagging.text = ?
+)"""
+
+# Parts without preview thumbnails in a section.
+DATABASE_PARTS_QUERY = """
+SELECT media.metadata_item_id, media.id, part.file
+FROM media_parts AS part
+JOIN media_items AS media ON media.id = part.media_item_id
+WHERE media.library_section_id = ? AND media.deleted_at IS NULL
+    AND part.deleted_at IS NULL
+    AND NOT has_preview_thumbnails(part.hash, part.extra_data)
+ORDER BY part.id
+"""
+
+# Media without voice activity data in a section.
+DATABASE_MEDIA_QUERY = """
+SELECT metadata_item_id, id
+FROM media_items
+WHERE library_section_id = ? AND deleted_at IS NULL
+    AND extra_data_value(extra_data, 'hasVoiceActivity') IS NOT '1'
+ORDER BY id
+"""
+
+
+def open_plex_database(path: str) -> sqlite3.Connection:
+    """Open Plex's library database read-only, leaving the running server alone."""
+    uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+    connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    connection.create_function(
+        "extra_data_value", 2, extra_data_value, deterministic=True
+    )
+    return connection
+
+
+def extra_data_value(extra_data: str | None, key: str) -> str | None:
+    """Read a media attribute from an extra_data column.
+
+    Newer servers store JSON and older ones a URL-encoded query string; media
+    attributes are stored with an ``ma:`` prefix.
+    """
+    if not extra_data:
+        return None
+    try:
+        values = json.loads(extra_data)
+    except ValueError:
+        values = dict(parse_qsl(extra_data))
+    if not isinstance(values, dict):
+        return None
+    value = values.get(f"ma:{key}", values.get(key))
+    return None if value is None else str(value)
+
+
+def missing_data_query(
+    features: list[FeatureScan], item_type: str
+) -> tuple[str, list[str]] | None:
+    """Build the query for items missing data for any of the planned checks.
+
+    Returns the query and its marker type parameters, or None when no planned
+    check applies to the item type.
+    """
+    missing, marker_types = [], []
+    for feature in features:
+        if item_type not in feature.item_types:
+            continue
+        if feature.check is check_item_preview_thumbnails:
+            missing.append(DATABASE_MISSING_PREVIEWS)
+        elif feature.check is check_item_voice_activity:
+            missing.append(DATABASE_MISSING_VOICE_ACTIVITY)
+        else:
+            missing.append(
+                DATABASE_MISSING_MARKER.format(marker_tag_type=MARKER_TAG_TYPE)
+            )
+            marker_types.extend(feature.extra_args)
+    if not missing:
+        return None
+    query = DATABASE_ITEMS_QUERY.format(
+        marker_tag_type=MARKER_TAG_TYPE, missing=" OR ".join(missing)
+    )
+    return query, marker_types
+
+
+def iter_database_items(
+    connection: sqlite3.Connection,
+    library: object,
+    features: list[FeatureScan],
+    bif_hashes: set[str] | None = None,
+) -> Iterator[ItemRecord]:
+    """Yield the items in a section that are missing data for a planned check.
+
+    The checks run in SQL, so only offending items are read, carrying only
+    their offending media and parts. When ``bif_hashes`` is given, a part has
+    preview thumbnails if its hash is in the set rather than per the database.
+    The database does not store a video resolution, so none is reported.
+    """
+    if library.type not in DATABASE_ITEM_TYPES:
+        return
+    item_type, metadata_type = DATABASE_ITEM_TYPES[library.type]
+    planned = missing_data_query(features, item_type)
+    if planned is None:
+        return
+    query, marker_types = planned
+    checks = {feature.check for feature in features if item_type in feature.item_types}
+    section_id = int(library.key)
+    connection.create_function(
+        "has_preview_thumbnails",
+        2,
+        partial(has_sd_index, bif_hashes=bif_hashes),
+        deterministic=True,
+    )
+
+    parts = defaultdict(lambda: defaultdict(list))
+    if check_item_preview_thumbnails in checks:
+        for item_id, media_id, file in connection.execute(
+            DATABASE_PARTS_QUERY, (section_id,)
+        ):
+            parts[item_id][media_id].append(PartRecord(file, False))
+    lacking_voice_activity = defaultdict(set)
+    if check_item_voice_activity in checks:
+        for item_id, media_id in connection.execute(
+            DATABASE_MEDIA_QUERY, (section_id,)
+        ):
+            lacking_voice_activity[item_id].add(media_id)
+
+    for (
+        rating_key,
+        title,
+        index,
+        parent_index,
+        grandparent_title,
+        present_markers,
+    ) in connection.execute(query, (section_id, metadata_type, *marker_types)):
+        item_parts = parts.pop(rating_key, {})
+        item_lacking = lacking_voice_activity.pop(rating_key, set())
+        media = [
+            MediaRecord(
+                None, media_id not in item_lacking, item_parts.get(media_id, [])
+            )
+            for media_id in sorted(item_parts.keys() | item_lacking)
+        ]
+        markers = [
+            MarkerRecord(marker_type)
+            for marker_type in (present_markers or "").split(",")
+            if marker_type
+        ]
+        yield ItemRecord(
+            rating_key,
+            item_type,
+            title,
+            index,
+            parent_index,
+            grandparent_title,
+            media,
+            markers,
+        )
+
+
+def count_database_items(connection: sqlite3.Connection, library: object) -> int:
+    if library.type not in DATABASE_ITEM_TYPES:
+        return 0
+    _, metadata_type = DATABASE_ITEM_TYPES[library.type]
+    (count,) = connection.execute(
+        DATABASE_ITEM_COUNT_QUERY, (int(library.key), metadata_type)
+    ).fetchone()
+    return count
+
+
+def has_sd_index(
+    part_hash: str, extra_data: str | None, bif_hashes: set[str] | None
+) -> bool:
+    """Whether a part has preview thumbnails, per the BIF files on disk when
+    they were scanned and per the database otherwise."""
+    if bif_hashes is None:
+        return extra_data_value(extra_data, "indexes") == "sd"
+    return part_hash in bif_hashes
+
+
+def bundle_hashes_with_bif(shard: str) -> list[str]:
+    """List the part hashes in one bundle shard that have an SD index file."""
+    prefix = os.path.basename(shard)
+    hashes = []
+    with os.scandir(shard) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".bundle"):
                 continue
-            logger.info(f"Searching for {feature.label}...")
-            scan_fn = scan_functions[feature.scan_fn]
-            for library in libraries:
-                scan_fn(library, config, *feature.extra_args, logger)
-            logger.info(f"{feature.label.capitalize()} run finished...")
+            bif = os.path.join(entry.path, "Contents", "Indexes", "index-sd.bif")
+            if os.path.isfile(bif):
+                hashes.append(prefix + entry.name.removesuffix(".bundle"))
+    return hashes
+
+
+def scan_bif_bundles(media_directory: str) -> set[str]:
+    """Collect the hash of every media part with a BIF file on disk.
+
+    Plex keeps part bundles under Media/localhost in one directory per leading
+    hash character; those shards are listed in parallel.
+    """
+    with os.scandir(media_directory) as entries:
+        shards = [entry.path for entry in entries if entry.is_dir()]
+    with ThreadPoolExecutor(BIF_SCAN_WORKERS) as pool:
+        return {
+            part_hash
+            for hashes in pool.map(bundle_hashes_with_bif, shards)
+            for part_hash in hashes
+        }
+
 
-        elapsed_seconds = time.monotonic() - start_time
+def scan_database(
+    plans: list[LibraryPlan],
+    config: Config,
+    logger: logging.Logger,
+    store: StateStore | None = None,
+    report: ReportWriter | None = None,
+) -> Iterator[dict[str, int] | None]:
+    """Scan every planned library from Plex's database instead of the API.
+
+    Reading a whole section takes a few queries, so every run is a full scan
+    and the state store is not used.
+    """
+    bif_hashes = None
+    if config.plex_media_directory and any(
+        "Part" in feature.elements for plan in plans for feature in plan.features
+    ):
+        bif_hashes = scan_bif_bundles(config.plex_media_directory)
         logger.info(
-            f"Run completed in {timedelta(seconds=elapsed_seconds)}, check the logs for results..."
+            f"Found {len(bif_hashes)} parts with preview thumbnails in {config.plex_media_directory}..."
         )
+    with closing(open_plex_database(config.plex_database)) as connection:
+        for plan in plans:
+            try:
+                counts = scan_database_library(
+                    connection, plan, config, logger, bif_hashes, report
+                )
+            except Exception as e:
+                log_library_failure(plan.library, config, logger)
+                logger.debug("An exception occurred: %s", e, exc_info=True)
+                counts = None
+            yield counts
+
+
+def scan_database_library(
+    connection: sqlite3.Connection,
+    plan: LibraryPlan,
+    config: Config,
+    logger: logging.Logger,
+    bif_hashes: set[str] | None,
+    report: ReportWriter | None = None,
+) -> dict[str, int]:
+    library = plan.library
+    logger.info(f"Processing library {library.title} of type {library.type}...")
+    scan = LibraryScan(library, plan.features, logger, config, report=report)
+    items = describe_items(
+        library, iter_database_items(connection, library, plan.features, bif_hashes)
+    )
+    for batch in iter_batches(islice(items, scan.offset, None), MARKER_BATCH_SIZE):
+        scan.check_listed(batch, {})
+    # Only offending items are read, but every item in the section was checked.
+    scan.items_scanned = count_database_items(connection, library)
+    scan.finish()
+    return scan.counts
+
+
+SCAN_ENGINES: dict[str, Callable[..., Iterable[dict[str, int] | None]]] = {
+    "sync": scan_libraries,
+    "async": run_async_engine,
+}
+
+
+REQUEST_CONNECT_TIMEOUT = 10
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+RETRY_BACKOFF_FACTOR = 1.0
+RETRY_BACKOFF_JITTER = 1.0
+RETRY_BACKOFF_MAX = 30.0
+
+
+def request_timeout(config: Config) -> tuple[int, int]:
+    """Connect and read timeouts for a single Plex request."""
+    return min(REQUEST_CONNECT_TIMEOUT, config.request_timeout), config.request_timeout
+
+
+def request_retry(config: Config) -> Retry:
+    """Retry failed connections, timed out reads and transient error statuses.
+
+    Backoff doubles with each retry, plus up to a second of random jitter so
+    concurrent requests that failed together do not all retry together. Only
+    GET requests are retried, as those are all a scan sends.
+    """
+    return Retry(
+        total=config.request_retries,
+        allowed_methods=frozenset(("GET",)),
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        backoff_jitter=RETRY_BACKOFF_JITTER,
+        backoff_max=RETRY_BACKOFF_MAX,
+        raise_on_status=False,
+    )
+
+
+def retry_backoff(retry: int) -> float:
+    """Seconds to wait before a retry, following request_retry's backoff."""
+    if retry == 0:
+        return 0.0
+    backoff = RETRY_BACKOFF_FACTOR * 2**retry + random.random() * RETRY_BACKOFF_JITTER
+    return min(RETRY_BACKOFF_MAX, backoff)
+
+
+def create_session(config: Config) -> requests.Session:
+    """Create the HTTP session with a connection pool sized for the scan.
+
+    With REQUEST_LATENCY_TARGET_MS set, requests go through an adaptive
+    limiter that allows up to SCAN_CONCURRENCY of them in flight.
+    """
+    metrics = server_state(config.server_name).metrics
+    session = requests.Session()
+    adapter_args = {
+        "pool_maxsize": config.scan_concurrency,
+        "max_retries": request_retry(config),
+    }
+    if config.request_latency_target_ms:
+        limiter = AdaptiveLimiter(
+            config.scan_concurrency, config.request_latency_target_ms / 1000, metrics
+        )
+        adapter = AdaptiveAdapter(limiter, **adapter_args)
+    else:
+        adapter = HTTPAdapter(**adapter_args)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.hooks["response"].append(metrics.observe_response)
+    return session
+
+
+def connect_plex(config: Config, session: requests.Session) -> PlexServer:
+    return PlexServer(
+        config.plex_url,
+        config.plex_token,
+        session=session,
+        timeout=request_timeout(config),
+    )
+
+
+def skip_finished_libraries(
+    plans: list[LibraryPlan],
+    totals: dict[str, int],
+    checkpoint: ScanCheckpoint,
+    logger: logging.Logger,
+) -> list[LibraryPlan]:
+    """Drop libraries a resumed run already finished, adding their counts to the totals."""
+    remaining = []
+    for plan in plans:
+        progress = checkpoint.progress(plan.library.key)
+        if progress is None or not progress.done:
+            remaining.append(plan)
+            continue
+        logger.info(
+            f"Skipping {plan.library.title} as it was finished before the interruption..."
+        )
+        for label, count in progress.counts.items():
+            if label in totals:
+                totals[label] += count
+    return remaining
+
+
+def run_scan(config: Config, logger: logging.Logger) -> dict[str, int]:
+    """Connect to Plex and scan every library, returning the totals per feature."""
+    logger.info("Testing connection to Plex server...")
+    session = create_session(config)
+    with PROFILE.timed("connect"):
+        plex = connect_plex(config, session)
+        server_name = plex.friendlyName
+    logger.info(f"Successfully connected to Plex server: {server_name}")
+    start_time = time.monotonic()
+
+    with PROFILE.timed("list sections"):
+        libraries = plex.library.sections()
+    features = [f for f in FEATURE_SCANS if getattr(config, f.setting)]
+    for feature in features:
+        logger.info(f"Searching for {feature.label}...")
+
+    plans = plan_libraries(libraries, config, features, logger)
+    # The async engine sends its requests with httpx, so it reads lean records.
+    if config.lean_requests or config.scan_engine == "async":
+        plans = [
+            LibraryPlan(
+                LeanSection(
+                    plan.library, config, session, plan_requests(plan.features)
+                ),
+                plan.features,
+            )
+            for plan in plans
+        ]
+    totals = dict.fromkeys((feature.label for feature in features), 0)
+    library_count = len(plans)
+    checkpoint = server_state(config.server_name).checkpoint
+    plans = skip_finished_libraries(plans, totals, checkpoint, logger)
+    if config.scan_backend == "database":
+        scan_engine, store = scan_database, None
+    else:
+        scan_engine = SCAN_ENGINES[config.scan_engine]
+        store = open_state_store(config, logger)
+    failed = 0
+    try:
+        with open_report_writer(config, logger) as report, PROFILE.timed("scan"):
+            for counts in scan_engine(plans, config, logger, store, report):
+                if counts is None:
+                    failed += 1
+                    continue
+                for label, count in counts.items():
+                    totals[label] += count
+    finally:
+        if store is not None:
+            store.close()
+
+    for label, total in totals.items():
+        logger.info(f"{label.capitalize()} run finished, found {total} in total...")
+
+    elapsed_seconds = time.monotonic() - start_time
+    logger.info(
+        f"Run completed in {timedelta(seconds=elapsed_seconds)}, check the logs for results..."
+    )
+    if failed:
+        raise IncompleteScanError(
+            f"{failed} of {library_count} libraries could not be scanned, they will be retried next run..."
+        )
+    return totals
+
+
+# Held while a server is being scanned, keyed by its URL.
+SCAN_LOCKS: dict[str, threading.Lock] = {}
+
+
+def find_missing_metadata(config: Config, logger: logging.Logger) -> None:
+    lock = SCAN_LOCKS.setdefault(config.plex_url, threading.Lock())
+    if not lock.acquire(blocking=False):
+        logger.warning(
+            f"A scan of {config.plex_url} is already running, skipping this run..."
+        )
+        return
+    run_started = time.monotonic()
+    succeeded = False
+    state = server_state(config.server_name)
+    state.metrics.start_run()
+    state.checkpoint.start_run(
+        checkpoint_path(config, logger), checkpoint_scope(config), logger
+    )
+    try:
+        with profile_run(config, logger):
+            run_scan(config, logger)
+        succeeded = True
+    except IncompleteScanError as e:
+        logger.error(str(e))
+    except ScanStopped:
+        logger.info("Stopped the run before it finished...")
     except Exception as e:
         logger.error("Failed to connect to Plex server for this run...")
         logger.debug("An exception occurred: %s", e, exc_info=True)
+    finally:
+        state.checkpoint.finish_run(succeeded, interrupted=STOPPING.is_set())
+        state.metrics.finish_run(time.monotonic() - run_started, succeeded)
+        if config.metrics_textfile:
+            write_metrics_textfile(config.metrics_textfile, logger)
+        lock.release()
+
+
+# Scheduling
+
+CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day of month", 1, 31),
+    ("month", 1, 12),
+    ("day of week", 0, 7),
+)
+# How far ahead to look for a match, long enough to find 29 February on a
+# given day of the week.
+CRON_SEARCH_DAYS = 366 * 28
+# Feature names used in SCHEDULES -> Config setting
+SCHEDULE_FEATURES = {
+    "thumbnails": "find_missing_thumbnail_previews",
+    "voice": "find_missing_voice_activity",
+    "intro": "find_missing_intro_markers",
+    "credits": "find_missing_credits_markers",
+    "ad": "find_missing_ad_markers",
+}
+SCHEDULE_OPTIONS = {
+    "incremental": {"incremental_scans": True},
+    "full": {"incremental_scans": False},
+    "api": {"scan_backend": "api"},
+    "database": {"scan_backend": "database"},
+}
+
+
+def local_now() -> datetime:
+    """The local wall-clock time, which cron expressions are matched against."""
+    return datetime.now(UTC).astimezone().replace(tzinfo=None)
+
+
+def parse_cron_field(text: str, name: str, low: int, high: int) -> frozenset[int]:
+    values = set()
+    for part in text.split(","):
+        base, _, step = part.partition("/")
+        try:
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start, end = (int(value) for value in base.split("-", 1))
+            else:
+                start = int(base)
+                end = high if step else start
+            every = int(step) if step else 1
+        except ValueError:
+            raise ValueError(f'{name} "{text}" is not a valid cron field') from None
+        if not low <= start <= end <= high or every < 1:
+            raise ValueError(f'{name} "{text}" must be within {low}-{high}')
+        values.update(range(start, end + 1, every))
+    return frozenset(values)
+
+
+class CronExpression(NamedTuple):
+    """The times matched by a five-field cron expression, in local time.
+
+    Fields are minute, hour, day of month, month and day of week, each a list
+    of values, ranges and steps. As in cron, 0 and 7 are both Sunday, and when
+    both day fields are restricted a day matching either of them matches.
+    """
+
+    minutes: frozenset[int]
+    hours: frozenset[int]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]
+    day_or_weekday: bool
+    second: int = 0
+
+    @classmethod
+    def parse(cls, expression: str) -> CronExpression:
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError("a cron expression has 5 fields")
+        minutes, hours, days, months, weekdays = (
+            parse_cron_field(text, *spec)
+            for text, spec in zip(fields, CRON_FIELDS, strict=True)
+        )
+        cron = cls(
+            minutes,
+            hours,
+            days,
+            months,
+            frozenset(day % 7 for day in weekdays),
+            fields[2] != "*" and fields[4] != "*",
+        )
+        cron.next_after(local_now())
+        return cron
+
+    @classmethod
+    def daily(cls, run_time: str) -> CronExpression:
+        """Every day at an HH:MM(:SS) time."""
+        hour, minute, second = (int(value) for value in f"{run_time}:0".split(":")[:3])
+        return cls(
+            frozenset([minute]),
+            frozenset([hour]),
+            frozenset(range(1, 32)),
+            frozenset(range(1, 13)),
+            frozenset(range(7)),
+            False,
+            second,
+        )
+
+    def matches_day(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = moment.isoweekday() % 7 in self.weekdays
+        return (day or weekday) if self.day_or_weekday else (day and weekday)
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching time after ``moment``.
+
+        Whole months, days and hours that cannot match are skipped at once,
+        so this takes at most a few hundred steps.
+        """
+        candidate = moment.replace(second=self.second, microsecond=0)
+        if candidate <= moment:
+            candidate += timedelta(minutes=1)
+        limit = moment + timedelta(days=CRON_SEARCH_DAYS)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = candidate.replace(
+                    year=candidate.year + candidate.month // 12,
+                    month=candidate.month % 12 + 1,
+                    day=1,
+                    hour=0,
+                    minute=0,
+                )
+            elif not self.matches_day(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError("the cron expression never matches")
+
+
+class ScanSchedule(NamedTuple):
+    """When to scan, and the settings a scan started by the schedule overrides."""
+
+    cron: CronExpression
+    overrides: dict[str, object]
+    description: str
+
+    def config_for(self, config: Config) -> Config:
+        return replace(config, **self.overrides)
+
+
+def parse_schedule(entry: str) -> ScanSchedule:
+    """Parse a SCHEDULES entry: a cron expression, then optional features and options.
+
+    For example "0 * * * * thumbnails incremental" checks thumbnails of changed
+    items hourly, and "0 3 * * 0 intro,credits,ad full" audits every marker on
+    Sundays. Without features, the FIND_MISSING_* settings decide what is scanned.
+    """
+    fields = entry.split()
+    cron = CronExpression.parse(" ".join(fields[:5]))
+    overrides: dict[str, object] = {}
+    for word in fields[5:]:
+        if word in SCHEDULE_OPTIONS:
+            overrides.update(SCHEDULE_OPTIONS[word])
+            continue
+        names = word.split(",")
+        for name in names:
+            if name not in SCHEDULE_FEATURES:
+                raise ValueError(f'unknown feature or option "{name}"')
+        enabled = {SCHEDULE_FEATURES[name] for name in names}
+        overrides.update(
+            (setting, setting in enabled) for setting in SCHEDULE_FEATURES.values()
+        )
+    return ScanSchedule(cron, overrides, f'on "{entry}"')
+
+
+def configured_schedules(config: Config) -> list[ScanSchedule]:
+    if config.schedules:
+        return [parse_schedule(entry) for entry in config.schedules]
+    return [
+        ScanSchedule(
+            CronExpression.daily(config.run_time), {}, f"daily at {config.run_time}"
+        )
+    ]
+
+
+class Scheduler:
+    """Tracks when each schedule is next due.
+
+    Scans run one at a time, so one that overruns delays the next rather than
+    overlapping it, and a schedule that fell due several times meanwhile only
+    runs once.
+    """
+
+    def __init__(self, schedules: list[ScanSchedule], now: datetime) -> None:
+        self.schedules = schedules
+        self.due = [schedule.cron.next_after(now) for schedule in schedules]
+
+    def next_due(self) -> tuple[datetime, int]:
+        return min((due, index) for index, due in enumerate(self.due))
+
+    def ran(self, index: int, now: datetime) -> None:
+        self.due[index] = self.schedules[index].cron.next_after(now)
+
+
+def run_schedules(
+    schedules: list[ScanSchedule], config: Config, logger: logging.Logger
+) -> None:
+    """Run scans as their schedules fall due, sleeping until the next one in between."""
+    scheduler = Scheduler(schedules, local_now())
+    while True:
+        due, index = scheduler.next_due()
+        wait = (due - local_now()).total_seconds()
+        if wait > 0:
+            # Checked again on waking, in case the clock was changed meanwhile.
+            time.sleep(wait)
+            continue
+        schedule = schedules[index]
+        logger.info(f"Starting the run scheduled {schedule.description}...")
+        scan_servers(schedule.config_for(config), logger)
+        scheduler.ran(index, local_now())
+
+
+# Event-driven checks
+
+LIBRARY_IDENTIFIER = "com.plexapp.plugins.library"
+# Timeline states Plex sends while an item is created and processed, and
+# once it is deleted; see plexapi's AlertListener.
+TIMELINE_UPDATE_STATES = frozenset(range(6))
+TIMELINE_DELETED = 9
+# Item types the scans check. Pictures in photo libraries are left out, as
+# only their video clips are checked.
+EVENT_ITEM_TYPES = frozenset(
+    plex_utils.SEARCHTYPES[libtype] for libtype in ("movie", "episode", "clip")
+)
+# Activities that may still be adding the data the checks look for.
+ANALYSIS_ACTIVITY_PREFIXES = ("library.", "media.generate.")
+# Items are checked after this long even if Plex is still busy.
+EVENT_MAX_WAIT_SECONDS = 6 * 3600
+EVENT_POLL_SECONDS = 1.0
+EVENT_RECONNECT_SECONDS = 30.0
+
+
+class PendingItem(NamedTuple):
+    section: int
+    seen: float
+
+
+class EventBatcher:
+    """Collects the items Plex reports as added or updated until they can be checked.
+
+    Items are released together once no notification has arrived for the
+    debounce period and Plex has no library or analysis activity running, so
+    a batch of new episodes is checked once their thumbnails and markers had
+    a chance to be generated. Items waiting longer than EVENT_MAX_WAIT_SECONDS
+    are released regardless.
+    """
+
+    def __init__(self, debounce: float) -> None:
+        self.debounce = debounce
+        self.lock = threading.Lock()
+        self.pending: dict[int, PendingItem] = {}
+        self.analyzing: set[int] = set()
+        self.activities: dict[str, str] = {}
+        self.last_event = 0.0
+
+    def handle(self, data: dict) -> None:
+        """AlertListener callback, receiving each NotificationContainer."""
+        now = time.monotonic()
+        with self.lock:
+            if data.get("type") == "timeline":
+                for entry in data.get("TimelineEntry", []):
+                    self.handle_timeline(entry, now)
+            elif data.get("type") == "activity":
+                for notification in data.get("ActivityNotification", []):
+                    self.handle_activity(notification)
+
+    def handle_timeline(self, entry: dict, now: float) -> None:
+        if (
+            entry.get("identifier") != LIBRARY_IDENTIFIER
+            or entry.get("type") not in EVENT_ITEM_TYPES
+            or "sectionID" not in entry
+        ):
+            return
+        rating_key = int(entry["itemID"])
+        state = entry.get("state")
+        if state == TIMELINE_DELETED:
+            self.pending.pop(rating_key, None)
+            self.analyzing.discard(rating_key)
+            return
+        if state not in TIMELINE_UPDATE_STATES:
+            return
+        if rating_key not in self.pending:
+            self.pending[rating_key] = PendingItem(int(entry["sectionID"]), now)
+        if entry.get("mediaState") == "analyzing":
+            self.analyzing.add(rating_key)
+        else:
+            self.analyzing.discard(rating_key)
+        self.last_event = now
+
+    def handle_activity(self, notification: dict) -> None:
+        activity = notification.get("Activity", {})
+        if not activity.get("type", "").startswith(ANALYSIS_ACTIVITY_PREFIXES):
+            return
+        if notification.get("event") == "ended":
+            self.activities.pop(activity.get("uuid"), None)
+        else:
+            self.activities[activity.get("uuid")] = activity["type"]
+
+    def clear_activities(self) -> None:
+        """Forget running activities, whose end may have been missed while disconnected."""
+        with self.lock:
+            self.activities.clear()
+
+    def take(self, now: float) -> dict[int, int]:
+        """Remove the items ready to check, returning their ratingKeys and section keys."""
+        with self.lock:
+            idle = now - self.last_event >= self.debounce and not self.activities
+            ready = {
+                rating_key: item.section
+                for rating_key, item in self.pending.items()
+                if (idle and rating_key not in self.analyzing)
+                or now - item.seen >= EVENT_MAX_WAIT_SECONDS
+            }
+            for rating_key in ready:
+                del self.pending[rating_key]
+                self.analyzing.discard(rating_key)
+            return ready
+
+
+def check_event_items(
+    plan: LibraryPlan, rating_keys: list[int], config: Config, logger: logging.Logger
+) -> None:
+    """Check items of a library by ratingKey, leaving scan state and checkpoints alone."""
+    library = plan.library
+    scan = LibraryScan(library, plan.features, logger, config, resume=False)
+    check_rating_keys(scan, rating_keys)
+    scan.state.metrics.record_event_items(library.title, scan.items_scanned)
+    for label, count in scan.counts.items():
+        if count > 0:
+            logger.info(
+                f"Found {count} {label} in {scan.items_scanned} new or updated items in {library.title}..."
+            )
+        else:
+            logger.info(
+                f"No {label} found in {scan.items_scanned} new or updated items in {library.title}..."
+            )
+    if scan.failed_items:
+        logger.warning(
+            f"Could not check {scan.failed_items} items in {library.title}..."
+        )
+
+
+def check_events(
+    plex: PlexServer, items: dict[int, int], config: Config, logger: logging.Logger
+) -> None:
+    """Check the items released by an EventBatcher, one library at a time."""
+    logger.info(f"Checking {len(items)} new or updated items...")
+    keys_by_section: dict[int, list[int]] = defaultdict(list)
+    for rating_key, section in items.items():
+        keys_by_section[section].append(rating_key)
+    libraries = [
+        library for library in plex.library.sections() if library.key in keys_by_section
+    ]
+    features = [f for f in FEATURE_SCANS if getattr(config, f.setting)]
+    for plan in plan_libraries(libraries, config, features, logger):
+        try:
+            check_event_items(plan, keys_by_section[plan.library.key], config, logger)
+        except Exception as e:
+            logger.error(
+                f"Failed to check new or updated items in {plan.library.title}, skipping them..."
+            )
+            logger.debug("An exception occurred: %s", e, exc_info=True)
+
+
+def watch_events(config: Config, logger: logging.Logger, stop: threading.Event) -> None:
+    """Check items as Plex reports them added or updated, until ``stop`` is set.
+
+    Only the reported items are fetched, so the work follows new content
+    rather than library size. A dropped notification connection is reopened
+    after EVENT_RECONNECT_SECONDS; changes made while it was down are left to
+    the scheduled scans.
+    """
+    batcher = EventBatcher(config.event_debounce_seconds)
+    session = create_session(config)
+    plex = None
+    listener = None
+    reconnect_at = 0.0
+    while not stop.is_set():
+        now = time.monotonic()
+        if listener is not None and not listener.is_alive():
+            logger.warning("Lost the connection to Plex notifications, reconnecting...")
+            listener = None
+            reconnect_at = now + EVENT_RECONNECT_SECONDS
+        if listener is None and now >= reconnect_at:
+            try:
+                plex = connect_plex(config, session)
+                listener = AlertListener(
+                    plex,
+                    batcher.handle,
+                    lambda error: logger.debug(f"Plex notification error: {error}"),
+                )
+                listener.start()
+            except Exception as e:
+                logger.error("Failed to connect to Plex server for notifications...")
+                logger.debug("An exception occurred: %s", e, exc_info=True)
+                reconnect_at = now + EVENT_RECONNECT_SECONDS
+            else:
+                batcher.clear_activities()
+                logger.info(
+                    f"Watching {plex.friendlyName} for new and updated items..."
+                )
+        items = batcher.take(now)
+        if items:
+            try:
+                check_events(plex, items, config, logger)
+            except Exception as e:
+                logger.error(
+                    f"Failed to check {len(items)} new or updated items, skipping them..."
+                )
+                logger.debug("An exception occurred: %s", e, exc_info=True)
+        stop.wait(EVENT_POLL_SECONDS)
+    if listener is not None and listener.is_alive():
+        listener.stop()
+
+
+# Remediation
+
+# An item sent for analysis is not queued again for this long, giving Plex
+# time to finish the job before a later scan finds it still missing data.
+REMEDIATION_RETRY_SECONDS = 24 * 3600
+REMEDIATION_POLL_SECONDS = 60.0
+# Plex can take a while to list an analysis it was just sent, so items sent
+# this recently count toward REMEDIATION_CONCURRENCY in its place.
+REMEDIATION_SETTLE_SECONDS = 60.0
+BUDGET_WINDOW_SECONDS = 3600
+
+
+class QueuedItem(NamedTuple):
+    rating_key: int
+    library: str
+    subject: str
+    features: set[str]
+
+
+def analysis_load(plex: PlexServer) -> int:
+    """The number of library and analysis activities Plex is running."""
+    return sum(
+        activity.type.startswith(ANALYSIS_ACTIVITY_PREFIXES)
+        for activity in plex.activities
+    )
+
+
+class RemediationQueue:
+    """Sends Analyze requests for items found missing data, a few at a time.
+
+    Items are deduplicated by ratingKey, and those missing the most kinds of
+    data go first since one analysis fills in all of them. A request is only
+    sent while Plex runs fewer than REMEDIATION_CONCURRENCY library and
+    analysis activities and the hourly budget has room, with requests spread
+    evenly over the hour, so a large backlog is worked through steadily
+    rather than starting thousands of jobs at once.
+    """
+
+    def __init__(self, metrics: ScanMetrics | None = None) -> None:
+        self.metrics = metrics or METRICS
+        self.active = False
+        self.condition = threading.Condition()
+        self.items: dict[int, QueuedItem] = {}
+        self.heap: list[tuple[int, int, int]] = []
+        self.sequence = itertools.count()
+        self.sent: dict[int, float] = {}
+        self.budget: deque[float] = deque()
+        self.analyzed = 0
+
+    def start(self, config: Config, logger: logging.Logger) -> None:
+        self.active = True
+        threading.Thread(
+            target=self.run,
+            args=(config, logger, threading.Event()),
+            name="remediation",
+            daemon=True,
+        ).start()
+
+    def add(
+        self, rating_key: int, library: str, subject: str, features: list[str]
+    ) -> None:
+        """Queue an item, or add to the features of one already queued."""
+        if not self.active:
+            return
+        with self.condition:
+            sent = self.sent.get(rating_key)
+            if sent is not None and time.monotonic() - sent < REMEDIATION_RETRY_SECONDS:
+                return
+            item = self.items.get(rating_key)
+            if item is None:
+                item = QueuedItem(rating_key, library, subject, set())
+                self.items[rating_key] = item
+            elif item.features.issuperset(features):
+                return
+            item.features.update(features)
+            # Entries left behind by an earlier, lower priority are skipped by pop.
+            heapq.heappush(
+                self.heap, (-len(item.features), next(self.sequence), rating_key)
+            )
+            self.metrics.record_remediation(len(self.items), self.analyzed)
+            self.condition.notify()
+
+    def pop(self) -> QueuedItem | None:
+        """Remove and return the item to analyse next."""
+        with self.condition:
+            while self.heap:
+                priority, _, rating_key = heapq.heappop(self.heap)
+                item = self.items.get(rating_key)
+                if item is not None and -priority == len(item.features):
+                    del self.items[rating_key]
+                    return item
+            return None
+
+    def budget_wait(self, now: float, budget: int) -> float:
+        """Seconds until the hourly budget allows another request.
+
+        Requests are at least an hour divided by the budget apart, besides
+        never exceeding the budget within any hour.
+        """
+        while self.budget and now - self.budget[0] >= BUDGET_WINDOW_SECONDS:
+            self.budget.popleft()
+        if not self.budget:
+            return 0.0
+        wait = self.budget[-1] + BUDGET_WINDOW_SECONDS / budget - now
+        if len(self.budget) >= budget:
+            wait = max(wait, self.budget[0] + BUDGET_WINDOW_SECONDS - now)
+        return max(0.0, wait)
+
+    def recent_sends(self, now: float) -> int:
+        """The number of items sent too recently for Plex to list their analysis."""
+        return sum(now - sent < REMEDIATION_SETTLE_SECONDS for sent in self.budget)
+
+    def mark_sent(self, rating_key: int, now: float) -> None:
+        with self.condition:
+            self.budget.append(now)
+            self.sent = {
+                key: sent
+                for key, sent in self.sent.items()
+                if now - sent < REMEDIATION_RETRY_SECONDS
+            }
+            self.sent[rating_key] = now
+            self.analyzed += 1
+            self.metrics.record_remediation(len(self.items), self.analyzed)
+
+    def analyze(
+        self,
+        plex: PlexServer,
+        session: requests.Session,
+        item: QueuedItem,
+        logger: logging.Logger,
+    ) -> bool:
+        """Send an item for analysis, returning whether Plex accepted it.
+
+        An item that fails is dropped without using the budget; a later scan
+        queues it again if it is still missing data.
+        """
+        logger.info(
+            f"Analyzing {item.subject} in {item.library} for {', '.join(sorted(item.features))}..."
+        )
+        try:
+            plex.query(
+                f"/library/metadata/{item.rating_key}/analyze", method=session.put
+            )
+        except Exception as e:
+            logger.error(f"Failed to analyze {item.subject}, skipping it...")
+            logger.debug("An exception occurred: %s", e, exc_info=True)
+            return False
+        self.mark_sent(item.rating_key, time.monotonic())
+        return True
+
+    def run(
+        self, config: Config, logger: logging.Logger, stop: threading.Event
+    ) -> None:
+        """Work through the queue until ``stop`` is set."""
+        session = create_session(config)
+        plex = None
+        while not stop.is_set():
+            with self.condition:
+                if not self.items:
+                    self.condition.wait(REMEDIATION_POLL_SECONDS)
+                    continue
+            wait = self.budget_wait(time.monotonic(), config.remediation_hourly_budget)
+            if wait > 0:
+                logger.info(
+                    f"Waiting {wait:.0f}s for the analyze budget, {len(self.items)} items are waiting..."
+                )
+                stop.wait(wait)
+                continue
+            try:
+                if plex is None:
+                    plex = connect_plex(config, session)
+                load = max(analysis_load(plex), self.recent_sends(time.monotonic()))
+            except Exception as e:
+                logger.error("Failed to check Plex server activity, retrying later...")
+                logger.debug("An exception occurred: %s", e, exc_info=True)
+                plex = None
+                stop.wait(REMEDIATION_POLL_SECONDS)
+                continue
+            if load >= config.remediation_concurrency:
+                logger.debug(f"Plex is running {load} analysis activities, waiting...")
+                stop.wait(REMEDIATION_POLL_SECONDS)
+                continue
+            item = self.pop()
+            if item is not None and not self.analyze(plex, session, item, logger):
+                stop.wait(REMEDIATION_POLL_SECONDS)
+
+
+REMEDIATION = RemediationQueue()
+
+
+# Servers
+
+SERVER_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+# Settings a PLEX_SERVERS entry can change for its server -> lowest value allowed
+SERVER_OPTIONS = {
+    "scan_concurrency": 1,
+    "request_latency_target_ms": 0,
+    "request_timeout": 1,
+    "request_retries": 0,
+    "remediation_concurrency": 1,
+    "remediation_hourly_budget": 1,
+}
+
+
+class ServerState(NamedTuple):
+    """The process-wide scan state, of which each named server has its own."""
+
+    metrics: ScanMetrics
+    checkpoint: ScanCheckpoint
+    remediation: RemediationQueue
+
+
+# Keyed by server name; a server without one uses METRICS, CHECKPOINT and
+# REMEDIATION.
+SERVER_STATES: dict[str, ServerState] = {}
+SERVER_STATES_LOCK = threading.Lock()
+
+
+def server_state(name: str) -> ServerState:
+    if not name:
+        return ServerState(METRICS, CHECKPOINT, REMEDIATION)
+    with SERVER_STATES_LOCK:
+        if name not in SERVER_STATES:
+            metrics = ScanMetrics(name)
+            SERVER_STATES[name] = ServerState(
+                metrics, ScanCheckpoint(), RemediationQueue(metrics)
+            )
+        return SERVER_STATES[name]
+
+
+def all_server_states() -> list[ServerState]:
+    with SERVER_STATES_LOCK:
+        return [server_state(""), *SERVER_STATES.values()]
+
+
+def all_metrics() -> list[ScanMetrics]:
+    return [state.metrics for state in all_server_states()]
+
+
+def server_prefix(config: Config, prefix: str) -> str:
+    """Add a named server to a file name prefix, so servers keep separate files."""
+    return f"{prefix}-{config.server_name}" if config.server_name else prefix
+
+
+def server_logger(config: Config, logger: logging.Logger) -> logging.Logger:
+    """A child logger named after the server, so interleaved output can be told apart."""
+    return logger.getChild(config.server_name) if config.server_name else logger
+
+
+def parse_server(entry: str) -> dict[str, object]:
+    """Parse a PLEX_SERVERS entry: a name, URL and token, then optional limits.
+
+    For example "cabin https://cabin.example:32400 TOKEN scan_concurrency=1"
+    scans a server on a slow link one library at a time, whatever
+    SCAN_CONCURRENCY is. Returns the settings the entry overrides.
+    """
+    fields = entry.split()
+    if len(fields) < 3:
+        raise ValueError("an entry needs a name, URL and token")
+    name, url, token, *options = fields
+    if not SERVER_NAME_PATTERN.fullmatch(name):
+        raise ValueError(f'name "{name}" may only contain letters, digits, "-" and "_"')
+    overrides: dict[str, object] = {
+        "server_name": name,
+        "plex_url": url,
+        "plex_token": token,
+    }
+    for option in options:
+        key, _, value = option.partition("=")
+        if key not in SERVER_OPTIONS:
+            raise ValueError(f'unknown option "{key}"')
+        if not value.isdigit() or int(value) < SERVER_OPTIONS[key]:
+            raise ValueError(
+                f"{key} must be an integer of at least {SERVER_OPTIONS[key]}"
+            )
+        overrides[key] = int(value)
+    return overrides
+
+
+def configured_servers(config: Config) -> list[Config]:
+    """The config each server is scanned with.
+
+    Without PLEX_SERVERS, that is the PLEX_URL server with the config as is.
+    """
+    if not config.servers:
+        return [config]
+    return [
+        replace(config, servers=[], **parse_server(entry)) for entry in config.servers
+    ]
+
+
+def scan_servers(config: Config, logger: logging.Logger) -> None:
+    """Scan every configured server, each on its own thread.
+
+    A run then takes as long as its slowest server rather than the sum of all
+    of them. Each server's scan is isolated and logs its own failures.
+    """
+    servers = configured_servers(config)
+    if len(servers) == 1:
+        find_missing_metadata(servers[0], server_logger(servers[0], logger))
+        return
+    with ThreadPoolExecutor(len(servers), thread_name_prefix="scan") as pool:
+        for server in servers:
+            pool.submit(find_missing_metadata, server, server_logger(server, logger))
 
 
 def _handle_signal(signum: int, frame: object, logger: logging.Logger) -> None:
     logger.info("Received signal to terminate. Exiting...")
+    STOPPING.set()
+    for state in all_server_states():
+        state.checkpoint.flush()
     sys.exit(0)
 
 
@@ -394,19 +3994,30 @@ def main() -> None:
     signal.signal(signal.SIGTERM, lambda sig, frame: _handle_signal(sig, frame, logger))
     signal.signal(signal.SIGINT, lambda sig, frame: _handle_signal(sig, frame, logger))
 
+    if config.metrics_port:
+        start_metrics_server(config.metrics_port, logger)
+
     if config.run_once:
         logger.info("Preview Maid is running in one-time mode...")
-        find_missing_metadata(config, logger)
+        scan_servers(config, logger)
         logger.info("Exiting since RUN_ONCE is set to True...")
         sys.exit(0)
     else:
-        logger.info(f"Preview Maid is scheduled to run daily at {config.run_time}...")
-        schedule.every().day.at(config.run_time).do(
-            find_missing_metadata, config, logger
-        )
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        for server in configured_servers(config):
+            log = server_logger(server, logger)
+            if config.remediate:
+                server_state(server.server_name).remediation.start(server, log)
+            if config.watch_events:
+                threading.Thread(
+                    target=watch_events,
+                    args=(server, log, threading.Event()),
+                    name="watch-events",
+                    daemon=True,
+                ).start()
+        schedules = configured_schedules(config)
+        for schedule in schedules:
+            logger.info(f"Preview Maid is scheduled to run {schedule.description}...")
+        run_schedules(schedules, config, logger)
 
 
 if __name__ == "__main__":
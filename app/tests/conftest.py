@@ -1,9 +1,14 @@
+import itertools
 import logging
+import time
 from types import SimpleNamespace
+from unittest.mock import MagicMock
 
 import pytest
 from previewmaid import Config
 
+_rating_keys = itertools.count(1)
+
 
 @pytest.fixture
 def default_config():
@@ -55,6 +60,7 @@ def make_marker(marker_type):
 def make_episode(title, media, markers=None, parent_index=1, index=1):
     ep = SimpleNamespace()
     ep.type = "episode"
+    ep.ratingKey = next(_rating_keys)
     ep.title = title
     ep.media = media
     ep.markers = markers or []
@@ -65,15 +71,19 @@ def make_episode(title, media, markers=None, parent_index=1, index=1):
 
 def make_show(title, episodes):
     show = SimpleNamespace()
+    show.ratingKey = next(_rating_keys)
     show.type = "show"
     show.title = title
     show.episodes = lambda: episodes
+    for episode in episodes:
+        episode.grandparentTitle = title
     return show
 
 
 def make_movie(title, media, markers=None):
     movie = SimpleNamespace()
     movie.type = "movie"
+    movie.ratingKey = next(_rating_keys)
     movie.title = title
     movie.media = media
     movie.markers = markers or []
@@ -82,13 +92,93 @@ def make_movie(title, media, markers=None):
 
 def make_library(title, lib_type, items, settings=None):
     lib = SimpleNamespace()
+    lib.key = title
     lib.type = lib_type
     lib.title = title
-    lib.all = lambda: items
+
+    def all_items(
+        libtype=None, filters=None, container_start=0, container_size=None, **kwargs
+    ):
+        results = items
+        if libtype == "episode":
+            results = [episode for show in items for episode in show.episodes()]
+        if libtype == "clip":
+            results = [clip for album in items for clip in album_clips(album)]
+        if filters:
+            since = filters["updatedAt>>"]
+            results = [item for item in results if item.updatedAt > since]
+        if container_size is None:
+            return results
+        return results[container_start : container_start + container_size]
+
+    def fetch_items(rating_keys, params=None):
+        libtype = {"show": "episode", "photo": "clip"}.get(lib_type)
+        listed = [*items, *all_items(libtype=libtype)]
+        by_key = {item.ratingKey: item for item in listed}
+        return [by_key[key] for key in rating_keys if key in by_key]
+
+    lib.all = all_items
+    lib.totalViewSize = lambda libtype=None, **kwargs: len(all_items(libtype))
+    lib.fetchItems = fetch_items
     lib.settings = lambda: settings or []
     return lib
 
 
+def make_movies_library(
+    title="Movies",
+    count=3,
+    missing=(0,),
+    fail_from=None,
+    settings=("enableBIFGeneration",),
+    **media_args,
+):
+    """A movie library whose movies at the ``missing`` indexes lack previews.
+
+    Each listing's container_start is kept in ``lib.starts``, and listings
+    from ``fail_from`` on raise as if Plex stopped responding.
+    """
+    movies = [
+        make_movie(
+            f"{title} {n}",
+            [
+                make_media(
+                    parts=[make_part(f"/{n}.mkv", n not in missing)], **media_args
+                )
+            ],
+        )
+        for n in range(count)
+    ]
+    lib = make_library(
+        title, "movie", movies, settings=[make_setting(s, True) for s in settings]
+    )
+    lib.starts = []
+    all_items = lib.all
+
+    def tracked_all(**kwargs):
+        start = kwargs.get("container_start", 0)
+        lib.starts.append(start)
+        if fail_from is not None and start >= fail_from:
+            raise TimeoutError("Plex stopped responding")
+        return all_items(**kwargs)
+
+    lib.all = tracked_all
+    return lib
+
+
+def make_plex(*libraries):
+    plex = MagicMock()
+    plex.friendlyName = "Test Server"
+    plex.library.sections.return_value = list(libraries)
+    return plex
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+
 def make_setting(setting_id, value=True):
     setting = SimpleNamespace()
     setting.id = setting_id
@@ -98,12 +188,24 @@ def make_setting(setting_id, value=True):
 
 def make_album(sub_albums=None, clips=None):
     album = SimpleNamespace()
+    album.ratingKey = next(_rating_keys)
     album.albums = lambda: sub_albums or []
     album.clips = lambda: clips or []
     return album
 
 
-def make_clip(media):
+def make_clip(media, title="Clip"):
     clip = SimpleNamespace()
+    clip.ratingKey = next(_rating_keys)
+    clip.type = "clip"
+    clip.title = title
     clip.media = media
     return clip
+
+
+def album_clips(album):
+    clips = []
+    for sub_album in album.albums():
+        clips.extend(album_clips(sub_album))
+    clips.extend(album.clips())
+    return clips
@@ -0,0 +1,65 @@
+import pytest
+from benchmarks.fake_plex import FakePlexServer, SyntheticSection
+from benchmarks.run_benchmarks import FEATURE_KEYS, expected_totals
+from previewmaid import Config, run_scan
+
+
+@pytest.fixture
+def fake_plex():
+    sections = [
+        SyntheticSection(1, "movie", 130),
+        SyntheticSection(2, "show", 120),
+        SyntheticSection(3, "photo", 40),
+    ]
+    server = FakePlexServer(sections).start()
+    yield server
+    server.stop()
+
+
+def make_config(url, **settings):
+    return Config(
+        plex_url=url,
+        plex_token="benchmark",
+        run_once=True,
+        run_time="00:00",
+        container_size=50,
+        **dict.fromkeys(FEATURE_KEYS, True),
+        **settings,
+    )
+
+
+def combined_totals(server):
+    totals = {}
+    for section in server.sections.values():
+        for label, count in expected_totals(section).items():
+            totals[label] = totals.get(label, 0) + count
+    return totals
+
+
+class TestFakePlex:
+    @pytest.mark.parametrize(
+        "settings",
+        [
+            {"scan_engine": "sync"},
+            {"scan_engine": "async", "scan_concurrency": 4},
+            {"scan_engine": "sync", "lean_requests": True},
+        ],
+    )
+    def test_scan_finds_synthetic_gaps(self, fake_plex, logger, settings):
+        totals = run_scan(make_config(fake_plex.url, **settings), logger)
+        assert totals == combined_totals(fake_plex)
+        assert fake_plex.requests > 0
+        assert fake_plex.bytes_sent > 0
+
+    def test_updated_since_filter(self, fake_plex):
+        section = fake_plex.sections[1]
+        listing = fake_plex.listing(section, {"updatedAt>>": "1700000119"})
+        assert listing["totalSize"] == 10
+        assert [item["title"] for item in listing["Metadata"]][:2] == [
+            "Item 120",
+            "Item 121",
+        ]
+
+    def test_unknown_paths(self, fake_plex):
+        assert fake_plex.route("/library/sections/9/all", {}) is None
+        assert fake_plex.route("/status/sessions", {}) is None
@@ -0,0 +1,162 @@
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from conftest import make_movies_library, make_plex
+from previewmaid import (
+    CHECKPOINT,
+    FEATURE_SCANS,
+    STOPPING,
+    _handle_signal,
+    checkpoint_path,
+    checkpoint_scope,
+    find_missing_metadata,
+    scan_library,
+)
+
+SCOPE = ["api", "clips", "missing thumbnail previews"]
+
+
+@pytest.fixture
+def checkpoint_file(tmp_path, default_config, logger):
+    default_config.resumable_scans = True
+    default_config.state_directory = str(tmp_path)
+    default_config.container_size = 1
+    path = Path(checkpoint_path(default_config, logger))
+    yield path
+    CHECKPOINT.finish_run(True)
+    STOPPING.clear()
+
+
+class TestCheckpoints:
+    def test_scope(self, default_config, logger, checkpoint_file):
+        assert checkpoint_scope(default_config) == SCOPE
+        default_config.incremental_scans = True
+        assert "incremental" in checkpoint_scope(default_config)
+        assert checkpoint_path(default_config, logger) != str(checkpoint_file)
+
+    def test_interrupted_run_resumes(
+        self, default_config, logger, checkpoint_file, monkeypatch
+    ):
+        monkeypatch.setattr("previewmaid.MARKER_BATCH_SIZE", 1)
+        CHECKPOINT.start_run(str(checkpoint_file), SCOPE, logger)
+        with pytest.raises(TimeoutError):
+            scan_library(
+                make_movies_library(count=4, missing=(1,), fail_from=2),
+                default_config,
+                FEATURE_SCANS[:1],
+                logger,
+            )
+        CHECKPOINT.finish_run(False)
+        saved = json.loads(checkpoint_file.read_text())
+        assert saved["libraries"]["Movies"] == {
+            "offset": 2,
+            "counts": {"missing thumbnail previews": 1},
+            "done": False,
+        }
+
+        CHECKPOINT.start_run(str(checkpoint_file), SCOPE, logger)
+        lib = make_movies_library(count=4, missing=(1,))
+        counts = scan_library(lib, default_config, FEATURE_SCANS[:1], logger)
+        assert lib.starts[0] == 2
+        assert counts == {"missing thumbnail previews": 1}
+
+    def test_finished_library_skipped(
+        self, default_config, logger, checkpoint_file, caplog
+    ):
+        checkpoint_file.write_text(
+            json.dumps(
+                {
+                    "scope": SCOPE,
+                    "libraries": {
+                        "Movies": {
+                            "offset": 4,
+                            "counts": {"missing thumbnail previews": 1},
+                            "done": True,
+                        }
+                    },
+                }
+            )
+        )
+        lib = make_movies_library(count=4, missing=(1,))
+        with patch("previewmaid.PlexServer", return_value=make_plex(lib)):
+            find_missing_metadata(default_config, logger)
+        assert lib.starts == []
+        assert "found 1 in total" in caplog.text
+        assert not checkpoint_file.exists()
+
+    def test_failed_run_keeps_checkpoint(
+        self, default_config, logger, checkpoint_file, monkeypatch
+    ):
+        monkeypatch.setattr("previewmaid.MARKER_BATCH_SIZE", 1)
+        lib = make_movies_library(count=4, missing=(1,), fail_from=2)
+        with patch("previewmaid.PlexServer", return_value=make_plex(lib)):
+            find_missing_metadata(default_config, logger)
+        saved = json.loads(checkpoint_file.read_text())
+        assert saved["scope"] == SCOPE
+        assert saved["failed"] is True
+        assert saved["libraries"]["Movies"]["offset"] == 2
+
+    def test_failing_library_does_not_hold_back_others(
+        self, default_config, logger, checkpoint_file, caplog
+    ):
+        for _ in range(2):
+            good = make_movies_library("Good", count=4, missing=(1,))
+            bad = make_movies_library("Bad", count=4, missing=(1,), fail_from=0)
+            with patch("previewmaid.PlexServer", return_value=make_plex(good, bad)):
+                find_missing_metadata(default_config, logger)
+            assert good.starts[0] == 0
+        assert "Skipping Good" not in caplog.text
+        assert "Resuming the libraries the last run did not finish" in caplog.text
+        assert "1 of 2 libraries could not be scanned" in caplog.text
+
+    def test_changed_scope_starts_over(self, logger, checkpoint_file, caplog):
+        checkpoint_file.write_text(
+            json.dumps(
+                {
+                    "scope": ["database", *SCOPE[1:]],
+                    "libraries": {"Movies": {"offset": 4, "counts": {}, "done": True}},
+                }
+            )
+        )
+        CHECKPOINT.start_run(str(checkpoint_file), SCOPE, logger)
+        assert CHECKPOINT.progress("Movies") is None
+        assert "starting over" in caplog.text
+
+    def test_unreadable_checkpoint(self, logger, checkpoint_file, caplog):
+        checkpoint_file.write_text("{")
+        CHECKPOINT.start_run(str(checkpoint_file), SCOPE, logger)
+        assert CHECKPOINT.progress("Movies") is None
+        assert "Could not read checkpoint" in caplog.text
+
+    def test_signal_flushes_checkpoint(self, logger, checkpoint_file):
+        CHECKPOINT.start_run(str(checkpoint_file), SCOPE, logger)
+        CHECKPOINT.update("Movies", 2, {"missing thumbnail previews": 1})
+        assert not checkpoint_file.exists()
+        with pytest.raises(SystemExit):
+            _handle_signal(15, None, logger)
+        saved = json.loads(checkpoint_file.read_text())
+        assert saved["libraries"]["Movies"]["offset"] == 2
+
+    def test_signal_during_run_keeps_finished_libraries(
+        self, default_config, logger, checkpoint_file
+    ):
+        done = make_movies_library("Done", count=4, missing=(1,))
+        stopped = make_movies_library("Stopped", count=4, missing=(1,))
+        stopped.all = lambda **kwargs: _handle_signal(15, None, logger)
+        with (
+            patch("previewmaid.PlexServer", return_value=make_plex(done, stopped)),
+            pytest.raises(SystemExit),
+        ):
+            find_missing_metadata(default_config, logger)
+        saved = json.loads(checkpoint_file.read_text())
+        assert saved["failed"] is False
+        assert saved["libraries"]["Done"]["done"] is True
+
+    def test_disabled_by_default(self, default_config, logger, tmp_path):
+        default_config.state_directory = str(tmp_path)
+        lib = make_movies_library(count=4, missing=(1,), fail_from=0)
+        with patch("previewmaid.PlexServer", return_value=make_plex(lib)):
+            find_missing_metadata(default_config, logger)
+        assert list(tmp_path.iterdir()) == []
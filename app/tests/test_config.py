@@ -1,4 +1,5 @@
-from previewmaid import load_config, parse_bool_env, validate_config
+import pytest
+from previewmaid import INVALID_INT, load_config, parse_bool_env, validate_config
 
 
 class TestParseBoolEnv:
@@ -32,6 +33,21 @@ class TestLoadConfig:
         monkeypatch.delenv("FIND_MISSING_INTRO_MARKERS", raising=False)
         monkeypatch.delenv("FIND_MISSING_CREDITS_MARKERS", raising=False)
         monkeypatch.delenv("FIND_MISSING_AD_MARKERS", raising=False)
+        monkeypatch.delenv("PLEX_CONTAINER_SIZE", raising=False)
+        monkeypatch.delenv("SCAN_CONCURRENCY", raising=False)
+        monkeypatch.delenv("REQUEST_LATENCY_TARGET_MS", raising=False)
+        monkeypatch.delenv("SCAN_ENGINE", raising=False)
+        monkeypatch.delenv("SCAN_BACKEND", raising=False)
+        monkeypatch.delenv("LEAN_REQUESTS", raising=False)
+        monkeypatch.delenv("WRITE_REPORTS", raising=False)
+        monkeypatch.delenv("METRICS_PORT", raising=False)
+        monkeypatch.delenv("METRICS_TEXTFILE", raising=False)
+        monkeypatch.delenv("PROFILE", raising=False)
+        monkeypatch.delenv("PROFILE_DUMP", raising=False)
+        monkeypatch.delenv("PHOTO_TRAVERSAL", raising=False)
+        monkeypatch.delenv("INCREMENTAL_SCANS", raising=False)
+        monkeypatch.delenv("FULL_SCAN_INTERVAL_DAYS", raising=False)
+        monkeypatch.delenv("RECHECK_AFTER_DAYS", raising=False)
 
         config = load_config()
         assert config.plex_url == ""
@@ -42,6 +58,29 @@ class TestLoadConfig:
         assert config.run_time == "00:00"
         assert config.skip_library_types == []
         assert config.skip_library_names == []
+        assert config.container_size == 200
+        assert config.scan_concurrency == 1
+        assert config.request_latency_target_ms == 0
+        assert config.request_timeout == 60
+        assert config.request_retries == 3
+        assert config.scan_engine == "sync"
+        assert config.scan_backend == "api"
+        assert config.lean_requests is False
+        assert config.write_reports is False
+        assert config.metrics_port == 0
+        assert config.metrics_textfile == ""
+        assert config.profile is False
+        assert config.profile_dump is False
+        assert config.photo_traversal == "clips"
+        assert config.incremental_scans is False
+        assert config.resumable_scans is False
+        assert config.full_scan_interval_days == 7
+        assert config.recheck_after_days == 30
+        assert config.watch_events is False
+        assert config.event_debounce_seconds == 30
+        assert config.remediate is False
+        assert config.remediation_concurrency == 1
+        assert config.remediation_hourly_budget == 30
 
     def test_loads_env_values(self, monkeypatch):
         monkeypatch.setenv("PLEX_URL", "http://plex:32400")
@@ -51,6 +90,7 @@ class TestLoadConfig:
         monkeypatch.setenv("RUN_TIME", "03:30")
         monkeypatch.setenv("SKIP_LIBRARY_TYPES", "movie,photo")
         monkeypatch.setenv("SKIP_LIBRARY_NAMES", "Music,  Audiobooks ")
+        monkeypatch.setenv("SCHEDULES", "0 * * * * thumbnails; 0 3 * * 0 intro ;")
 
         config = load_config()
         assert config.plex_url == "http://plex:32400"
@@ -60,6 +100,8 @@ class TestLoadConfig:
         assert config.run_time == "03:30"
         assert config.skip_library_types == ["movie", "photo"]
         assert config.skip_library_names == ["Music", "Audiobooks"]
+        assert config.schedules == ["0 * * * * thumbnails", "0 3 * * 0 intro"]
+        assert config.servers == []
 
     def test_strips_whitespace_from_lists(self, monkeypatch):
         monkeypatch.setenv("SKIP_LIBRARY_TYPES", " movie , show ")
@@ -68,6 +110,29 @@ class TestLoadConfig:
         assert config.skip_library_types == ["movie", "show"]
         assert config.skip_library_names == []
 
+    def test_invalid_container_size(self, monkeypatch):
+        monkeypatch.setenv("PLEX_CONTAINER_SIZE", "lots")
+        config = load_config()
+        assert config.container_size == INVALID_INT
+        assert any("PLEX_CONTAINER_SIZE" in e for e in validate_config(config))
+
+    @pytest.mark.parametrize(
+        ("setting", "value"),
+        [
+            ("REQUEST_RETRIES", "abc"),
+            ("REQUEST_LATENCY_TARGET_MS", "5ms"),
+            ("EVENT_DEBOUNCE_SECONDS", "-5"),
+            ("METRICS_PORT", "9100.0"),
+        ],
+    )
+    def test_invalid_non_negative_setting(self, monkeypatch, setting, value):
+        monkeypatch.setenv("PLEX_URL", "http://plex:32400")
+        monkeypatch.setenv("PLEX_TOKEN", "abc123")
+        monkeypatch.setenv(setting, value)
+        assert validate_config(load_config()) == [
+            f"{setting} must be a non-negative integer."
+        ]
+
 
 class TestValidateConfig:
     def test_valid_config(self, default_config):
@@ -99,6 +164,127 @@ class TestValidateConfig:
         errors = validate_config(default_config)
         assert errors == []
 
+    def test_invalid_scan_concurrency(self, default_config):
+        default_config.scan_concurrency = 0
+        errors = validate_config(default_config)
+        assert any("SCAN_CONCURRENCY" in e for e in errors)
+
+    def test_invalid_scan_engine(self, default_config):
+        default_config.scan_engine = "turbo"
+        errors = validate_config(default_config)
+        assert any("SCAN_ENGINE" in e for e in errors)
+
+    def test_invalid_scan_backend(self, default_config):
+        default_config.scan_backend = "filesystem"
+        errors = validate_config(default_config)
+        assert any("SCAN_BACKEND" in e for e in errors)
+
+    def test_media_directory_requires_database_backend(self, default_config):
+        default_config.plex_media_directory = "/plex/Media/localhost"
+        errors = validate_config(default_config)
+        assert any("PLEX_MEDIA_DIRECTORY" in e for e in errors)
+        default_config.scan_backend = "database"
+        assert validate_config(default_config) == []
+
+    def test_invalid_photo_traversal(self, default_config):
+        default_config.photo_traversal = "recursive"
+        errors = validate_config(default_config)
+        assert any("PHOTO_TRAVERSAL" in e for e in errors)
+
+    def test_album_traversal_requires_sync_engine(self, default_config):
+        default_config.photo_traversal = "albums"
+        assert validate_config(default_config) == []
+        default_config.scan_engine = "async"
+        errors = validate_config(default_config)
+        assert any("PHOTO_TRAVERSAL" in e for e in errors)
+
+    def test_invalid_full_scan_interval(self, default_config):
+        default_config.full_scan_interval_days = 0
+        errors = validate_config(default_config)
+        assert any("FULL_SCAN_INTERVAL_DAYS" in e for e in errors)
+
+    def test_invalid_recheck_after_days(self, default_config):
+        default_config.recheck_after_days = 0
+        errors = validate_config(default_config)
+        assert any("RECHECK_AFTER_DAYS" in e for e in errors)
+
+    def test_invalid_metrics_port(self, default_config):
+        default_config.metrics_port = 70000
+        errors = validate_config(default_config)
+        assert any("METRICS_PORT" in e for e in errors)
+
+    def test_profile_dump_requires_profile(self, default_config):
+        default_config.profile_dump = True
+        errors = validate_config(default_config)
+        assert any("PROFILE_DUMP" in e for e in errors)
+
+    def test_watch_events_with_run_once(self, default_config):
+        default_config.watch_events = True
+        errors = validate_config(default_config)
+        assert errors == ["WATCH_EVENTS cannot be used with RUN_ONCE."]
+
+    def test_remediation(self, default_config):
+        default_config.remediate = True
+        default_config.remediation_hourly_budget = 0
+        errors = validate_config(default_config)
+        assert any("REMEDIATE cannot be used with RUN_ONCE" in e for e in errors)
+        assert any("REMEDIATION_HOURLY_BUDGET" in e for e in errors)
+        default_config.run_once = False
+        default_config.remediation_hourly_budget = 30
+        assert validate_config(default_config) == []
+
+    def test_servers(self, default_config):
+        default_config.plex_url = ""
+        default_config.plex_token = ""
+        default_config.servers = [
+            "home http://home:32400 a",
+            "cabin http://cabin:32400 b",
+        ]
+        assert validate_config(default_config) == []
+        default_config.profile = True
+        default_config.scan_backend = "database"
+        errors = validate_config(default_config)
+        assert any("PROFILE cannot be used" in e for e in errors)
+        assert any("SCAN_BACKEND=database cannot be used" in e for e in errors)
+
+    def test_schedule_with_database_backend_and_servers(self, default_config):
+        default_config.servers = [
+            "home http://home:32400 a",
+            "cabin http://cabin:32400 b",
+        ]
+        default_config.schedules = ["0 3 * * * database", "0 * * * * incremental"]
+        database_error = "SCAN_BACKEND=database cannot be used with more than one server in PLEX_SERVERS."
+        assert validate_config(default_config) == [
+            f'Schedule "0 3 * * * database" in SCHEDULES is invalid: {database_error}'
+        ]
+        default_config.scan_backend = "database"
+        assert validate_config(default_config) == [database_error]
+
+    def test_invalid_servers(self, default_config):
+        default_config.servers = [
+            "home http://home:32400 secret-token",
+            "home http://cabin:32400 b",
+            "cabin http://cabin:32400",
+        ]
+        errors = validate_config(default_config)
+        assert errors == [
+            "Server 3 in PLEX_SERVERS is invalid: an entry needs a name, URL and token",
+            'Server name "home" is used more than once in PLEX_SERVERS.',
+        ]
+        assert not any("secret-token" in e for e in errors)
+
+    def test_invalid_schedule(self, default_config):
+        default_config.schedules = ["0 * * * * thumbnails", "0 25 * * *"]
+        errors = validate_config(default_config)
+        assert errors == [
+            'Schedule "0 25 * * *" in SCHEDULES is invalid: hour "25" must be within 0-23'
+        ]
+
+    def test_invalid_request_timeout(self, default_config):
+        default_config.request_timeout = 0
+        errors = validate_config(default_config)
+        assert any("REQUEST_TIMEOUT" in e for e in errors)
+
     def test_invalid_run_time(self, default_config):
         default_config.run_time = "25:00"
         errors = validate_config(default_config)
@@ -0,0 +1,244 @@
+import logging
+import sqlite3
+from contextlib import closing
+
+import pytest
+from conftest import make_library
+from previewmaid import (
+    FEATURE_SCANS,
+    LibraryPlan,
+    PartRecord,
+    extra_data_value,
+    iter_database_items,
+    open_plex_database,
+    scan_bif_bundles,
+    scan_database,
+)
+
+SCHEMA = """
+CREATE TABLE metadata_items (
+    id INTEGER PRIMARY KEY,
+    library_section_id INTEGER,
+    parent_id INTEGER,
+    metadata_type INTEGER,
+    title TEXT,
+    "index" INTEGER,
+    deleted_at INTEGER
+);
+CREATE TABLE media_items (
+    id INTEGER PRIMARY KEY,
+    library_section_id INTEGER,
+    metadata_item_id INTEGER,
+    width INTEGER,
+    height INTEGER,
+    extra_data TEXT,
+    deleted_at INTEGER
+);
+CREATE TABLE media_parts (
+    id INTEGER PRIMARY KEY,
+    media_item_id INTEGER,
+    file TEXT,
+    hash TEXT,
+    extra_data TEXT,
+    deleted_at INTEGER
+);
+CREATE TABLE tags (id INTEGER PRIMARY KEY, tag TEXT, tag_type INTEGER);
+CREATE TABLE taggings (
+    id INTEGER PRIMARY KEY,
+    metadata_item_id INTEGER,
+    tag_id INTEGER,
+    text TEXT
+);
+"""
+
+
+@pytest.fixture
+def plex_database(tmp_path):
+    path = tmp_path / "com.plexapp.plugins.library.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    connection.executemany(
+        "INSERT INTO metadata_items VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            # Movies section
+            (1, 1, None, 1, "Complete", None, None),
+            (2, 1, None, 1, "Incomplete", None, None),
+            (3, 1, None, 1, "Deleted", None, 1700000000),
+            # TV section
+            (10, 2, None, 2, "Show", None, None),
+            (11, 2, 10, 3, "Season 1", 1, None),
+            (12, 2, 11, 4, "Pilot", 1, None),
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO media_items VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (100, 1, 1, 1920, 1080, '{"ma:hasVoiceActivity":"1"}', None),
+            (101, 1, 2, 1280, 720, None, None),
+            (102, 1, 3, 1920, 1080, None, None),
+            (120, 2, 12, 1920, 1080, "ma%3AhasVoiceActivity=1", None),
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO media_parts VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (200, 100, "/movies/complete.mkv", "a1", '{"ma:indexes":"sd"}', None),
+            (201, 101, "/movies/incomplete.mkv", "b2", "{}", None),
+            (202, 102, "/movies/deleted.mkv", "c3", None, None),
+            (220, 120, "/tv/pilot.mkv", "d4", "ma%3Aindexes=sd", None),
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO tags VALUES (?, ?, ?)", [(1, None, 12), (2, "Drama", 1)]
+    )
+    connection.executemany(
+        "INSERT INTO taggings VALUES (?, ?, ?, ?)",
+        [
+            (1, 1, 1, "intro"),
+            (2, 1, 1, "credits"),
+            (3, 12, 1, "credits"),
+            (4, 2, 2, "intro"),
+        ],
+    )
+    connection.commit()
+    connection.close()
+    return str(path)
+
+
+def make_sections():
+    movies = make_library("Movies", "movie", [])
+    movies.key = "1"
+    shows = make_library("TV", "show", [])
+    shows.key = "2"
+    return movies, shows
+
+
+class TestIterDatabaseItems:
+    def test_reads_only_offending_items(self, plex_database):
+        movies, _ = make_sections()
+        with closing(open_plex_database(plex_database)) as connection:
+            items = list(iter_database_items(connection, movies, FEATURE_SCANS[:3]))
+        # "Complete" has every kind of data and is never read.
+        (incomplete,) = items
+        assert incomplete.title == "Incomplete"
+        (media,) = incomplete.media
+        assert media.videoResolution is None
+        assert media.hasVoiceActivity is False
+        assert media.parts == [PartRecord("/movies/incomplete.mkv", False)]
+        assert incomplete.markers == []
+
+    def test_reads_only_offending_media(self, plex_database):
+        _, shows = make_sections()
+        with closing(open_plex_database(plex_database)) as connection:
+            (episode,) = iter_database_items(connection, shows, FEATURE_SCANS[:3])
+        # The pilot only lacks an intro marker, so none of its media is read.
+        assert episode.media == []
+        assert [marker.type for marker in episode.markers] == ["credits"]
+
+    def test_reads_items_missing_a_planned_marker(self, plex_database):
+        movies, _ = make_sections()
+        with closing(open_plex_database(plex_database)) as connection:
+            items = list(iter_database_items(connection, movies, FEATURE_SCANS[3:4]))
+            assert list(iter_database_items(connection, movies, [])) == []
+        assert [(item.title, item.media, item.markers) for item in items] == [
+            ("Incomplete", [], [])
+        ]
+
+    def test_episodes_carry_show_and_season(self, plex_database):
+        _, shows = make_sections()
+        with closing(open_plex_database(plex_database)) as connection:
+            (episode,) = iter_database_items(connection, shows, FEATURE_SCANS[2:3])
+        assert episode.type == "episode"
+        assert (episode.grandparentTitle, episode.parentIndex, episode.index) == (
+            "Show",
+            1,
+            1,
+        )
+
+    def test_opened_read_only(self, plex_database):
+        with (
+            closing(open_plex_database(plex_database)) as connection,
+            pytest.raises(sqlite3.OperationalError),
+        ):
+            connection.execute("DELETE FROM metadata_items")
+
+
+class TestScanDatabase:
+    def test_matches_api_findings(self, default_config, logger, caplog, plex_database):
+        default_config.plex_database = plex_database
+        movies, shows = make_sections()
+        features = [FEATURE_SCANS[0], FEATURE_SCANS[1], FEATURE_SCANS[2]]
+        plans = [LibraryPlan(movies, features), LibraryPlan(shows, features)]
+        with caplog.at_level(logging.WARNING, logger="test_preview_maid"):
+            counts = list(scan_database(plans, default_config, logger))
+
+        assert counts == [
+            {
+                "missing thumbnail previews": 1,
+                "missing voice activity data": 1,
+                "missing intro markers": 1,
+            },
+            {
+                "missing thumbnail previews": 0,
+                "missing voice activity data": 0,
+                "missing intro markers": 1,
+            },
+        ]
+        assert [record.getMessage() for record in caplog.records] == [
+            "/movies/incomplete.mkv is missing preview thumbnails",
+            '"Incomplete" is missing voice activity data',
+            '"Incomplete" is missing intro markers',
+            '"Show - Pilot (Season 1, Episode 1)" is missing intro markers',
+        ]
+
+
+class TestBifBundles:
+    def make_bundle(self, media_directory, part_hash, has_bif=True):
+        contents = (
+            media_directory / part_hash[0] / f"{part_hash[1:]}.bundle" / "Contents"
+        )
+        (contents / "Indexes").mkdir(parents=True)
+        if has_bif:
+            (contents / "Indexes" / "index-sd.bif").touch()
+
+    def test_collects_hashes_with_bif(self, tmp_path):
+        self.make_bundle(tmp_path, "a1")
+        self.make_bundle(tmp_path, "a2", has_bif=False)
+        self.make_bundle(tmp_path, "b2")
+        assert scan_bif_bundles(str(tmp_path)) == {"a1", "b2"}
+
+    def test_filesystem_overrides_database(
+        self, default_config, logger, tmp_path, plex_database
+    ):
+        media_directory = tmp_path / "localhost"
+        self.make_bundle(media_directory, "b2")
+        default_config.plex_database = plex_database
+        default_config.plex_media_directory = str(media_directory)
+        movies, _ = make_sections()
+        plans = [LibraryPlan(movies, FEATURE_SCANS[:1])]
+        counts = list(scan_database(plans, default_config, logger))
+        # "Complete" is flagged in the database but has no BIF on disk.
+        assert counts == [{"missing thumbnail previews": 1}]
+
+    def test_not_scanned_without_thumbnail_feature(
+        self, default_config, logger, plex_database
+    ):
+        default_config.plex_database = plex_database
+        default_config.plex_media_directory = "/nonexistent"
+        movies, _ = make_sections()
+        plans = [LibraryPlan(movies, FEATURE_SCANS[2:3])]
+        assert list(scan_database(plans, default_config, logger)) == [
+            {"missing intro markers": 1}
+        ]
+
+
+class TestExtraData:
+    def test_json(self):
+        assert extra_data_value('{"ma:indexes":"sd"}', "indexes") == "sd"
+
+    def test_query_string(self):
+        assert extra_data_value("ma%3AhasVoiceActivity=1", "hasVoiceActivity") == "1"
+
+    def test_missing(self):
+        assert extra_data_value(None, "indexes") is None
+        assert extra_data_value("{}", "indexes") is None
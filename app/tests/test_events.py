@@ -0,0 +1,166 @@
+import threading
+import time
+
+import pytest
+from benchmarks.fake_plex import RATING_KEY_STRIDE, FakePlexServer, SyntheticSection
+from conftest import wait_for
+from previewmaid import (
+    EVENT_MAX_WAIT_SECONDS,
+    LIBRARY_IDENTIFIER,
+    METRICS,
+    EventBatcher,
+    watch_events,
+)
+
+MOVIES = "Synthetic movie 1"
+
+
+def rating_key(index, section=1):
+    return section * RATING_KEY_STRIDE + index
+
+
+def timeline(*indexes, state=5, item_type=1, **fields):
+    return {
+        "type": "timeline",
+        "size": len(indexes),
+        "TimelineEntry": [
+            {
+                "identifier": LIBRARY_IDENTIFIER,
+                "sectionID": "1",
+                "itemID": str(rating_key(index)),
+                "type": item_type,
+                "state": state,
+                **fields,
+            }
+            for index in indexes
+        ],
+    }
+
+
+def activity(event, activity_type="media.generate.bif", uuid="bif"):
+    return {
+        "type": "activity",
+        "size": 1,
+        "ActivityNotification": [
+            {
+                "event": event,
+                "uuid": uuid,
+                "Activity": {"uuid": uuid, "type": activity_type},
+            }
+        ],
+    }
+
+
+def later(seconds=0):
+    return time.monotonic() + seconds
+
+
+class TestEventBatcher:
+    def test_debounces_notifications(self):
+        batcher = EventBatcher(30)
+        batcher.handle(timeline(0, 1))
+        batcher.handle(timeline(1, 2))
+        assert batcher.take(later()) == {}
+        assert batcher.take(later(30)) == {
+            rating_key(0): 1,
+            rating_key(1): 1,
+            rating_key(2): 1,
+        }
+        assert batcher.take(later(30)) == {}
+
+    def test_ignores_other_notifications(self):
+        batcher = EventBatcher(0)
+        batcher.handle(timeline(0, item_type=2))
+        # A picture uploaded to a photo library.
+        batcher.handle(timeline(3, item_type=13))
+        batcher.handle(timeline(1, state=9))
+        batcher.handle(timeline(2, identifier="com.plexapp.system"))
+        batcher.handle({"type": "playing", "PlaySessionStateNotification": []})
+        assert batcher.take(later()) == {}
+
+    def test_deleted_items_dropped(self):
+        batcher = EventBatcher(0)
+        batcher.handle(timeline(0, 1))
+        batcher.handle(timeline(1, state=9))
+        assert batcher.take(later()) == {rating_key(0): 1}
+
+    def test_waits_for_analysis_activities(self):
+        batcher = EventBatcher(0)
+        batcher.handle(activity("started"))
+        batcher.handle(activity("started", "butler.backup", "backup"))
+        batcher.handle(timeline(0))
+        assert batcher.take(later()) == {}
+        batcher.handle(activity("ended"))
+        assert batcher.take(later()) == {rating_key(0): 1}
+
+    def test_waits_for_item_analysis(self):
+        batcher = EventBatcher(0)
+        batcher.handle(timeline(0, mediaState="analyzing"))
+        batcher.handle(timeline(1))
+        assert batcher.take(later()) == {rating_key(1): 1}
+        batcher.handle(timeline(0))
+        assert batcher.take(later()) == {rating_key(0): 1}
+
+    def test_busy_server_does_not_delay_forever(self):
+        batcher = EventBatcher(0)
+        batcher.handle(activity("started", "library.update.section"))
+        batcher.handle(timeline(0))
+        assert batcher.take(later()) == {}
+        assert batcher.take(later(EVENT_MAX_WAIT_SECONDS)) == {rating_key(0): 1}
+        batcher.handle(timeline(1))
+        batcher.clear_activities()
+        assert batcher.take(later()) == {rating_key(1): 1}
+
+
+@pytest.fixture
+def fake_plex():
+    server = FakePlexServer([SyntheticSection(1, "movie", 20)]).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def watcher(fake_plex, default_config, logger, monkeypatch):
+    monkeypatch.setattr("previewmaid.EVENT_POLL_SECONDS", 0.01)
+    monkeypatch.setattr("previewmaid.EVENT_RECONNECT_SECONDS", 0)
+    default_config.plex_url = fake_plex.url
+    default_config.event_debounce_seconds = 0
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch_events, args=(default_config, logger, stop), daemon=True
+    )
+    thread.start()
+    wait_for(lambda: fake_plex.subscribers)
+    yield
+    stop.set()
+    thread.join(5)
+
+
+class TestWatchEvents:
+    def test_checks_only_notified_items(self, fake_plex, watcher, caplog):
+        fake_plex.notify(activity("started"))
+        fake_plex.notify(timeline(0, 1, 2))
+        time.sleep(0.1)
+        assert "Checking" not in caplog.text
+
+        fake_plex.notify(activity("ended"))
+        wait_for(lambda: "new or updated items in" in caplog.text)
+        assert "Checking 3 new or updated items" in caplog.text
+        assert (
+            f"Found 1 missing thumbnail previews in 3 new or updated items in {MOVIES}"
+            in caplog.text
+        )
+        assert fake_plex.listings == 0
+        assert "preview_maid_event_items_checked_total" in METRICS.render()
+
+    def test_reconnects(self, fake_plex, watcher, caplog):
+        fake_plex.close_notifications()
+        wait_for(lambda: fake_plex.subscribers)
+        assert "Lost the connection to Plex notifications" in caplog.text
+
+        fake_plex.notify(timeline(11))
+        wait_for(lambda: "new or updated items in" in caplog.text)
+        assert (
+            f"No missing thumbnail previews found in 1 new or updated items in {MOVIES}"
+            in caplog.text
+        )
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import httpx
+import pytest
+from benchmarks.fake_plex import FakePlexServer, SyntheticSection
+from conftest import make_movies_library, make_plex, make_setting
+from previewmaid import (
+    FEATURE_SCANS,
+    METRICS,
+    AsyncPlexClient,
+    create_session,
+    find_missing_metadata,
+    request_retry,
+    request_timeout,
+    scan_library,
+)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        status = 503 if self.server.requests <= self.server.failures else 200
+        body = b'{"MediaContainer": {"size": 0}}' if status == 200 else b""
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    server.requests = 0
+    server.failures = 2
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fail(**kwargs):
+    raise TimeoutError("Plex stopped responding")
+
+
+async def get_json(config, url):
+    client = AsyncPlexClient(config)
+    try:
+        return await client.get_json(url)
+    finally:
+        await client.close()
+
+
+class TestRequests:
+    def test_timeouts(self, default_config):
+        assert request_timeout(default_config) == (10, 60)
+        default_config.request_timeout = 5
+        assert request_timeout(default_config) == (5, 5)
+
+    def test_retry_policy(self, default_config):
+        retry = request_retry(default_config)
+        assert retry.total == 3
+        assert retry.backoff_jitter > 0
+        assert {429, 503} <= set(retry.status_forcelist)
+        assert retry.allowed_methods == frozenset(("GET",))
+
+    @pytest.mark.parametrize("latency_target", [0, 500])
+    def test_transient_errors_retried(
+        self, default_config, flaky_server, monkeypatch, latency_target
+    ):
+        monkeypatch.setattr("previewmaid.RETRY_BACKOFF_FACTOR", 0)
+        monkeypatch.setattr("previewmaid.RETRY_BACKOFF_JITTER", 0)
+        default_config.request_latency_target_ms = latency_target
+        session = create_session(default_config)
+        host, port = flaky_server.server_address[:2]
+        response = session.get(f"http://{host}:{port}/", timeout=5)
+        assert response.status_code == 200
+        assert flaky_server.requests == 3
+
+    def test_gives_up_after_retries(self, default_config, flaky_server, monkeypatch):
+        monkeypatch.setattr("previewmaid.RETRY_BACKOFF_FACTOR", 0)
+        default_config.request_retries = 1
+        session = create_session(default_config)
+        host, port = flaky_server.server_address[:2]
+        assert session.get(f"http://{host}:{port}/", timeout=5).status_code == 503
+        assert flaky_server.requests == 2
+
+    @pytest.mark.parametrize("latency_target", [0, 500])
+    def test_async_client_retries(
+        self, default_config, flaky_server, monkeypatch, latency_target
+    ):
+        monkeypatch.setattr("previewmaid.RETRY_BACKOFF_FACTOR", 0)
+        monkeypatch.setattr("previewmaid.RETRY_BACKOFF_JITTER", 0)
+        default_config.request_latency_target_ms = latency_target
+        host, port = flaky_server.server_address[:2]
+        url = f"http://{host}:{port}/"
+        retried = METRICS.responses["/", 503]
+        assert asyncio.run(get_json(default_config, url)) == {"size": 0}
+        assert flaky_server.requests == 3
+        assert METRICS.responses["/", 503] - retried == 2
+
+    def test_async_client_gives_up_after_retries(
+        self, default_config, flaky_server, monkeypatch
+    ):
+        monkeypatch.setattr("previewmaid.RETRY_BACKOFF_FACTOR", 0)
+        default_config.request_retries = 1
+        host, port = flaky_server.server_address[:2]
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(get_json(default_config, f"http://{host}:{port}/"))
+        assert flaky_server.requests == 2
+
+
+class TestIsolation:
+    @pytest.mark.parametrize("concurrency", [1, 2])
+    def test_failed_library_does_not_stop_run(
+        self, default_config, logger, caplog, concurrency
+    ):
+        default_config.scan_concurrency = concurrency
+        broken = make_movies_library("Broken")
+        broken.all = fail
+        broken.totalViewSize = fail
+        movies = make_movies_library()
+        with patch("previewmaid.PlexServer", return_value=make_plex(broken, movies)):
+            find_missing_metadata(default_config, logger)
+
+        assert "Failed to scan library Broken" in caplog.text
+        assert "Found 1 missing thumbnail previews in Movies" in caplog.text
+        assert "1 of 2 libraries could not be scanned" in caplog.text
+        assert METRICS.failed_libraries == {"Broken"}
+        assert "preview_maid_last_run_success 0" in METRICS.render()
+
+    @pytest.mark.parametrize("engine", ["sync", "async"])
+    def test_failed_section_does_not_stop_run(
+        self, default_config, logger, caplog, engine
+    ):
+        sections = [SyntheticSection(1, "movie", 20), SyntheticSection(2, "movie", 30)]
+        server = FakePlexServer(sections).start()
+        server.broken_sections.add(1)
+        default_config.plex_url = server.url
+        default_config.scan_engine = engine
+        default_config.scan_concurrency = 2
+        default_config.request_retries = 0
+        try:
+            find_missing_metadata(default_config, logger)
+        finally:
+            server.stop()
+
+        assert "Failed to scan library Synthetic movie 1" in caplog.text
+        assert "Found 3 missing thumbnail previews in Synthetic movie 2" in caplog.text
+        assert "1 of 2 libraries could not be scanned" in caplog.text
+        assert METRICS.failed_libraries == {"Synthetic movie 1"}
+
+    def test_failed_item_is_counted(self, default_config, logger, caplog):
+        lib = make_movies_library(missing=(0, 1))
+        broken_part = lib.all()[0].media[0].parts[0]
+        del broken_part.hasPreviewThumbnails
+        counts = scan_library(lib, default_config, FEATURE_SCANS[:1], logger)
+
+        assert counts == {"missing thumbnail previews": 1}
+        assert "Failed to check Movies 0" in caplog.text
+        assert "Could not check 1 items in Movies" in caplog.text
+        assert METRICS.libraries["Movies"].failed_items == 1
+
+    def test_failed_detail_batch_is_skipped(self, default_config, logger, caplog):
+        default_config.find_missing_intro_markers = True
+        lib = make_movies_library()
+        lib.settings = lambda: [make_setting("enableIntroMarkerGeneration", True)]
+        lib.fetchItems = lambda rating_keys, params=None: fail()
+        counts = scan_library(lib, default_config, FEATURE_SCANS[2:3], logger)
+
+        assert counts == {"missing intro markers": 0}
+        assert "Failed to fetch details of 3 items in Movies" in caplog.text
+        assert METRICS.libraries["Movies"].failed_items == 3
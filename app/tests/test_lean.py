@@ -0,0 +1,146 @@
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from urllib.parse import unquote
+
+from conftest import make_library, make_setting
+from previewmaid import (
+    FEATURE_SCANS,
+    LeanSection,
+    fetch_details,
+    item_record,
+    plan_requests,
+    scan_library,
+)
+
+EPISODE = {
+    "ratingKey": "12",
+    "type": "episode",
+    "title": "Pilot",
+    "index": 1,
+    "parentIndex": 1,
+    "grandparentTitle": "Show",
+    "updatedAt": 1704067200,
+    "Media": [
+        {
+            "videoResolution": "1080",
+            "hasVoiceActivity": True,
+            "Part": [{"file": "/tv/pilot.mkv", "indexes": "sd"}],
+        }
+    ],
+}
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.urls.append(unquote(url))
+        self.headers = headers
+        container = self.responses.pop(0)
+        return SimpleNamespace(
+            raise_for_status=lambda: None,
+            json=lambda: {"MediaContainer": container},
+        )
+
+
+def make_lean_section(default_config, responses, requests=None):
+    section = make_library(
+        "TV",
+        "show",
+        [],
+        settings=[
+            make_setting("enableBIFGeneration", True),
+            make_setting("enableIntroMarkerGeneration", True),
+        ],
+    )
+    section.key = "2"
+    session = FakeSession(responses)
+    return LeanSection(section, default_config, session, requests), session
+
+
+class TestItemRecord:
+    def test_decodes_checked_fields(self):
+        item = item_record(EPISODE)
+        assert (item.ratingKey, item.type, item.grandparentTitle) == (
+            12,
+            "episode",
+            "Show",
+        )
+        assert item.media[0].hasVoiceActivity is True
+        assert item.media[0].parts[0].hasPreviewThumbnails is True
+        assert item.markers == []
+        assert item.updatedAt == datetime(2024, 1, 1, tzinfo=UTC)
+
+    def test_missing_attributes(self):
+        item = item_record(
+            {
+                "ratingKey": "1",
+                "type": "movie",
+                "title": "Movie",
+                "Media": [{"Part": [{"file": "/movie.mkv"}]}],
+                "Marker": [{"type": "credits"}],
+            }
+        )
+        assert item.media[0].hasVoiceActivity is False
+        assert item.media[0].parts[0].hasPreviewThumbnails is False
+        assert [marker.type for marker in item.markers] == ["credits"]
+        assert item.updatedAt is None
+
+
+class TestLeanSection:
+    def test_requests_json_without_tags(self, default_config):
+        section, session = make_lean_section(default_config, [{"Metadata": []}])
+        section.all(libtype="episode", container_start=200, container_size=100)
+        (url,) = session.urls
+        assert url.startswith("http://localhost:32400/library/sections/2/all?")
+        assert "type=4" in url
+        assert "X-Plex-Container-Start=200" in url
+        assert "X-Plex-Container-Size=100" in url
+        assert "excludeElements=" in url and "Genre" in url
+        assert session.headers["Accept"] == "application/json"
+
+    def test_excludes_media_unused_by_checks(self, default_config):
+        requests = plan_requests(FEATURE_SCANS[2:3])
+        section, session = make_lean_section(
+            default_config, [{"Metadata": []}], requests
+        )
+        section.all(libtype="episode")
+        assert "Media" in section.excluded_elements.split(",")
+        assert "Marker" not in section.excluded_elements.split(",")
+        assert section.excluded_elements in session.urls[0]
+
+    def test_keeps_media_read_by_checks(self, default_config):
+        requests = plan_requests(FEATURE_SCANS[:1])
+        section, _ = make_lean_section(default_config, [], requests)
+        excluded = section.excluded_elements.split(",")
+        assert "Media" not in excluded and "Part" not in excluded
+        assert "Genre" in excluded
+
+    def test_date_filter(self, default_config):
+        section, session = make_lean_section(default_config, [{"Metadata": []}])
+        since = datetime(2024, 1, 1, tzinfo=UTC)
+        section.all(libtype="episode", filters={"updatedAt>>": since})
+        assert "updatedAt>>=1704067200" in session.urls[0]
+
+    def test_fetch_markers(self, default_config):
+        marked = {**EPISODE, "Marker": [{"type": "intro"}]}
+        section, session = make_lean_section(default_config, [{"Metadata": [marked]}])
+        items = fetch_details(section, [12, 13], {"includeMarkers": 1})
+        assert "/library/metadata/12,13?" in session.urls[0]
+        assert "includeMarkers=1" in session.urls[0]
+        assert [marker.type for marker in items[12].markers] == ["intro"]
+
+    def test_total_view_size(self, default_config):
+        section, _ = make_lean_section(default_config, [{"totalSize": 42}])
+        assert section.totalViewSize(libtype="episode") == 42
+
+    def test_scan_matches_plexapi(self, default_config, logger):
+        responses = [{"Metadata": [EPISODE]}, {"Metadata": [EPISODE]}]
+        section, _ = make_lean_section(default_config, responses)
+        features = [FEATURE_SCANS[0], FEATURE_SCANS[2]]
+        assert scan_library(section, default_config, features, logger) == {
+            "missing thumbnail previews": 0,
+            "missing intro markers": 1,
+        }
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+import requests
+from conftest import make_library, make_media, make_movie, make_part, make_setting
+from previewmaid import (
+    FEATURE_SCANS,
+    METRICS,
+    LibraryMetrics,
+    ScanMetrics,
+    format_labels,
+    request_endpoint,
+    scan_library,
+    start_metrics_server,
+    write_metrics_textfile,
+)
+
+
+def make_response(url, seconds, size, status_code=200):
+    return SimpleNamespace(
+        url=url,
+        elapsed=timedelta(seconds=seconds),
+        content=b"x" * size,
+        status_code=status_code,
+    )
+
+
+@pytest.fixture
+def metrics():
+    METRICS.start_run()
+    return METRICS
+
+
+class TestFormatting:
+    def test_request_endpoint(self):
+        assert (
+            request_endpoint(
+                "http://plex:32400/library/metadata/12,13?includeMarkers=1"
+            )
+            == "/library/metadata/{id}"
+        )
+        assert (
+            request_endpoint("http://plex:32400/library/sections/2/all?type=4")
+            == "/library/sections/{id}/all"
+        )
+
+    def test_format_labels(self):
+        assert format_labels({}) == ""
+        assert format_labels({"library": 'My "TV"\n'}) == r'{library="My \"TV\"\n"}'
+
+
+class TestScanMetrics:
+    def test_request_histogram(self):
+        metrics = ScanMetrics()
+        url = "http://plex:32400/library/sections/1/all"
+        metrics.observe_response(make_response(url, 0.2, 100))
+        metrics.observe_response(make_response(url, 90, 50, 500))
+        text = metrics.render()
+
+        endpoint = 'endpoint="/library/sections/{id}/all"'
+        assert f'preview_maid_plex_requests_total{{{endpoint},code="200"}} 1' in text
+        assert f'preview_maid_plex_requests_total{{{endpoint},code="500"}} 1' in text
+        bucket = "preview_maid_plex_request_duration_seconds_bucket"
+        assert f'{bucket}{{{endpoint},le="0.1"}} 0' in text
+        assert f'{bucket}{{{endpoint},le="0.25"}} 1' in text
+        assert f'{bucket}{{{endpoint},le="60.0"}} 1' in text
+        assert f'{bucket}{{{endpoint},le="+Inf"}} 2' in text
+        assert (
+            f"preview_maid_plex_request_duration_seconds_count{{{endpoint}}} 2" in text
+        )
+        assert f"preview_maid_plex_response_bytes_total{{{endpoint}}} 150" in text
+
+    def test_last_run(self):
+        metrics = ScanMetrics()
+        assert "preview_maid_last_run" not in metrics.render()
+        metrics.finish_run(12.5, False)
+        text = metrics.render()
+        assert "preview_maid_last_run_duration_seconds 12.5" in text
+        assert "preview_maid_last_run_success 0" in text
+
+    def test_library_scan_recorded(self, default_config, logger, metrics):
+        movies = [
+            make_movie(title, [make_media(parts=[make_part(f"/{title}.mkv", has)])])
+            for title, has in (("A", True), ("B", False))
+        ]
+        lib = make_library(
+            "Metric Movies",
+            "movie",
+            movies,
+            settings=[make_setting("enableBIFGeneration", True)],
+        )
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger)
+
+        recorded = metrics.libraries["Metric Movies"]
+        assert recorded.items == 2
+        assert recorded.missing == {"missing thumbnail previews": 1}
+        assert list(recorded.check_seconds) == ["missing thumbnail previews"]
+        text = metrics.render()
+        assert 'preview_maid_library_items_scanned{library="Metric Movies"} 2' in text
+        assert 'preview_maid_library_items_failed{library="Metric Movies"} 0' in text
+        assert (
+            'preview_maid_missing_items{library="Metric Movies",'
+            'feature="missing thumbnail previews"} 1'
+        ) in text
+
+    def test_runs_replace_library_gauges(self, metrics):
+        metrics.record_library("Old", LibraryMetrics(1.0, 1, {}, {}))
+        metrics.start_run()
+        assert 'library="Old"' not in metrics.render()
+
+
+class TestExposition:
+    def test_metrics_endpoint(self, logger, metrics):
+        server = start_metrics_server(0, logger)
+        try:
+            base = f"http://127.0.0.1:{server.server_address[1]}"
+            response = requests.get(f"{base}/metrics", timeout=5)
+            assert response.status_code == 200
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "# TYPE preview_maid_missing_items gauge" in response.text
+            assert requests.get(f"{base}/other", timeout=5).status_code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_textfile(self, logger, tmp_path):
+        path = tmp_path / "preview_maid.prom"
+        write_metrics_textfile(str(path), logger)
+        assert "# TYPE preview_maid_plex_requests_total counter" in path.read_text()
+        assert not (tmp_path / "preview_maid.prom.tmp").exists()
+
+    def test_textfile_missing_directory(self, logger, tmp_path, caplog):
+        write_metrics_textfile(str(tmp_path / "missing" / "preview_maid.prom"), logger)
+        assert "Could not write metrics" in caplog.text
@@ -0,0 +1,110 @@
+import io
+import logging
+from unittest.mock import patch
+
+from conftest import make_movies_library, make_plex
+from previewmaid import PROFILE, PhaseTimings, TimedHandler, find_missing_metadata
+
+
+class TestPhaseTimings:
+    def test_tree(self):
+        timings = PhaseTimings()
+        timings.start_run(True)
+        timings.add(("scan", "TV", "list items"), 2.0)
+        timings.add(("scan", "TV", "list items"), 1.0)
+        timings.add(("scan", "TV", "evaluate checks", "missing intro markers"), 0.5)
+        timings.add(("scan",), 4.0)
+        timings.add(("connect",), 0.25)
+        assert timings.tree_lines() == [
+            "connect: 0.250s",
+            "scan: 4.000s",
+            "  TV: 3.500s",
+            "    list items: 3.000s (2 calls)",
+            "    evaluate checks: 0.500s",
+            "      missing intro markers: 0.500s",
+        ]
+
+    def test_disabled(self):
+        timings = PhaseTimings()
+        timings.start_run(False)
+        with timings.timed("connect"):
+            pass
+        assert timings.tree_lines() == []
+
+    def test_timed_handler_keeps_filters(self):
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.addFilter(lambda record: record.levelno != logging.WARNING)
+        timed = TimedHandler(handler)
+        timed.handle(logging.makeLogRecord({"msg": "shown", "levelno": logging.INFO}))
+        timed.handle(
+            logging.makeLogRecord({"msg": "hidden", "levelno": logging.WARNING})
+        )
+        assert stream.getvalue() == "shown\n"
+
+
+class TestProfileRun:
+    def test_logs_timing_tree(self, default_config, logger, caplog):
+        default_config.profile = True
+        handler = logging.StreamHandler(io.StringIO())
+        logger.addHandler(handler)
+        with (
+            caplog.at_level(logging.INFO, logger="test_preview_maid"),
+            patch(
+                "previewmaid.PlexServer",
+                return_value=make_plex(make_movies_library(count=1)),
+            ),
+        ):
+            find_missing_metadata(default_config, logger)
+
+        assert logger.handlers == [handler]
+        messages = [record.getMessage() for record in caplog.records]
+        start = messages.index("Run timings:")
+        phases = [line.split(":")[0] for line in messages[start + 1 :]]
+        assert phases == [
+            "  connect",
+            "  list sections",
+            "  fetch settings",
+            "    Movies",
+            "  scan",
+            "    Movies",
+            "      list items",
+            "      evaluate checks",
+            "        missing thumbnail previews",
+            "  log",
+        ]
+
+    def test_times_handlers_of_parent_logger(self, default_config, logger):
+        # Named servers log through a child logger with no handlers of its own.
+        default_config.profile = True
+        handler = logging.StreamHandler(io.StringIO())
+        logger.addHandler(handler)
+        with patch(
+            "previewmaid.PlexServer",
+            return_value=make_plex(make_movies_library(count=1)),
+        ):
+            find_missing_metadata(default_config, logger.getChild("cabin"))
+        assert logger.handlers == [handler]
+        assert any(line.startswith("log:") for line in PROFILE.tree_lines())
+
+    def test_disabled_by_default(self, default_config, logger, caplog):
+        with patch(
+            "previewmaid.PlexServer",
+            return_value=make_plex(make_movies_library(count=1)),
+        ):
+            find_missing_metadata(default_config, logger)
+        assert "Run timings:" not in caplog.text
+        assert PROFILE.tree_lines() == []
+
+    def test_dumps_profile(self, default_config, logger, tmp_path):
+        default_config.profile = True
+        default_config.profile_dump = True
+        default_config.log_directory = str(tmp_path)
+        with patch(
+            "previewmaid.PlexServer",
+            return_value=make_plex(make_movies_library(count=1)),
+        ):
+            find_missing_metadata(default_config, logger)
+        (summary,) = tmp_path.glob("preview_maid-*.txt")
+        assert "cumulative" in summary.read_text()
+        assert len(list(tmp_path.glob("preview_maid-*.prof"))) == 1
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+from benchmarks.fake_plex import FakePlexServer, SyntheticSection
+from previewmaid import (
+    MIN_REQUEST_LIMIT,
+    AdaptiveAdapter,
+    AdaptiveLimiter,
+    AsyncAdaptiveLimiter,
+    AsyncPlexClient,
+    create_session,
+)
+from requests.adapters import HTTPAdapter
+
+
+def send_fast(limiter, count):
+    for _ in range(count):
+        limiter.release(limiter.acquire())
+
+
+class TestAdaptiveLimiter:
+    def test_grows_to_max(self):
+        limiter = AdaptiveLimiter(4, latency_target=1.0)
+        send_fast(limiter, 3)
+        assert 2 < limiter.limit < 3
+        send_fast(limiter, 20)
+        assert limiter.limit == 4
+
+    def test_backs_off_once_per_round_trip(self):
+        limiter = AdaptiveLimiter(4, latency_target=1.0)
+        limiter.limit = 4.0
+        first, second = limiter.acquire(), limiter.acquire()
+        limiter.release(first, congested=True)
+        assert limiter.limit == 2.0
+        # Sent before the back-off, so it says nothing about the new limit.
+        limiter.release(second, congested=True)
+        assert limiter.limit == 2.0
+        limiter.release(limiter.acquire(), congested=True)
+        assert limiter.limit == 1.0
+
+    def test_slow_response_backs_off(self):
+        limiter = AdaptiveLimiter(4, latency_target=0.5)
+        limiter.limit = 4.0
+        started = limiter.acquire()
+        limiter.release(started - 1.0)
+        assert limiter.limit == 2.0
+
+    def test_paces_requests_below_one(self):
+        limiter = AdaptiveLimiter(1, latency_target=1.0)
+        started = limiter.acquire()
+        limiter.release(started - 0.05, congested=True)
+        assert limiter.limit == 0.5
+        waited_from = time.monotonic()
+        limiter.release(limiter.acquire())
+        assert time.monotonic() - waited_from >= 0.04
+        # A good response doubles the limit back towards one.
+        assert limiter.limit == 1.0
+
+    def test_floor(self):
+        limiter = AdaptiveLimiter(1, latency_target=1.0)
+        for _ in range(10):
+            limiter.next_start = 0.0
+            limiter.release(limiter.acquire(), congested=True)
+        assert limiter.limit == MIN_REQUEST_LIMIT
+
+    def test_async_waits_for_release(self):
+        async def run():
+            limiter = AsyncAdaptiveLimiter(2, latency_target=1.0)
+            first = await limiter.acquire_async()
+            second = asyncio.create_task(limiter.acquire_async())
+            await asyncio.sleep(0.01)
+            assert not second.done()
+            await limiter.release_async(first)
+            await limiter.release_async(await second)
+            return limiter
+
+        limiter = asyncio.run(run())
+        assert limiter.in_flight == 0
+        assert limiter.limit == 2
+
+
+class TestAdaptiveSession:
+    def test_disabled_by_default(self, default_config):
+        session = create_session(default_config)
+        adapter = session.get_adapter("http://plex:32400")
+        assert type(adapter) is HTTPAdapter
+
+    def test_backs_off_from_slow_server(self, default_config):
+        server = FakePlexServer([SyntheticSection(1, "movie", 10)], latency=0.02)
+        server.start()
+        default_config.scan_concurrency = 4
+        default_config.request_latency_target_ms = 5
+        try:
+            session = create_session(default_config)
+            adapter = session.get_adapter(server.url)
+            assert isinstance(adapter, AdaptiveAdapter)
+            for _ in range(3):
+                session.get(f"{server.url}/library/sections", timeout=5)
+            assert adapter.limiter.limit < 1
+            assert adapter.limiter.in_flight == 0
+        finally:
+            server.stop()
+
+    def test_grows_on_fast_server(self, default_config):
+        server = FakePlexServer([SyntheticSection(1, "movie", 10)]).start()
+        default_config.scan_concurrency = 4
+        default_config.request_latency_target_ms = 5000
+        try:
+            session = create_session(default_config)
+            for _ in range(10):
+                session.get(f"{server.url}/library/sections", timeout=5)
+            assert session.get_adapter(server.url).limiter.limit == 4
+        finally:
+            server.stop()
+
+    def test_async_client_backs_off_from_slow_server(self, default_config):
+        server = FakePlexServer([SyntheticSection(1, "movie", 10)], latency=0.02)
+        server.start()
+        default_config.scan_concurrency = 4
+        default_config.request_latency_target_ms = 5
+
+        async def run():
+            client = AsyncPlexClient(default_config)
+            try:
+                for _ in range(3):
+                    await client.get_json(f"{server.url}/library/sections")
+            finally:
+                await client.close()
+            return client.limiter
+
+        try:
+            limiter = asyncio.run(run())
+        finally:
+            server.stop()
+        assert limiter.limit < 1
+        assert limiter.in_flight == 0
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import pytest
+from conftest import (
+    make_library,
+    make_media,
+    make_movie,
+    make_part,
+    make_setting,
+    wait_for,
+)
+from previewmaid import (
+    FEATURE_SCANS,
+    METRICS,
+    REMEDIATION_RETRY_SECONDS,
+    RemediationQueue,
+    scan_library,
+)
+
+THUMBNAILS = "missing thumbnail previews"
+INTROS = "missing intro markers"
+
+
+@pytest.fixture
+def queue():
+    queue = RemediationQueue()
+    queue.active = True
+    return queue
+
+
+def make_plex(*loads):
+    """A Plex server whose activity list has each of ``loads`` analysis jobs in turn."""
+    plex = MagicMock()
+    loads = list(loads)
+    type(plex).activities = PropertyMock(
+        side_effect=lambda: [
+            SimpleNamespace(type="media.generate.bif")
+            for _ in range(loads.pop(0) if loads else 0)
+        ]
+    )
+    return plex
+
+
+def analyzed_keys(plex):
+    return [call.args[0].split("/")[3] for call in plex.query.call_args_list]
+
+
+class TestRemediationQueue:
+    def test_inactive_queue_ignores_items(self):
+        queue = RemediationQueue()
+        queue.add(1, "Movies", "Movie 1", [THUMBNAILS])
+        assert queue.pop() is None
+
+    def test_deduplicates_and_prioritises(self, queue):
+        queue.add(1, "Movies", "Movie 1", [THUMBNAILS])
+        queue.add(2, "Movies", "Movie 2", [THUMBNAILS])
+        queue.add(2, "Movies", "Movie 2", [INTROS])
+        queue.add(1, "Movies", "Movie 1", [THUMBNAILS])
+        assert len(queue.items) == 2
+
+        first = queue.pop()
+        assert (first.rating_key, first.features) == (2, {THUMBNAILS, INTROS})
+        assert queue.pop().rating_key == 1
+        assert queue.pop() is None
+
+    def test_recently_sent_items_not_queued_again(self, queue):
+        queue.mark_sent(1, time.monotonic())
+        queue.add(1, "Movies", "Movie 1", [THUMBNAILS])
+        assert queue.pop() is None
+        queue.mark_sent(2, time.monotonic() - REMEDIATION_RETRY_SECONDS)
+        queue.add(2, "Movies", "Movie 2", [THUMBNAILS])
+        assert queue.pop().rating_key == 2
+
+    def test_hourly_budget(self, queue):
+        now = time.monotonic()
+        queue.budget.extend([now - 3590, now - 2000])
+        assert queue.budget_wait(now, 3) == 0
+        assert queue.budget_wait(now, 2) == pytest.approx(10)
+        assert queue.budget_wait(now + 10, 2) == 0
+
+    def test_requests_spread_over_the_hour(self, queue):
+        now = time.monotonic()
+        assert queue.budget_wait(now, 4) == 0
+        queue.budget.append(now - 100)
+        assert queue.budget_wait(now, 4) == pytest.approx(800)
+        assert queue.recent_sends(now) == 0
+        queue.budget.append(now - 10)
+        assert queue.recent_sends(now) == 1
+
+    def test_failed_analyze_is_not_counted(self, logger, queue):
+        queue.add(1, "Movies", "Movie 1", [THUMBNAILS])
+        plex = MagicMock()
+        plex.query.side_effect = TimeoutError("Plex stopped responding")
+        assert not queue.analyze(plex, MagicMock(), queue.pop(), logger)
+        assert (queue.budget, queue.sent, queue.analyzed) == (deque(), {}, 0)
+        queue.add(1, "Movies", "Movie 1", [THUMBNAILS])
+        assert queue.pop().rating_key == 1
+
+    def test_scan_queues_items_missing_data(self, default_config, logger, queue):
+        movies = [
+            make_movie(f"Movie {n}", [make_media(parts=[make_part(f"/{n}.mkv", n)])])
+            for n in range(3)
+        ]
+        lib = make_library(
+            "Movies",
+            "movie",
+            movies,
+            settings=[make_setting("enableBIFGeneration", True)],
+        )
+        with patch("previewmaid.REMEDIATION", queue):
+            scan_library(lib, default_config, FEATURE_SCANS[:1], logger)
+        item = queue.pop()
+        assert (item.rating_key, item.subject) == (movies[0].ratingKey, "Movie 0")
+        assert queue.pop() is None
+
+
+class TestRemediationWorker:
+    def test_throttled_by_load_and_budget(
+        self, default_config, logger, queue, caplog, monkeypatch
+    ):
+        monkeypatch.setattr("previewmaid.REMEDIATION_POLL_SECONDS", 0.01)
+        default_config.remediation_hourly_budget = 2
+        plex = make_plex(1, 1)
+        queue.add(1, "Movies", "Movie 1", [THUMBNAILS])
+        queue.add(2, "Movies", "Movie 2", [THUMBNAILS, INTROS])
+        queue.add(3, "Movies", "Movie 3", [THUMBNAILS])
+
+        stop = threading.Event()
+        with patch("previewmaid.connect_plex", return_value=plex):
+            worker = threading.Thread(
+                target=queue.run, args=(default_config, logger, stop)
+            )
+            worker.start()
+            wait_for(lambda: "for the analyze budget" in caplog.text)
+            stop.set()
+            worker.join(5)
+
+        assert "Plex is running 1 analysis activities, waiting" in caplog.text
+        assert analyzed_keys(plex) == ["2"]
+        assert queue.pop().rating_key == 1
+        assert "preview_maid_remediation_analyze_requests_total 1" in METRICS.render()
+
+    def test_recent_sends_count_as_load(
+        self, default_config, logger, queue, caplog, monkeypatch
+    ):
+        monkeypatch.setattr("previewmaid.REMEDIATION_POLL_SECONDS", 0.01)
+        monkeypatch.setattr("previewmaid.BUDGET_WINDOW_SECONDS", 5.0)
+        default_config.remediation_hourly_budget = 5000
+        # Plex never lists the analyses it was sent.
+        plex = make_plex()
+        queue.add(1, "Movies", "Movie 1", [THUMBNAILS])
+        queue.add(2, "Movies", "Movie 2", [THUMBNAILS])
+
+        stop = threading.Event()
+        with patch("previewmaid.connect_plex", return_value=plex):
+            worker = threading.Thread(
+                target=queue.run, args=(default_config, logger, stop)
+            )
+            worker.start()
+            wait_for(lambda: "Plex is running 1 analysis" in caplog.text)
+            stop.set()
+            worker.join(5)
+
+        assert analyzed_keys(plex) == ["1"]
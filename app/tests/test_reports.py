@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+
+import pytest
+from conftest import make_media, make_movie, make_movies_library
+from previewmaid import (
+    FEATURE_SCANS,
+    Finding,
+    ReportWriter,
+    check_missing_marker_metadata,
+    check_missing_voice_activity_metadata,
+    open_report_writer,
+    scan_library,
+)
+
+
+def reported_library():
+    return make_movies_library(
+        count=1,
+        settings=("enableBIFGeneration", "enableVoiceActivityGeneration"),
+        has_voice_activity=False,
+        video_resolution="4k",
+    )
+
+
+class TestFinding:
+    def test_slotted(self):
+        finding = Finding(1, "Movies", "missing ad markers", "Movie", None)
+        with pytest.raises(AttributeError):
+            finding.extra = True
+        assert finding.as_row() == (1, "Movies", "missing ad markers", "Movie", None)
+
+
+class TestCheckReporting:
+    def test_voice_activity(self, logger):
+        reported = []
+        medias = [make_media(has_voice_activity=False, video_resolution="720")]
+        count = check_missing_voice_activity_metadata(
+            medias, "Movie", logger, lambda *finding: reported.append(finding)
+        )
+        assert count == 1
+        assert reported == [("Movie", "720")]
+
+    def test_markers(self, logger):
+        reported = []
+        movie = make_movie("Movie", [], markers=[])
+        check_missing_marker_metadata(
+            movie, "Movie", "intro", logger, lambda *finding: reported.append(finding)
+        )
+        assert reported == [("Movie", None)]
+
+
+class TestReportWriter:
+    def test_streams_findings_and_summary(self, default_config, logger):
+        jsonl, csv_file = io.StringIO(), io.StringIO()
+        report = ReportWriter(jsonl, csv_file)
+        lib = reported_library()
+        (movie,) = lib.all()
+        scan_library(lib, default_config, FEATURE_SCANS[:2], logger, report=report)
+
+        assert [json.loads(line) for line in jsonl.getvalue().splitlines()] == [
+            {
+                "rating_key": movie.ratingKey,
+                "library": "Movies",
+                "feature": "missing thumbnail previews",
+                "subject": "/0.mkv",
+                "resolution": "4k",
+            },
+            {
+                "rating_key": movie.ratingKey,
+                "library": "Movies",
+                "feature": "missing voice activity data",
+                "subject": "Movies 0",
+                "resolution": "4k",
+            },
+        ]
+        rows = list(csv.reader(io.StringIO(csv_file.getvalue())))
+        assert rows[0] == ["rating_key", "library", "feature", "subject", "resolution"]
+        assert len(rows) == 3
+        assert report.summary == {
+            "Movies": {
+                "missing thumbnail previews": 1,
+                "missing voice activity data": 1,
+            }
+        }
+
+
+class TestOpenReportWriter:
+    def test_disabled(self, default_config, logger):
+        with open_report_writer(default_config, logger) as report:
+            assert report is None
+
+    def test_missing_directory(self, default_config, logger, tmp_path):
+        default_config.write_reports = True
+        default_config.report_directory = str(tmp_path / "nonexistent")
+        with open_report_writer(default_config, logger) as report:
+            assert report is None
+
+    def test_writes_reports(self, default_config, logger, tmp_path):
+        default_config.write_reports = True
+        default_config.report_directory = str(tmp_path)
+        lib = reported_library()
+        with open_report_writer(default_config, logger) as report:
+            scan_library(lib, default_config, FEATURE_SCANS[:1], logger, report=report)
+
+        (summary,) = tmp_path.glob("preview_maid-*.summary.json")
+        assert json.loads(summary.read_text()) == {
+            "Movies": {"missing thumbnail previews": 1}
+        }
+        (jsonl,) = tmp_path.glob("preview_maid-*.jsonl")
+        assert len(jsonl.read_text().splitlines()) == 1
+        (csv_report,) = tmp_path.glob("preview_maid-*.csv")
+        assert len(csv_report.read_text().splitlines()) == 2
@@ -1,5 +1,9 @@
 import logging
+import sys
+import time
 
+import pytest
+from benchmarks.fake_plex import FakePlexServer, SyntheticSection
 from conftest import (
     make_album,
     make_clip,
@@ -13,76 +17,93 @@ from conftest import (
     make_show,
 )
 from previewmaid import (
+    FEATURE_SCANS,
+    MARKER_BATCH_SIZE,
+    STOPPING,
+    OrderedLog,
+    ScanStopped,
     check_missing_marker_metadata,
     check_missing_preview_thumbnails_metadata,
     check_missing_voice_activity_metadata,
+    deferred_logger,
+    fetch_details,
     find_missing_marker_metadata,
     find_missing_preview_thumbnails,
     find_missing_voice_activity_data,
-    is_library_setting_enabled,
+    iter_section,
+    plan_libraries,
+    plan_library,
+    plan_requests,
     process_photos,
-    should_skip_library,
+    run_scan,
+    scan_libraries,
+    scan_library,
 )
 
 
-class TestIsLibrarySettingEnabled:
-    def test_setting_enabled(self):
-        lib = make_library(
-            "Movies", "movie", [], settings=[make_setting("enableBIFGeneration", True)]
-        )
-        assert is_library_setting_enabled(lib, "enableBIFGeneration") is True
+class TestPlanLibrary:
+    def make_counted_library(self, *settings):
+        lib = make_library("Movies", "movie", [], settings=list(settings))
+        lib.settings_requests = 0
+        settings_list = lib.settings
 
-    def test_setting_disabled(self):
-        lib = make_library(
-            "Movies", "movie", [], settings=[make_setting("enableBIFGeneration", False)]
-        )
-        assert is_library_setting_enabled(lib, "enableBIFGeneration") is False
-
-    def test_setting_not_found(self):
-        lib = make_library(
-            "Movies", "movie", [], settings=[make_setting("otherSetting", True)]
-        )
-        assert is_library_setting_enabled(lib, "enableBIFGeneration") is False
+        def counted_settings():
+            lib.settings_requests += 1
+            return settings_list()
 
+        lib.settings = counted_settings
+        return lib
 
-class TestShouldSkipLibrary:
-    def test_skip_by_type(self, default_config, logger):
-        default_config.skip_library_types = ["movie"]
-        lib = make_library(
-            "Movies", "movie", [], settings=[make_setting("enableBIFGeneration", True)]
-        )
-        assert (
-            should_skip_library(lib, default_config, "enableBIFGeneration", logger)
-            is True
+    def test_settings_fetched_once(self, default_config, logger):
+        lib = self.make_counted_library(
+            make_setting("enableBIFGeneration", True),
+            make_setting("enableIntroMarkerGeneration", False),
         )
+        plan = plan_library(lib, default_config, FEATURE_SCANS, logger)
+        assert lib.settings_requests == 1
+        assert [f.label for f in plan.features] == ["missing thumbnail previews"]
 
-    def test_skip_by_name(self, default_config, logger):
-        default_config.skip_library_names = ["Movies"]
-        lib = make_library(
+    def test_excluded_library_skips_settings(self, default_config, logger, caplog):
+        default_config.skip_library_types = ["movie"]
+        lib = self.make_counted_library(make_setting("enableBIFGeneration", True))
+        with caplog.at_level(logging.INFO, logger="test_preview_maid"):
+            plan = plan_library(lib, default_config, FEATURE_SCANS, logger)
+        assert plan.features == []
+        assert lib.settings_requests == 0
+        assert len(caplog.records) == 1
+
+    @pytest.mark.parametrize(
+        ("skip_library_names", "settings", "reason"),
+        [
+            (
+                ["Movies"],
+                [make_setting("enableBIFGeneration", True)],
+                "SKIP_LIBRARY_NAMES",
+            ),
+            ([], [make_setting("enableBIFGeneration", False)], "is disabled"),
+            ([], [make_setting("otherSetting", True)], "is disabled"),
+        ],
+    )
+    def test_skip_rules(
+        self, default_config, logger, caplog, skip_library_names, settings, reason
+    ):
+        default_config.skip_library_names = skip_library_names
+        lib = make_library("Movies", "movie", [], settings=settings)
+        plan = plan_library(lib, default_config, FEATURE_SCANS[:1], logger)
+        assert plan.features == []
+        assert reason in caplog.text
+
+    def test_plan_libraries_drops_idle_libraries(self, default_config, logger):
+        enabled = make_library(
             "Movies", "movie", [], settings=[make_setting("enableBIFGeneration", True)]
         )
-        assert (
-            should_skip_library(lib, default_config, "enableBIFGeneration", logger)
-            is True
-        )
-
-    def test_skip_by_setting_disabled(self, default_config, logger):
-        lib = make_library(
-            "Movies", "movie", [], settings=[make_setting("enableBIFGeneration", False)]
-        )
-        assert (
-            should_skip_library(lib, default_config, "enableBIFGeneration", logger)
-            is True
+        disabled = make_library(
+            "Home", "movie", [], settings=[make_setting("enableBIFGeneration", False)]
         )
-
-    def test_no_skip(self, default_config, logger):
-        lib = make_library(
-            "Movies", "movie", [], settings=[make_setting("enableBIFGeneration", True)]
-        )
-        assert (
-            should_skip_library(lib, default_config, "enableBIFGeneration", logger)
-            is False
+        plans = plan_libraries(
+            [disabled, enabled], default_config, FEATURE_SCANS, logger
         )
+        assert [plan.library for plan in plans] == [enabled]
 
 
 class TestCheckMissingPreviewThumbnails:
@@ -153,6 +174,47 @@ class TestCheckMissingMarkerMetadata:
         assert check_missing_marker_metadata(movie, "Test", "credits", logger) == 0
 
 
+class TestFetchDetails:
+    def test_fetches_keys_in_one_request(self):
+        movies = [make_movie(f"Movie {n}", []) for n in range(3)]
+        lib = make_library("Movies", "movie", movies)
+        calls = []
+        fetch_items = lib.fetchItems
+        lib.fetchItems = lambda keys, params=None: (
+            calls.append((keys, params)) or fetch_items(keys, params)
+        )
+        keys = [movie.ratingKey for movie in movies]
+        marked = fetch_details(lib, keys, {"includeMarkers": 1})
+        assert calls == [(keys, {"includeMarkers": 1})]
+        assert list(marked) == keys
+        assert all(movie._autoReload is False for movie in movies)
+
+    def test_no_request_without_keys(self):
+        lib = make_library("Movies", "movie", [])
+        lib.fetchItems = lambda *args, **kwargs: pytest.fail("unexpected request")
+        assert fetch_details(lib, [], {"includeMarkers": 1}) == {}
+
+
+class TestPlanRequests:
+    def test_marker_checks_share_one_detail_request(self):
+        plan = plan_requests(FEATURE_SCANS)
+        assert plan.detail_params == {"includeMarkers": 1}
+        assert plan.detail_item_types == {"episode", "movie"}
+        assert plan.elements == {"Media", "Part", "Marker"}
+
+    def test_listing_only_checks_need_no_detail(self):
+        plan = plan_requests(FEATURE_SCANS[:2])
+        assert plan.detail_params == {}
+        assert plan.detail_item_types == frozenset()
+
+    def test_new_check_reuses_detail_request(self):
+        loudness = FEATURE_SCANS[2]._replace(
+            label="missing loudness", elements=("Media", "Marker")
+        )
+        plan = plan_requests([FEATURE_SCANS[2], loudness])
+        assert plan.detail_params == plan_requests(FEATURE_SCANS[2:3]).detail_params
+
+
 class TestProcessPhotos:
     def test_empty_album(self, logger):
         album = make_album()
@@ -176,6 +238,50 @@ class TestProcessPhotos:
         outer_album = make_album(sub_albums=[inner_album], clips=[outer_clip])
         assert process_photos(outer_album, logger) == 2
 
+    def test_deeply_nested_albums(self, logger):
+        album = make_album(
+            clips=[make_clip([make_media(parts=[make_part("/deep.jpg", False)])])]
+        )
+        for _ in range(sys.getrecursionlimit() + 100):
+            album = make_album(sub_albums=[album])
+        assert process_photos(album, logger) == 1
+
+
+class TestPhotoSections:
+    def make_photo_library(self):
+        inner = make_album(
+            clips=[make_clip([make_media(parts=[make_part("/inner.mp4", False)])])]
+        )
+        outer = make_album(
+            sub_albums=[inner],
+            clips=[make_clip([make_media(parts=[make_part("/outer.mp4", True)])])],
+        )
+        outer.type = "photo"
+        outer.title = "Holiday"
+        lib = make_library(
+            "Photos",
+            "photo",
+            [outer],
+            settings=[make_setting("enableBIFGeneration", True)],
+        )
+        lib.requests = []
+        all_items = lib.all
+        lib.all = lambda **kwargs: lib.requests.append(kwargs) or all_items(**kwargs)
+        return lib
+
+    def test_lists_clips_per_section(self, default_config, logger):
+        lib = self.make_photo_library()
+        counts = scan_library(lib, default_config, FEATURE_SCANS[:1], logger)
+        assert counts == {"missing thumbnail previews": 1}
+        assert [request["libtype"] for request in lib.requests] == ["clip"]
+
+    def test_album_traversal_matches_clips(self, default_config, logger):
+        default_config.photo_traversal = "albums"
+        lib = self.make_photo_library()
+        counts = scan_library(lib, default_config, FEATURE_SCANS[:1], logger)
+        assert counts == {"missing thumbnail previews": 1}
+        assert [request["libtype"] for request in lib.requests] == [None]
+
 
 class TestFindMissingPreviewThumbnails:
     def test_finds_missing_in_movies(self, default_config, logger, caplog):
@@ -283,3 +389,333 @@ class TestFindMissingMarkers:
         with caplog.at_level(logging.WARNING, logger="test_preview_maid"):
             find_missing_marker_metadata(lib, default_config, "intro", logger)
         assert "missing intro markers" not in caplog.text
+
+
+class TestIterSection:
+    def test_pages_through_section(self):
+        movies = [make_movie(f"Movie {n}", []) for n in range(5)]
+        lib = make_library("Movies", "movie", movies)
+        starts = []
+        all_items = lib.all
+        lib.all = lambda **kwargs: (
+            starts.append(kwargs["container_start"]) or all_items(**kwargs)
+        )
+        assert list(iter_section(lib, 2)) == movies
+        assert starts == [0, 2, 4]
+
+    def test_stops_on_empty_page_after_full_final_page(self):
+        movies = [make_movie(f"Movie {n}", []) for n in range(4)]
+        lib = make_library("Movies", "movie", movies)
+        starts = []
+        all_items = lib.all
+        lib.all = lambda **kwargs: (
+            starts.append(kwargs["container_start"]) or all_items(**kwargs)
+        )
+        assert list(iter_section(lib, 2)) == movies
+        assert starts == [0, 2, 4]
+
+    def test_yields_before_fetching_next_page(self):
+        movies = [make_movie(f"Movie {n}", []) for n in range(4)]
+        lib = make_library("Movies", "movie", movies)
+        starts = []
+        all_items = lib.all
+        lib.all = lambda **kwargs: (
+            starts.append(kwargs["container_start"]) or all_items(**kwargs)
+        )
+        items = iter_section(lib, 2)
+        assert next(items) is movies[0]
+        assert starts == [0]
+
+
+class TestScanLibrary:
+    def test_walks_library_once_for_all_features(self, default_config, logger):
+        ep = make_episode(
+            "Pilot",
+            [make_media(parts=[make_part("/ep.mkv", False)], has_voice_activity=False)],
+            markers=[make_marker("intro")],
+        )
+        show = make_show("Breaking Bad", [ep])
+        lib = make_library(
+            "TV",
+            "show",
+            [show],
+            settings=[
+                make_setting("enableBIFGeneration", True),
+                make_setting("enableVoiceActivityGeneration", True),
+                make_setting("enableIntroMarkerGeneration", True),
+                make_setting("enableCreditsMarkerGeneration", True),
+                make_setting("enableAdMarkerGeneration", True),
+            ],
+        )
+        calls = []
+        items = lib.all
+        lib.all = lambda **kwargs: calls.append(kwargs) or items(**kwargs)
+
+        counts = scan_library(lib, default_config, FEATURE_SCANS, logger)
+
+        assert [call["libtype"] for call in calls] == ["episode"]
+        assert counts == {
+            "missing thumbnail previews": 1,
+            "missing voice activity data": 1,
+            "missing intro markers": 0,
+            "missing credits markers": 1,
+            "missing ad markers": 1,
+        }
+
+    def test_only_counts_features_enabled_on_library(self, default_config, logger):
+        movie = make_movie(
+            "Test Movie",
+            [make_media(parts=[make_part("/m.mkv", False)], has_voice_activity=False)],
+        )
+        lib = make_library(
+            "Movies",
+            "movie",
+            [movie],
+            settings=[make_setting("enableVoiceActivityGeneration", True)],
+        )
+        counts = scan_library(lib, default_config, FEATURE_SCANS[:2], logger)
+        assert counts == {"missing voice activity data": 1}
+
+    def test_voice_activity_ignores_photos(self, default_config, logger):
+        clip = make_clip(
+            [
+                make_media(
+                    parts=[make_part("/photo.jpg", False)], has_voice_activity=False
+                )
+            ]
+        )
+        album = make_album(clips=[clip])
+        album.type = "photo"
+        album.title = "Holiday"
+        lib = make_library(
+            "Photos",
+            "photo",
+            [album],
+            settings=[
+                make_setting("enableBIFGeneration", True),
+                make_setting("enableVoiceActivityGeneration", True),
+            ],
+        )
+        counts = scan_library(lib, default_config, FEATURE_SCANS[:2], logger)
+        assert counts == {
+            "missing thumbnail previews": 1,
+            "missing voice activity data": 0,
+        }
+
+    def test_lists_episodes_per_section_not_per_show(
+        self, default_config, logger, caplog
+    ):
+        shows = [
+            make_show(
+                f"Show {n}",
+                [make_episode("Pilot", [make_media(has_voice_activity=False)])],
+            )
+            for n in range(3)
+        ]
+        lib = make_library(
+            "TV",
+            "show",
+            shows,
+            settings=[make_setting("enableVoiceActivityGeneration", True)],
+        )
+        episodes = lib.all(libtype="episode")
+        lib.all = lambda libtype=None, **kwargs: (
+            episodes if libtype == "episode" else shows
+        )
+        for show in shows:
+            show.episodes = lambda: pytest.fail("episodes() fetched per show")
+
+        with caplog.at_level(logging.WARNING, logger="test_preview_maid"):
+            counts = scan_library(lib, default_config, FEATURE_SCANS[1:2], logger)
+
+        assert counts == {"missing voice activity data": 3}
+        assert '"Show 2 - Pilot (Season 1, Episode 1)"' in caplog.text
+
+    def test_batches_marker_requests(self, default_config, logger):
+        movies = [
+            make_movie(f"Movie {n}", [make_media()], markers=[make_marker("credits")])
+            for n in range(MARKER_BATCH_SIZE + 1)
+        ]
+        lib = make_library(
+            "Movies",
+            "movie",
+            movies,
+            settings=[make_setting("enableCreditsMarkerGeneration", True)],
+        )
+        batches = []
+        fetch_items = lib.fetchItems
+        lib.fetchItems = lambda keys, params=None: (
+            batches.append(len(keys)) or fetch_items(keys, params)
+        )
+        features = [f for f in FEATURE_SCANS if f.needs_detail]
+        counts = scan_library(lib, default_config, features, logger)
+        assert batches == [MARKER_BATCH_SIZE, 1]
+        assert counts == {"missing credits markers": 0}
+
+    def test_no_marker_requests_without_marker_features(self, default_config, logger):
+        movie = make_movie("Test Movie", [make_media(has_voice_activity=False)])
+        lib = make_library(
+            "Movies",
+            "movie",
+            [movie],
+            settings=[make_setting("enableVoiceActivityGeneration", True)],
+        )
+        lib.fetchItems = lambda *args, **kwargs: pytest.fail("unexpected request")
+        assert scan_library(lib, default_config, FEATURE_SCANS[1:2], logger) == {
+            "missing voice activity data": 1
+        }
+
+
+class TestScanLibraries:
+    def make_libraries(self):
+        libraries = []
+        for n in range(4):
+            movie = make_movie(
+                f"Movie {n}",
+                [make_media(parts=[make_part(f"/movie{n}.mkv", False)])],
+                markers=[],
+            )
+            lib = make_library(
+                f"Movies {n}",
+                "movie",
+                [movie],
+                settings=[
+                    make_setting("enableBIFGeneration", True),
+                    make_setting("enableIntroMarkerGeneration", True),
+                ],
+            )
+            libraries.append(lib)
+        # Make the first library the slowest so it finishes last.
+        all_items = libraries[0].all
+        libraries[0].all = lambda **kwargs: time.sleep(0.05) or all_items(**kwargs)
+        return libraries
+
+    def scan(self, config, logger, caplog):
+        features = [FEATURE_SCANS[0], FEATURE_SCANS[2]]
+        with caplog.at_level(logging.INFO, logger="test_preview_maid"):
+            plans = plan_libraries(self.make_libraries(), config, features, logger)
+            counts = list(scan_libraries(plans, config, logger))
+        return counts, [record.getMessage() for record in caplog.records]
+
+    def test_concurrent_matches_sequential(self, default_config, logger, caplog):
+        sequential = self.scan(default_config, logger, caplog)
+        caplog.clear()
+        default_config.scan_concurrency = 4
+        concurrent = self.scan(default_config, logger, caplog)
+        assert concurrent == sequential
+
+    def test_concurrent_counts(self, default_config, logger, caplog):
+        default_config.scan_concurrency = 4
+        counts, messages = self.scan(default_config, logger, caplog)
+        assert (
+            counts
+            == [{"missing thumbnail previews": 1, "missing intro markers": 1}] * 4
+        )
+        processing = [m for m in messages if m.startswith("Processing")]
+        assert processing == [
+            f"Processing library Movies {n} of type movie..." for n in range(4)
+        ]
+
+    def test_stop_drops_queued_libraries(self, default_config, logger):
+        libraries = self.make_libraries()
+        listed = []
+        for n, lib in enumerate(libraries):
+            all_items = lib.all
+
+            def tracked_all(all_items=all_items, n=n, **kwargs):
+                listed.append(n)
+                if n == 0:
+                    STOPPING.set()
+                else:
+                    time.sleep(0.2)
+                return all_items(**kwargs)
+
+            lib.all = tracked_all
+        default_config.scan_concurrency = 2
+        plans = plan_libraries(libraries, default_config, FEATURE_SCANS[:1], logger)
+        try:
+            with pytest.raises(ScanStopped):
+                list(scan_libraries(plans, default_config, logger))
+        finally:
+            STOPPING.clear()
+        assert 3 not in listed
+
+    def test_libraries_with_the_same_title(self, logger, caplog):
+        first, second = (make_library("Movies", "movie", []) for _ in range(2))
+        first.key, second.key = 1, 2
+        log = OrderedLog(logger)
+
+        def messages():
+            return [record.getMessage() for record in caplog.records]
+
+        with deferred_logger(first, log, 0) as first_logger:
+            with deferred_logger(second, log, 1) as second_logger:
+                first_logger.info("one")
+                second_logger.info("two")
+            first_logger.info("three")
+            # The earliest library streams; the one ahead of it is held.
+            assert messages() == ["one", "three"]
+        assert messages() == ["one", "three", "two"]
+        assert log.held == {}
+
+    def test_async_engine_matches_sequential(self, default_config, logger, caplog):
+        sections = [SyntheticSection(1, "movie", 130), SyntheticSection(2, "show", 120)]
+        server = FakePlexServer(sections).start()
+        default_config.plex_url = server.url
+        default_config.find_missing_intro_markers = True
+        default_config.scan_concurrency = 4
+        default_config.container_size = 20
+        results = []
+        try:
+            for engine in ("sync", "async"):
+                caplog.clear()
+                default_config.scan_engine = engine
+                with caplog.at_level(logging.INFO, logger="test_preview_maid"):
+                    totals = run_scan(default_config, logger)
+                messages = [
+                    record.getMessage()
+                    for record in caplog.records
+                    if "Synthetic" in record.getMessage()
+                ]
+                results.append((totals, messages))
+        finally:
+            server.stop()
+        assert results[0] == results[1]
+
+    def test_async_engine_incremental_runs(self, default_config, logger, tmp_path):
+        default_config.incremental_scans = True
+        default_config.lean_requests = True
+        default_config.scan_concurrency = 4
+        default_config.container_size = 10
+        results = []
+        for engine in ("sync", "async"):
+            default_config.scan_engine = engine
+            default_config.state_directory = str(tmp_path / engine)
+            (tmp_path / engine).mkdir()
+            server = FakePlexServer([SyntheticSection(1, "movie", 60)]).start()
+            default_config.plex_url = server.url
+            try:
+                run_scan(default_config, logger)
+                # Item 50 was missing previews and is deleted before the next
+                # run, which lists nothing new and re-checks the stored items.
+                server.sections[1] = SyntheticSection(1, "movie", 45)
+                server.reset_counters()
+                results.append((run_scan(default_config, logger), server.listings))
+            finally:
+                server.stop()
+        assert results[0] == results[1]
+        assert results[1][0] == {"missing thumbnail previews": 5}
+
+    def test_async_engine_fetches_pages_concurrently(self, default_config, logger):
+        server = FakePlexServer([SyntheticSection(1, "movie", 60)], latency=0.02)
+        server.start()
+        default_config.plex_url = server.url
+        default_config.scan_engine = "async"
+        default_config.scan_concurrency = 3
+        default_config.container_size = 10
+        try:
+            totals = run_scan(default_config, logger)
+        finally:
+            server.stop()
+        assert totals == {"missing thumbnail previews": 6}
+        assert server.peak_in_flight > 1
@@ -0,0 +1,166 @@
+import threading
+from datetime import UTC, datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from previewmaid import (
+    SCAN_LOCKS,
+    CronExpression,
+    Scheduler,
+    configured_schedules,
+    find_missing_metadata,
+    parse_cron_field,
+    parse_schedule,
+    run_schedules,
+)
+
+
+def local(*args):
+    """A naive local wall-clock time, as the scheduler works in."""
+    return datetime(*args, tzinfo=UTC).replace(tzinfo=None)
+
+
+def next_after(expression, moment):
+    return CronExpression.parse(expression).next_after(moment)
+
+
+class StopScheduler(Exception):
+    pass
+
+
+class TestCronExpression:
+    def test_fields(self):
+        assert parse_cron_field("*/15", "minute", 0, 59) == {0, 15, 30, 45}
+        assert parse_cron_field("1-5,10", "hour", 0, 23) == {1, 2, 3, 4, 5, 10}
+        assert parse_cron_field("50/5", "minute", 0, 59) == {50, 55}
+        assert parse_cron_field("1-10/4", "day", 1, 31) == {1, 5, 9}
+
+    @pytest.mark.parametrize(
+        ("expression", "moment", "expected"),
+        [
+            (
+                "*/15 * * * *",
+                local(2024, 1, 1, 10, 7, 30),
+                local(2024, 1, 1, 10, 15),
+            ),
+            ("0 * * * *", local(2024, 1, 1, 10, 0), local(2024, 1, 1, 11, 0)),
+            ("0 3 * * 0", local(2024, 1, 1, 12, 0), local(2024, 1, 7, 3, 0)),
+            ("0 3 * * 7", local(2024, 1, 1, 12, 0), local(2024, 1, 7, 3, 0)),
+            ("0 0 1 1 *", local(2024, 12, 15), local(2025, 1, 1)),
+            ("0 0 29 2 *", local(2025, 3, 1), local(2028, 2, 29)),
+            # Both day fields restricted: either one matches.
+            ("0 0 15 * 1", local(2024, 1, 2), local(2024, 1, 8)),
+            ("0 0 15 * 1", local(2024, 1, 12), local(2024, 1, 15)),
+            # Only the day of week restricted: it alone decides.
+            ("0 0 * * 1", local(2024, 1, 12), local(2024, 1, 15)),
+        ],
+    )
+    def test_next_after(self, expression, moment, expected):
+        assert next_after(expression, moment) == expected
+
+    def test_daily(self):
+        cron = CronExpression.daily("02:00:30")
+        assert cron.next_after(local(2024, 1, 1, 2, 0, 30)) == local(
+            2024, 1, 2, 2, 0, 30
+        )
+        assert CronExpression.daily("23:15").next_after(
+            local(2024, 1, 1, 12, 0)
+        ) == local(2024, 1, 1, 23, 15)
+
+    @pytest.mark.parametrize(
+        ("expression", "error"),
+        [
+            ("* * *", "5 fields"),
+            ("61 * * * *", "must be within 0-59"),
+            ("x * * * *", "not a valid cron field"),
+            ("*/0 * * * *", "must be within"),
+            ("5-1 * * * *", "must be within"),
+            ("0 0 31 2 *", "never matches"),
+        ],
+    )
+    def test_invalid(self, expression, error):
+        with pytest.raises(ValueError, match=error):
+            CronExpression.parse(expression)
+
+
+class TestSchedules:
+    def test_features_and_options(self, default_config):
+        schedule = parse_schedule("0 3 * * 0 intro,credits full database")
+        config = schedule.config_for(default_config)
+        assert config.find_missing_intro_markers is True
+        assert config.find_missing_credits_markers is True
+        assert config.find_missing_thumbnail_previews is False
+        assert config.incremental_scans is False
+        assert config.scan_backend == "database"
+        assert default_config.find_missing_intro_markers is False
+
+    def test_without_features(self, default_config):
+        schedule = parse_schedule("0 * * * * incremental")
+        config = schedule.config_for(default_config)
+        assert config.find_missing_thumbnail_previews is True
+        assert config.incremental_scans is True
+
+    def test_unknown_feature(self):
+        with pytest.raises(ValueError, match='"previews"'):
+            parse_schedule("0 * * * * thumbnails,previews")
+
+    def test_run_time_without_schedules(self, default_config):
+        default_config.run_time = "02:00"
+        (schedule,) = configured_schedules(default_config)
+        assert schedule.description == "daily at 02:00"
+        assert schedule.overrides == {}
+
+    def test_scheduler_coalesces_missed_runs(self):
+        hourly = parse_schedule("0 * * * * thumbnails")
+        nightly = parse_schedule("30 0 * * * intro")
+        scheduler = Scheduler([hourly, nightly], local(2024, 1, 1, 0, 10))
+        assert scheduler.next_due() == (local(2024, 1, 1, 0, 30), 1)
+        # The nightly scan ran until 03:10, past three hourly slots.
+        scheduler.ran(1, local(2024, 1, 1, 3, 10))
+        assert scheduler.next_due() == (local(2024, 1, 1, 1, 0), 0)
+        scheduler.ran(0, local(2024, 1, 1, 3, 10))
+        assert scheduler.next_due() == (local(2024, 1, 1, 4, 0), 0)
+
+
+class TestRunSchedules:
+    def test_sleeps_until_due_and_never_overlaps(self, default_config, logger):
+        clock = [local(2024, 1, 1, 0, 10)]
+        sleeps = []
+        runs = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += timedelta(seconds=seconds)
+
+        def scan(config, logger):
+            runs.append((clock[0], config.find_missing_intro_markers))
+            if len(runs) == 1:
+                clock[0] += timedelta(minutes=90)
+            if len(runs) == 3:
+                raise StopScheduler
+
+        schedules = [
+            parse_schedule("0 * * * * thumbnails"),
+            parse_schedule("30 0 * * * intro"),
+        ]
+        with (
+            patch("previewmaid.local_now", side_effect=lambda: clock[0]),
+            patch("previewmaid.time.sleep", side_effect=sleep),
+            patch("previewmaid.find_missing_metadata", side_effect=scan),
+            pytest.raises(StopScheduler),
+        ):
+            run_schedules(schedules, default_config, logger)
+
+        assert runs == [
+            (local(2024, 1, 1, 0, 30), True),
+            (local(2024, 1, 1, 2, 0), False),
+            (local(2024, 1, 1, 3, 0), False),
+        ]
+        assert sleeps == [20 * 60, 60 * 60]
+
+    def test_skips_scan_while_server_busy(self, default_config, logger, caplog):
+        lock = SCAN_LOCKS.setdefault(default_config.plex_url, threading.Lock())
+        with lock, patch("previewmaid.PlexServer") as plex_server:
+            find_missing_metadata(default_config, logger)
+        plex_server.assert_not_called()
+        assert "already running, skipping this run" in caplog.text
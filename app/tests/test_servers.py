@@ -0,0 +1,132 @@
+import logging
+from dataclasses import replace
+
+import pytest
+from benchmarks.fake_plex import FakePlexServer, SyntheticSection
+from previewmaid import (
+    METRICS,
+    SERVER_STATES,
+    ScanMetrics,
+    configured_servers,
+    parse_server,
+    render_metrics,
+    scan_servers,
+    server_logger,
+    server_prefix,
+    server_state,
+)
+
+MOVIES = "Synthetic movie 1"
+
+
+@pytest.fixture(autouse=True)
+def server_states():
+    yield SERVER_STATES
+    SERVER_STATES.clear()
+
+
+@pytest.fixture
+def fake_servers():
+    servers = [
+        FakePlexServer([SyntheticSection(1, "movie", size)], latency=0.01).start()
+        for size in (20, 30)
+    ]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+class TestParsing:
+    def test_entry_with_limits(self):
+        assert parse_server(
+            "cabin https://cabin:32400 secret scan_concurrency=1 request_timeout=30"
+        ) == {
+            "server_name": "cabin",
+            "plex_url": "https://cabin:32400",
+            "plex_token": "secret",
+            "scan_concurrency": 1,
+            "request_timeout": 30,
+        }
+
+    @pytest.mark.parametrize(
+        ("entry", "error"),
+        [
+            ("cabin https://cabin:32400", "name, URL and token"),
+            ("cab.in https://cabin:32400 secret", "may only contain"),
+            ("cabin https://cabin:32400 secret debug=1", '"debug"'),
+            ("cabin https://cabin:32400 secret scan_concurrency=0", "at least 1"),
+            ("cabin https://cabin:32400 secret request_retries=x", "at least 0"),
+        ],
+    )
+    def test_invalid_entry(self, entry, error):
+        with pytest.raises(ValueError, match=error):
+            parse_server(entry)
+
+    def test_configured_servers(self, default_config):
+        assert configured_servers(default_config) == [default_config]
+        default_config.servers = [
+            "home http://home:32400 a",
+            "cabin http://cabin:32400 b request_latency_target_ms=500",
+        ]
+        home, cabin = configured_servers(default_config)
+        assert (home.server_name, home.plex_url, home.plex_token) == (
+            "home",
+            "http://home:32400",
+            "a",
+        )
+        assert home.request_latency_target_ms == 0
+        assert cabin.request_latency_target_ms == 500
+        assert cabin.servers == []
+
+
+class TestServerState:
+    def test_unnamed_server_uses_globals(self, default_config, logger):
+        assert server_state("").metrics is METRICS
+        assert server_prefix(default_config, "checkpoint") == "checkpoint"
+        assert server_logger(default_config, logger) is logger
+
+    def test_named_server_has_its_own(self, default_config, logger):
+        config = replace(default_config, server_name="cabin")
+        state = server_state("cabin")
+        assert state is server_state("cabin")
+        assert state.metrics is not METRICS
+        assert state.remediation.metrics is state.metrics
+        assert server_prefix(config, "checkpoint") == "checkpoint-cabin"
+        assert server_logger(config, logger).name == f"{logger.name}.cabin"
+
+    def test_merged_metrics_are_labelled(self):
+        home, cabin = ScanMetrics("home"), ScanMetrics("cabin")
+        home.set_request_limit(2)
+        cabin.set_request_limit(3)
+        text = render_metrics([ScanMetrics(), home, cabin])
+        assert text.count("# TYPE preview_maid_plex_request_limit gauge") == 1
+        assert 'preview_maid_plex_request_limit{server="home"} 2' in text
+        assert 'preview_maid_plex_request_limit{server="cabin"} 3' in text
+
+
+class TestScanServers:
+    def test_servers_scanned_concurrently(
+        self, default_config, logger, caplog, fake_servers
+    ):
+        home, cabin = fake_servers
+        default_config.servers = [
+            f"home {home.url} a",
+            f"cabin {cabin.url} b scan_concurrency=1",
+        ]
+        with caplog.at_level(logging.INFO):
+            scan_servers(default_config, logger)
+
+        assert home.listings > 0
+        assert cabin.listings > 0
+        totals = {
+            record.name: record.getMessage()
+            for record in caplog.records
+            if "in total" in record.getMessage()
+        }
+        assert "found 2 in total" in totals[f"{logger.name}.home"]
+        assert "found 3 in total" in totals[f"{logger.name}.cabin"]
+        text = render_metrics(
+            [server_state("home").metrics, server_state("cabin").metrics]
+        )
+        assert f'items_scanned{{server="home",library="{MOVIES}"}} 20' in text
+        assert f'items_scanned{{server="cabin",library="{MOVIES}"}} 30' in text
@@ -0,0 +1,226 @@
+from datetime import UTC, datetime
+
+import pytest
+from conftest import make_library, make_media, make_movie, make_part, make_setting
+from previewmaid import (
+    FEATURE_SCANS,
+    StateStore,
+    open_state_store,
+    scan_library,
+)
+
+THUMBNAILS = ["missing thumbnail previews"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / "preview_maid.db"))
+    yield store
+    store.close()
+
+
+def make_movies():
+    movies = []
+    for n, has_previews in enumerate([True, False, False]):
+        movie = make_movie(
+            f"Movie {n}",
+            [make_media(parts=[make_part(f"/movie{n}.mkv", has_previews)])],
+        )
+        movie.updatedAt = datetime(2024, 1, n + 1, tzinfo=UTC)
+        movies.append(movie)
+    return movies
+
+
+def make_tracked_library(movies):
+    lib = make_library(
+        "Movies",
+        "movie",
+        movies,
+        settings=[
+            make_setting("enableBIFGeneration", True),
+            make_setting("enableVoiceActivityGeneration", True),
+        ],
+    )
+    lib.requests = []
+    all_items = lib.all
+    lib.all = lambda **kwargs: lib.requests.append(kwargs) or all_items(**kwargs)
+    return lib
+
+
+class TestIncrementalScans:
+    def test_first_run_is_full_scan(self, default_config, logger, store):
+        lib = make_tracked_library(make_movies())
+        counts = scan_library(
+            lib, default_config, FEATURE_SCANS[:1], logger, None, store
+        )
+        assert counts == {"missing thumbnail previews": 2}
+        assert lib.requests[0]["filters"] is None
+        state = store.library_state("Movies", ["missing thumbnail previews"])
+        assert store.library_state("Movies", ["missing voice activity data"]) is None
+        assert state.watermark == datetime(2024, 1, 3, tzinfo=UTC).timestamp()
+
+    def test_only_changed_items_are_checked(self, default_config, logger, store):
+        movies = make_movies()
+        lib = make_tracked_library(movies)
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+
+        movies[1].media[0].parts[0].hasPreviewThumbnails = True
+        movies[1].updatedAt = datetime(2024, 2, 1, tzinfo=UTC)
+        lib.requests.clear()
+        counts = scan_library(
+            lib, default_config, FEATURE_SCANS[:1], logger, None, store
+        )
+
+        assert counts == {"missing thumbnail previews": 1}
+        assert lib.requests[0]["filters"] == {
+            "updatedAt>>": datetime(2024, 1, 2, 23, 59, 59, tzinfo=UTC)
+        }
+        watermark = store.library_state("Movies", THUMBNAILS).watermark
+        assert watermark == movies[1].updatedAt.timestamp()
+
+    def test_unchanged_findings_are_kept(self, default_config, logger, store):
+        lib = make_tracked_library(make_movies())
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+        counts = scan_library(
+            lib, default_config, FEATURE_SCANS[:1], logger, None, store
+        )
+        assert counts == {"missing thumbnail previews": 2}
+
+    def test_full_scan_when_interval_elapsed(self, default_config, logger, store):
+        lib = make_tracked_library(make_movies())
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+        store.connection.execute("UPDATE feature_scans SET full_scan_at = 0")
+
+        lib.requests.clear()
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+        assert lib.requests[0]["filters"] is None
+
+    def test_watermark_held_before_failed_items(self, default_config, logger, store):
+        movies = make_movies()
+        lib = make_tracked_library(movies)
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+
+        movies[0].updatedAt = datetime(2024, 2, 1, tzinfo=UTC)
+        movies[2].updatedAt = datetime(2024, 2, 2, tzinfo=UTC)
+        part = movies[0].media[0].parts[0]
+        del part.hasPreviewThumbnails
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+        watermark = store.library_state("Movies", THUMBNAILS).watermark
+        assert watermark == movies[0].updatedAt.timestamp()
+
+        part.hasPreviewThumbnails = False
+        counts = scan_library(
+            lib, default_config, FEATURE_SCANS[:1], logger, None, store
+        )
+        assert counts == {"missing thumbnail previews": 3}
+
+    def test_full_scan_when_feature_added(self, default_config, logger, store):
+        lib = make_tracked_library(make_movies())
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+
+        lib.requests.clear()
+        counts = scan_library(
+            lib, default_config, FEATURE_SCANS[:2], logger, None, store
+        )
+        assert lib.requests[0]["filters"] is None
+        assert counts == {
+            "missing thumbnail previews": 2,
+            "missing voice activity data": 0,
+        }
+
+    def test_features_scanned_separately(self, default_config, logger, store):
+        movies = make_movies()
+        movies[0].media[0].hasVoiceActivity = False
+        lib = make_tracked_library(movies)
+        thumbnails, voice = FEATURE_SCANS[:1], FEATURE_SCANS[1:2]
+        expected = [
+            {"missing thumbnail previews": 2},
+            {"missing voice activity data": 1},
+        ]
+        for run in range(4):
+            features = (thumbnails, voice)[run % 2]
+            lib.requests.clear()
+            counts = scan_library(lib, default_config, features, logger, None, store)
+            assert counts == expected[run % 2]
+            # Each feature's second scan is incremental.
+            assert (lib.requests[0]["filters"] is None) == (run < 2)
+
+
+class TestStoredFindings:
+    def track_fetches(self, lib):
+        lib.fetched = []
+        fetch_items = lib.fetchItems
+        lib.fetchItems = lambda keys, params=None: (
+            lib.fetched.append(keys) or fetch_items(keys, params)
+        )
+
+    def test_missing_items_are_rechecked(self, default_config, logger, store):
+        movies = make_movies()
+        lib = make_tracked_library(movies)
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+
+        # Generating previews does not always bump updatedAt.
+        movies[1].media[0].parts[0].hasPreviewThumbnails = True
+        self.track_fetches(lib)
+        counts = scan_library(
+            lib, default_config, FEATURE_SCANS[:1], logger, None, store
+        )
+
+        assert counts == {"missing thumbnail previews": 1}
+        # The newest movie is listed again through the watermark overlap.
+        assert lib.fetched == [[movies[1].ratingKey]]
+
+    def test_known_good_items_are_skipped(self, default_config, logger, store):
+        movies = make_movies()
+        lib = make_tracked_library(movies)
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+
+        self.track_fetches(lib)
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+        assert movies[0].ratingKey not in lib.fetched[0]
+
+    def test_expired_known_good_items_are_rechecked(
+        self, default_config, logger, store
+    ):
+        movies = make_movies()
+        lib = make_tracked_library(movies)
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+        store.connection.execute("UPDATE findings SET checked_at = 0")
+
+        movies[0].media[0].parts[0].hasPreviewThumbnails = False
+        counts = scan_library(
+            lib, default_config, FEATURE_SCANS[:1], logger, None, store
+        )
+        assert counts == {"missing thumbnail previews": 3}
+
+    def test_deleted_items_are_forgotten(self, default_config, logger, store):
+        movies = make_movies()
+        lib = make_tracked_library(movies)
+        scan_library(lib, default_config, FEATURE_SCANS[:1], logger, None, store)
+
+        fetch_items = lib.fetchItems
+        lib.fetchItems = lambda keys, params=None: [
+            movie for movie in fetch_items(keys, params) if movie is not movies[1]
+        ]
+        counts = scan_library(
+            lib, default_config, FEATURE_SCANS[:1], logger, None, store
+        )
+        assert counts == {"missing thumbnail previews": 1}
+
+
+class TestOpenStateStore:
+    def test_disabled(self, default_config, logger, tmp_path):
+        default_config.state_directory = str(tmp_path)
+        assert open_state_store(default_config, logger) is None
+
+    def test_missing_directory(self, default_config, logger, tmp_path):
+        default_config.incremental_scans = True
+        default_config.state_directory = str(tmp_path / "nonexistent")
+        assert open_state_store(default_config, logger) is None
+
+    def test_creates_database(self, default_config, logger, tmp_path):
+        default_config.incremental_scans = True
+        default_config.state_directory = str(tmp_path)
+        store = open_state_store(default_config, logger)
+        store.close()
+        assert (tmp_path / "preview_maid.db").exists()
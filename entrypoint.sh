@@ -5,5 +5,11 @@ set -e
 if [ -d /app/logs ]; then
     chown -R appuser:appuser /app/logs
 fi
+if [ -d /app/state ]; then
+    chown -R appuser:appuser /app/state
+fi
+if [ -d /app/reports ]; then
+    chown -R appuser:appuser /app/reports
+fi
 
 exec gosu appuser "$@"